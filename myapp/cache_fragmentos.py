@@ -0,0 +1,108 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.middleware.csrf import get_token
+
+#🚨 CACHÉ DE FRAGMENTOS POR FAMILIA 🚨
+# Cada familia tiene un número de VERSIÓN en la caché. Los fragmentos (lista de tareas,
+# eventos y disponibilidad del calendario) se guardan bajo claves que incluyen la versión de
+# sus familias, así que para invalidarlos basta con subir la versión: las claves viejas
+# dejan de usarse y expiran solas. Las señales de models.py suben la versión ante cualquier
+# cambio en Tarea, Horario, Familia o sus miembros; las escrituras en bloque (bulk_create,
+# bulk_update, update()) lo hacen explícitamente con invalidar_familias.
+# El backend es configurable: settings.CACHE_FRAGMENTOS indica el alias de CACHES a usar.
+
+CLAVE_VERSION = 'familia:{}:version'
+CLAVE_ACIERTOS = 'fragmentos:aciertos'
+CLAVE_FALLOS = 'fragmentos:fallos'
+
+# Segundos que vive un fragmento (además de quedar obsoleto al subir la versión)
+TIEMPO_FRAGMENTO_POR_DEFECTO = 600
+
+def _cache():
+    return caches[getattr(settings, 'CACHE_FRAGMENTOS', 'default')]
+
+def _version_nueva():
+    # Si la versión de una familia se perdió (reinicio, desalojo), se parte de un valor que no
+    # puede coincidir con uno anterior, así nunca se reusa un fragmento viejo
+    return time.time_ns()
+
+def versiones(familia_ids):
+    """{familia_id: versión} en una sola lectura a la caché."""
+    cache = _cache()
+    claves = {CLAVE_VERSION.format(familia_id): familia_id for familia_id in familia_ids}
+    encontradas = cache.get_many(list(claves))
+    for clave in claves.keys() - encontradas.keys():
+        cache.add(clave, _version_nueva(), timeout=None)
+        encontradas[clave] = cache.get(clave)
+    return {familia_id: encontradas[clave] for clave, familia_id in claves.items()}
+
+def invalidar_familias(familia_ids):
+    """Sube la versión de las familias al confirmarse la transacción actual (o de inmediato sin transacción)."""
+    familia_ids = {familia_id for familia_id in familia_ids if familia_id is not None}
+    if not familia_ids:
+        return
+
+    def subir_versiones():
+        cache = _cache()
+        for familia_id in familia_ids:
+            clave = CLAVE_VERSION.format(familia_id)
+            try:
+                cache.incr(clave)
+            except ValueError: # La clave no existía: cualquier versión nueva sirve
+                cache.set(clave, _version_nueva(), timeout=None)
+
+    # Tras el COMMIT: si se subiera antes, otra petición podría guardar datos viejos con la versión nueva
+    transaction.on_commit(subir_versiones)
+
+def clave_fragmento(nombre, familia_ids, *partes):
+    """Clave de un fragmento que depende de 'familia_ids' (y de lo que varíe en 'partes')."""
+    versiones_familias = versiones(familia_ids)
+    dependencias = ','.join(f"{familia_id}.{versiones_familias[familia_id]}" for familia_id in sorted(versiones_familias))
+    resumen = hashlib.sha1('|'.join([dependencias, *map(str, partes)]).encode()).hexdigest()
+    return f"fragmento:{nombre}:{resumen}"
+
+def secreto_csrf(request):
+    # Los fragmentos con formularios llevan el token CSRF: solo se reusan con el mismo secreto
+    get_token(request) # Asegura que la cookie CSRF exista y se envíe aunque el fragmento venga de la caché
+    return hashlib.sha1(request.META.get('CSRF_COOKIE', '').encode()).hexdigest()
+
+def obtener_o_construir(clave, construir, tiempo=None):
+    """Devuelve el fragmento guardado en 'clave' o lo construye con construir() y lo guarda."""
+    cache = _cache()
+    valor = cache.get(clave)
+    if valor is not None:
+        _contar(CLAVE_ACIERTOS)
+        return valor
+
+    _contar(CLAVE_FALLOS)
+    valor = construir()
+    if tiempo is None:
+        tiempo = getattr(settings, 'CACHE_FRAGMENTOS_TIEMPO', TIEMPO_FRAGMENTO_POR_DEFECTO)
+    cache.set(clave, valor, tiempo)
+    return valor
+
+def _contar(clave):
+    cache = _cache()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, timeout=None):
+            cache.incr(clave)
+
+def estadisticas():
+    """Aciertos y fallos de la caché de fragmentos (en el backend configurado)."""
+    contadores = _cache().get_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos = contadores.get(CLAVE_ACIERTOS, 0)
+    fallos = contadores.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / total, 4) if total else None,
+    }
+
+def reiniciar_estadisticas():
+    _cache().delete_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
@@ -0,0 +1,168 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import CargaPendiente, Tarea
+
+#🚨 CONTADORES DE CARGA PENDIENTE (tabla CargaPendiente) 🚨
+# Una fila por (familia, usuario) con sus instancias pendientes y los minutos que suman.
+# Quien crea, completa, reasigna o borra instancias llama a estas funciones DENTRO de la misma
+# transacción en que escribe las tareas, y toma el aporte anterior de una fila leída con
+# select_for_update() en esa transacción. 'manage.py conciliar_cargas' detecta los desvíos.
+
+def aporte(tarea):
+    """(familia_id, usuario_id, minutos) con que 'tarea' suma a los contadores, o None si no suma."""
+    if (tarea.tipo == Tarea.INSTANCIA and tarea.estado == 'pendiente'
+            and tarea.responsable_id is not None and tarea.familia_id is not None):
+        return tarea.familia_id, tarea.responsable_id, tarea.tiempo_requerido_minutos or 0
+    return None
+
+def _acumular(deltas, aporte_tarea, signo):
+    if aporte_tarea is None:
+        return
+    familia_id, usuario_id, minutos = aporte_tarea
+    instancias_previas, minutos_previos = deltas.get((familia_id, usuario_id), (0, 0))
+    deltas[(familia_id, usuario_id)] = (instancias_previas + signo, minutos_previos + signo * minutos)
+
+def _sumar_a_fila(fila, instancias, minutos):
+    return fila.update(
+        pendientes=Greatest(F('pendientes') + instancias, Value(0)),
+        minutos_pendientes=Greatest(F('minutos_pendientes') + minutos, Value(0)),
+    )
+
+def aplicar(deltas):
+    """
+    Suma {(familia_id, usuario_id): (instancias, minutos)} a los contadores (los deltas pueden ser
+    negativos). Un contador nunca baja de 0: si eso pasara es un desvío que detecta la conciliación.
+    """
+    deltas = {clave: delta for clave, delta in deltas.items() if delta != (0, 0)}
+    if not deltas:
+        return
+
+    # Una consulta para saber qué filas ya existen; las que faltan se insertan juntas
+    familias = {familia_id for familia_id, _ in deltas}
+    usuarios = {usuario_id for _, usuario_id in deltas}
+    existentes = set(CargaPendiente.objects.filter(
+        familia_id__in=familias, usuario_id__in=usuarios
+    ).values_list('familia_id', 'usuario_id'))
+
+    nuevas = {clave: delta for clave, delta in deltas.items() if clave not in existentes}
+    if nuevas:
+        try:
+            with transaction.atomic():
+                CargaPendiente.objects.bulk_create([
+                    CargaPendiente(
+                        familia_id=familia_id,
+                        usuario_id=usuario_id,
+                        pendientes=max(instancias, 0),
+                        minutos_pendientes=max(minutos, 0),
+                    )
+                    for (familia_id, usuario_id), (instancias, minutos) in nuevas.items()
+                ])
+        except IntegrityError:
+            # Otra transacción creó alguna de las filas entre medio: se suma sobre ellas
+            nuevas = {}
+
+    for (familia_id, usuario_id), (instancias, minutos) in deltas.items():
+        if (familia_id, usuario_id) in nuevas:
+            continue
+        fila = CargaPendiente.objects.filter(familia_id=familia_id, usuario_id=usuario_id)
+        if not _sumar_a_fila(fila, instancias, minutos):
+            CargaPendiente.objects.create(
+                familia_id=familia_id,
+                usuario_id=usuario_id,
+                pendientes=max(instancias, 0),
+                minutos_pendientes=max(minutos, 0),
+            )
+
+def sumar(tareas):
+    """Registra tareas nuevas (solo cuentan las instancias pendientes con responsable)."""
+    deltas = {}
+    for tarea in tareas:
+        _acumular(deltas, aporte(tarea), 1)
+    aplicar(deltas)
+
+def restar(tareas):
+    """Descuenta tareas que se van a borrar."""
+    deltas = {}
+    for tarea in tareas:
+        _acumular(deltas, aporte(tarea), -1)
+    aplicar(deltas)
+
+def registrar_cambios(cambios):
+    """
+    Registra tareas modificadas. 'cambios' es una lista de (aporte_anterior, tarea), donde
+    aporte_anterior = aporte(tarea) tomado ANTES de modificarla.
+    """
+    deltas = {}
+    for aporte_anterior, tarea in cambios:
+        _acumular(deltas, aporte_anterior, -1)
+        _acumular(deltas, aporte(tarea), 1)
+    aplicar(deltas)
+
+def restar_consulta(queryset):
+    """Descuenta, con UNA consulta agrupada, las tareas de 'queryset' que se van a borrar en bloque."""
+    deltas = {}
+    for fila in _agrupar(queryset):
+        deltas[(fila['familia_id'], fila['responsable_id'])] = (-fila['pendientes'], -fila['minutos_pendientes'])
+    aplicar(deltas)
+
+def _agrupar(queryset):
+    # (familia, responsable) -> instancias pendientes y minutos, calculado desde Tarea
+    return queryset.instancias().filter(
+        estado='pendiente',
+        responsable__isnull=False,
+        familia__isnull=False,
+    ).values('familia_id', 'responsable_id').annotate(
+        pendientes=Count('id'),
+        minutos_pendientes=Coalesce(Sum('tiempo_requerido_minutos'), 0),
+    ).order_by()
+
+def carga_por_usuario(usuarios):
+    """{usuario_id: instancias pendientes} sumando todas sus familias (lectura directa de los contadores)."""
+    carga = {usuario.id: 0 for usuario in usuarios}
+    filas = CargaPendiente.objects.filter(usuario__in=usuarios).values('usuario_id').annotate(
+        total=Sum('pendientes')
+    ).order_by()
+    for fila in filas:
+        carga[fila['usuario_id']] = fila['total']
+    return carga
+
+def conciliar(familias=None, corregir=False):
+    """
+    Compara los contadores con un conteo real sobre Tarea. Devuelve los desvíos como
+    [(familia_id, usuario_id, (pendientes, minutos) guardados, (pendientes, minutos) reales)].
+    Con 'corregir' se reescriben los contadores con los valores reales.
+    """
+    tareas = Tarea.objects.all()
+    contadores = CargaPendiente.objects.all()
+    if familias is not None:
+        tareas = tareas.filter(familia__in=familias)
+        contadores = contadores.filter(familia__in=familias)
+
+    reales = {
+        (fila['familia_id'], fila['responsable_id']): (fila['pendientes'], fila['minutos_pendientes'])
+        for fila in _agrupar(tareas)
+    }
+    guardados = {
+        (familia_id, usuario_id): (pendientes, minutos)
+        for familia_id, usuario_id, pendientes, minutos in contadores.values_list(
+            'familia_id', 'usuario_id', 'pendientes', 'minutos_pendientes'
+        )
+    }
+
+    desvios = []
+    for clave in sorted(reales.keys() | guardados.keys()):
+        real = reales.get(clave, (0, 0))
+        guardado = guardados.get(clave, (0, 0))
+        if real != guardado:
+            desvios.append((clave[0], clave[1], guardado, real))
+
+    if corregir and desvios:
+        with transaction.atomic():
+            contadores.delete()
+            CargaPendiente.objects.bulk_create([
+                CargaPendiente(familia_id=familia_id, usuario_id=usuario_id, pendientes=pendientes, minutos_pendientes=minutos)
+                for (familia_id, usuario_id), (pendientes, minutos) in reales.items()
+            ], batch_size=500)
+
+    return desvios
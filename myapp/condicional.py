@@ -0,0 +1,156 @@
+import hashlib
+from calendar import timegm
+from datetime import date
+from functools import wraps
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .models import Familia, Tarea, Horario, Perfil, Eliminacion
+from .cache_fragmentos import secreto_csrf
+
+#🚨 GET CONDICIONAL (ETag / Last-Modified) 🚨
+# Antes de armar querysets o plantillas se calculan VALIDADORES baratos: la última 'modificado'
+# de las tareas de cada familia, la última eliminación, cuántos miembros tiene, etc. Cada valor
+# sale de una subconsulta ORDER BY ... LIMIT 1 sobre los índices (familia|usuario, modificado, id),
+# todas en UNA consulta, sin leer las filas. Si el ETag coincide con If-None-Match se responde
+# 304 sin ejecutar la vista.
+# Solo se responde 304 por ETag: la membresía y el token CSRF no tienen fecha, así que un
+# If-Modified-Since solo no alcanza para saber si la página cambió (Last-Modified es informativo).
+# OJO: update() y bulk_update() no actualizan 'modificado' (auto_now); quien los usa lo incluye.
+
+METODOS = ('GET', 'HEAD')
+
+def _ultimo(queryset, campo):
+    # El mayor valor de 'campo' (usa el índice que termina en ese campo; sin filas, NULL)
+    return Subquery(queryset.order_by(f'-{campo}').values(campo)[:1])
+
+def estado_de_familias(familia_ids, con_perfiles=False):
+    """
+    Tuplas (familia, última tarea, última eliminación, miembros, último miembro[, último perfil])
+    de las familias 'familia_ids', en UNA consulta. Cambian con cualquier alta, edición o baja
+    de sus tareas y con cada cambio de miembros. Una tarea que pasa a otra familia cuenta como
+    baja en la anterior (registrar_tareas_movidas deja una Eliminacion).
+    """
+    miembros = Familia.miembros.through.objects.filter(familia_id=OuterRef('id')).values('familia_id')
+    anotaciones = {
+        'ultima_tarea': _ultimo(Tarea.objects.filter(familia_id=OuterRef('id')), 'modificado'),
+        'ultima_eliminacion': _ultimo(Eliminacion.objects.filter(familia_id=OuterRef('id')), 'eliminado'),
+        'total_miembros': Subquery(miembros.annotate(total=Count('id')).values('total')),
+        # Sacar a uno y agregar a otro deja el total igual, pero no el último id de la tabla intermedia
+        'ultimo_miembro': Subquery(miembros.annotate(ultimo=Max('id')).values('ultimo')),
+    }
+    if con_perfiles:
+        # Perfiles del jefe y de los miembros (la página de perfil muestra sus edades)
+        ids_miembros = Familia.miembros.through.objects.filter(familia_id=OuterRef(OuterRef('id'))).values('user_id')
+        anotaciones['ultimo_perfil'] = _ultimo(
+            Perfil.objects.filter(Q(usuario_id=OuterRef('jefe_id')) | Q(usuario_id__in=ids_miembros)), 'modificado'
+        )
+    return list(
+        Familia.objects.filter(id__in=familia_ids).annotate(**anotaciones)
+        .order_by('id').values_list('id', *anotaciones)
+    )
+
+def estado_de_usuario(usuario_id):
+    """(último horario, última eliminación de horario, último cambio del perfil) de 'usuario_id', en UNA consulta."""
+    return User.objects.filter(id=usuario_id).annotate(
+        ultimo_horario=_ultimo(Horario.objects.filter(usuario_id=OuterRef('id')), 'modificado'),
+        ultima_eliminacion=_ultimo(
+            Eliminacion.objects.filter(modelo=Eliminacion.HORARIO, usuario_id=OuterRef('id')), 'eliminado'
+        ),
+        ultimo_perfil=_ultimo(Perfil.objects.filter(usuario_id=OuterRef('id')), 'modificado'),
+    ).values_list('ultimo_horario', 'ultima_eliminacion', 'ultimo_perfil').first()
+
+def datos_de_familias(familias):
+    # Lo que las páginas muestran de cada familia; ya viene cargado en request.membresia
+    return [(familia.id, familia.nombre, familia.codigo_invitacion, familia.jefe_id) for familia in familias]
+
+def mas_reciente(*estados):
+    """La fecha más reciente entre los validadores (para Last-Modified) o None."""
+    fechas = [valor for estado in estados for fila in estado for valor in fila if hasattr(valor, 'utctimetuple')]
+    return max(fechas, default=None)
+
+def hay_mensajes(request):
+    # La página mostraría mensajes pendientes: no puede ser la misma que el cliente ya tiene.
+    # len() no los marca como leídos, la vista los sigue mostrando.
+    return bool(len(messages.get_messages(request)))
+
+def responder(request, validadores, construir):
+    """
+    'validadores' es (partes del ETag, última modificación) o None (sin GET condicional).
+    Responde 304 si If-None-Match coincide; si no, construir() y agrega ETag y Last-Modified.
+    """
+    if validadores is None or request.method not in METODOS:
+        return construir()
+    partes, ultima = validadores
+    # Débil (W/): el HTML cambia byte a byte en cada render (token CSRF enmascarado), no su contenido
+    etag = 'W/"%s"' % hashlib.sha1(repr(partes).encode()).hexdigest()
+
+    respuesta = get_conditional_response(request, etag=etag)
+    if respuesta is None:
+        respuesta = construir()
+        if respuesta.status_code != 200:
+            return respuesta
+    respuesta.headers.setdefault('ETag', etag)
+    if ultima is not None:
+        respuesta.headers.setdefault('Last-Modified', http_date(timegm(ultima.utctimetuple())))
+    # Página de un usuario: solo la guarda su navegador y la revalida en cada visita
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+def condicional(calcular_validadores):
+    """Decorador de vistas: GET condicional con calcular_validadores(request, *args, **kwargs)."""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            validadores = None
+            if request.method in METODOS and not hay_mensajes(request):
+                validadores = calcular_validadores(request, *args, **kwargs)
+            return responder(request, validadores, lambda: vista(request, *args, **kwargs))
+        return envoltura
+    return decorador
+
+# Validadores de cada página. Las HTML incluyen el secreto CSRF (los formularios llevan el token)
+# y el nombre del usuario (lo muestra base.html).
+
+def validadores_tareas(request):
+    usuario, membresia = request.user, request.membresia
+    if not membresia.familias:
+        return None
+    estado = estado_de_familias(membresia.ids)
+    return (
+        ('tareas', usuario.id, usuario.username, secreto_csrf(request), datos_de_familias(membresia.familias), estado),
+        mas_reciente(estado),
+    )
+
+def validadores_perfil(request):
+    usuario, membresia = request.user, request.membresia
+    if not membresia.familias:
+        return None # La vista redirige a crear una familia
+    familias = estado_de_familias(membresia.ids, con_perfiles=True)
+    propio = estado_de_usuario(usuario.id)
+    return (
+        # date.today(): la edad que se muestra cambia sola con los días
+        ('perfil', usuario.id, usuario.username, usuario.email, secreto_csrf(request), date.today(),
+         datos_de_familias(membresia.familias), familias, propio),
+        mas_reciente(familias, [propio]),
+    )
+
+def validadores_ver_horario(request):
+    usuario = request.user
+    propio = estado_de_usuario(usuario.id)
+    return (
+        ('ver_horario', usuario.id, usuario.username, secreto_csrf(request), propio[:2]),
+        mas_reciente([propio[:2]]),
+    )
+
+def validadores_api_tareas(request, membresia):
+    # Sin secreto CSRF: los clientes de la API (token) no envían la cookie y el ETag cambiaría
+    # siempre. La API navegable (format 'api') sí muestra formularios con el token.
+    formato = request.accepted_renderer.format
+    estado = estado_de_familias(membresia.ids)
+    partes = ('api_tareas', request.user.id, formato, membresia.ids, estado)
+    if formato == 'api':
+        partes += (secreto_csrf(request),)
+    return partes, mas_reciente(estado)
@@ -0,0 +1,87 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Tarea
+
+#🚨 EXPORTACIÓN DEL HISTORIAL DE TAREAS DE UNA FAMILIA (NDJSON / CSV) 🚨
+# Las filas salen de UNA consulta con JOIN a responsable y familia (.values(), sin crear objetos
+# Tarea), leída por bloques con .iterator(chunk_size): cursor del lado del servidor en PostgreSQL,
+# fetchmany en SQLite. Cada bloque se escribe y se descarta, así que la memoria no crece con la
+# cantidad de tareas. La usan la vista exportar_tareas (StreamingHttpResponse) y 'manage.py exportar_tareas'.
+
+TAMANO_BLOQUE = 2000
+
+# (columna en la exportación, campo para .values())
+COLUMNAS = [
+    ('id', 'id'),
+    ('nombre', 'nombre'),
+    ('estado', 'estado'),
+    ('tipo', 'tipo'),
+    ('familia_id', 'familia_id'),
+    ('familia', 'familia__nombre'),
+    ('responsable_id', 'responsable_id'),
+    ('responsable', 'responsable__username'),
+    ('tiempo_requerido_minutos', 'tiempo_requerido_minutos'),
+    ('dias_recurrencia', 'dias_recurrencia_csv'),
+    ('fecha_programada', 'fecha_programada'),
+    ('hora_inicio', 'hora_inicio'),
+    ('hora_termino', 'hora_termino'),
+    ('plantilla_id', 'plantilla_id'),
+    ('fecha_creacion', 'fecha_creacion'),
+]
+
+def filas_de_familia(familia_id, tamano_bloque=TAMANO_BLOQUE):
+    """Tuplas (en el orden de COLUMNAS) de todas las tareas de la familia, por id, leídas por bloques."""
+    return Tarea.objects.filter(familia_id=familia_id).values_list(
+        *[campo for _, campo in COLUMNAS]
+    ).order_by('id').iterator(chunk_size=tamano_bloque)
+
+def _agrupar_lineas(lineas, tamano_bloque):
+    # Una escritura por bloque de líneas, no por fila (menos llamadas al socket o al archivo)
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) >= tamano_bloque:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+class _Eco:
+    # csv.writer escribe en un "archivo": este devuelve la línea en vez de guardarla
+    def write(self, valor):
+        return valor
+
+def lineas_csv(filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow([columna for columna, _ in COLUMNAS])
+    for fila in filas:
+        yield escritor.writerow([_texto_csv(valor) for valor in fila])
+
+# Un texto que empieza con alguno de estos caracteres se abre como fórmula en Excel/LibreOffice
+# (inyección CSV): se le antepone una comilla simple para que se muestre tal cual
+INICIOS_DE_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+def _texto_csv(valor):
+    # Fechas y horas en ISO 8601, igual que en NDJSON
+    if valor is None:
+        return ''
+    if isinstance(valor, str):
+        return "'" + valor if valor.startswith(INICIOS_DE_FORMULA) else valor
+    return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+def lineas_ndjson(filas):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    columnas = [columna for columna, _ in COLUMNAS]
+    for fila in filas:
+        yield codificador.encode(dict(zip(columnas, fila))) + '\n'
+
+# formato -> (generador de líneas, content type, extensión)
+FORMATOS = {
+    'ndjson': (lineas_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (lineas_csv, 'text/csv; charset=utf-8', 'csv'),
+}
+
+def exportar(familia_id, formato, tamano_bloque=TAMANO_BLOQUE):
+    """Generador de bloques de texto con la exportación de la familia en 'formato' ('ndjson' o 'csv')."""
+    generar_lineas = FORMATOS[formato][0]
+    return _agrupar_lineas(generar_lineas(filas_de_familia(familia_id, tamano_bloque)), tamano_bloque)
@@ -1,6 +1,6 @@
 from django import forms
 # Asumo que DIAS_SEMANA_CHOICES está disponible en models.py o se pasa aquí
-from .models import Horario, Perfil, Tarea, Familia, DIAS_SEMANA_CHOICES # Se agrega Familia
+from .models import Horario, Perfil, Tarea, Familia, DIAS_SEMANA_CHOICES, dias_a_mascara # Se agrega Familia
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model 
 from django.db.models import Q # Importado para futuros filtros
@@ -87,10 +87,9 @@ class TareaForm(forms.ModelForm):
             # Filtra el queryset de 'familia' para mostrar SOLO aquellas donde el usuario es el jefe.
             self.fields['familia'].queryset = Familia.objects.filter(jefe=user)
 
-        # Inicialización: Cargar la cadena CSV del modelo a los checkboxes
-        if self.instance.pk and self.instance.dias_recurrencia_csv:
-            initial_days = self.instance.dias_recurrencia_csv.split(',')
-            self.fields['dias_recurrencia_form'].initial = initial_days
+        # Inicialización: Cargar la máscara de días del modelo a los checkboxes
+        if self.instance.pk and self.instance.dias_recurrencia_mask:
+            self.fields['dias_recurrencia_form'].initial = self.instance.dias_recurrencia()
 
     def clean(self):
         cleaned_data = super().clean()
@@ -111,12 +110,12 @@ class TareaForm(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
         
-        # Guardado: Convertir los checkboxes a la cadena CSV del modelo
-        selected_days = self.cleaned_data.get('dias_recurrencia_form')
-        if selected_days:
-            instance.dias_recurrencia_csv = ','.join(selected_days)
-        else:
-            instance.dias_recurrencia_csv = "" # Guardamos cadena vacía en CharField
+        # Guardado: Convertir los checkboxes a la máscara (y su copia CSV) del modelo.
+        # Una instancia conserva su día: la recurrencia solo se edita en las plantillas.
+        if instance.tipo == Tarea.PLANTILLA:
+            selected_days = self.cleaned_data.get('dias_recurrencia_form') or []
+            instance.dias_recurrencia_mask = dias_a_mascara(selected_days)
+            instance.dias_recurrencia_csv = ','.join(instance.dias_recurrencia()) # "" si no hay días
         
         if commit:
             instance.save()
@@ -0,0 +1,144 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .models import Familia, Tarea, registrar_tareas_movidas
+from .serializers import TareaSerializer
+from .cache_fragmentos import invalidar_familias
+from . import cargas
+
+#🚨 OPERACIONES EN LOTE DE LA API (/api/tareas/crear-lote/, actualizar-lote/, completar-lote/) 🚨
+# Un lote se valida completo en una pasada (las relaciones se precargan: una consulta por modelo)
+# y los elementos válidos se escriben con bulk_create/bulk_update en UNA transacción, junto con
+# los contadores de carga. Los elementos inválidos no bloquean al resto: cada uno tiene su
+# resultado ({'indice', 'id', 'ok', 'errores'}) en el mismo orden en que llegó.
+# Los cambios sobre tareas existentes las leen bloqueadas (SELECT ... FOR UPDATE) en la misma
+# transacción en que se escriben: el aporte anterior a los contadores no puede quedar viejo.
+
+MAXIMO_POR_LOTE = 500
+RELACIONES = ('familia', 'responsable', 'plantilla') # Campos FK que se precargan
+
+def validar_lista(datos, nombre='tareas'):
+    if not isinstance(datos, list) or not datos:
+        raise ValidationError({nombre: "Se espera una lista con al menos un elemento."})
+    if len(datos) > MAXIMO_POR_LOTE:
+        raise ValidationError({nombre: f"Máximo {MAXIMO_POR_LOTE} elementos por lote."})
+    return datos
+
+def _precargar(elementos, familia_ids):
+    """{campo: {id: objeto}} de las relaciones que nombran los elementos (solo de las familias del usuario)."""
+    ids = {campo: set() for campo in RELACIONES}
+    for elemento in elementos:
+        if not isinstance(elemento, dict):
+            continue
+        for campo, conjunto in ids.items():
+            valor = elemento.get(campo)
+            if isinstance(valor, int) or (isinstance(valor, str) and valor.isdecimal()): # isdigit() acepta '²', que int() rechaza
+                conjunto.add(int(valor))
+    return {
+        'familia': Familia.objects.in_bulk(ids['familia'] & set(familia_ids)),
+        'responsable': User.objects.in_bulk(ids['responsable']),
+        'plantilla': Tarea.objects.filter(familia_id__in=familia_ids).in_bulk(ids['plantilla']),
+    }
+
+def _error(indice, errores, tarea_id=None):
+    return {'indice': indice, 'id': tarea_id, 'ok': False, 'errores': errores}
+
+def _resumen(resultados):
+    aplicadas = sum(1 for resultado in resultados if resultado['ok'])
+    return {'aplicadas': aplicadas, 'rechazadas': len(resultados) - aplicadas, 'resultados': resultados}
+
+def crear(elementos, membresia, contexto):
+    """Crea las tareas válidas de 'elementos' (payloads como los de POST /api/tareas/)."""
+    contexto = {**contexto, 'precargados': _precargar(elementos, membresia.ids)}
+    resultados, nuevas = [], []
+    for indice, elemento in enumerate(elementos):
+        serializer = TareaSerializer(data=elemento, context=contexto)
+        if not serializer.is_valid():
+            resultados.append(_error(indice, serializer.errors))
+            continue
+        if serializer.validated_data.get('familia') is None:
+            resultados.append(_error(indice, {'familia': ["Este campo es requerido."]}))
+            continue
+        tarea = Tarea(**serializer.validated_data)
+        tarea.sincronizar_dias()
+        nuevas.append(tarea)
+        resultados.append({'indice': indice, 'id': None, 'ok': True, 'tarea': tarea})
+
+    if nuevas:
+        with transaction.atomic():
+            Tarea.objects.bulk_create(nuevas)
+            cargas.sumar(nuevas)
+            invalidar_familias({tarea.familia_id for tarea in nuevas}) # bulk_create no envía post_save
+
+    for resultado in resultados:
+        if resultado['ok']:
+            resultado['id'] = resultado.pop('tarea').id
+    return _resumen(resultados)
+
+@transaction.atomic
+def actualizar(elementos, membresia, contexto):
+    """Aplica cambios parciales ({'id': ..., campo: valor, ...}) a tareas de las familias del usuario."""
+    contexto = {**contexto, 'precargados': _precargar(elementos, membresia.ids)}
+    ids = {elemento.get('id') for elemento in elementos if isinstance(elemento, dict) and isinstance(elemento.get('id'), int)}
+    tareas = Tarea.objects.filter(familia_id__in=membresia.ids).select_for_update().in_bulk(ids)
+
+    resultados, modificadas, campos_modificados, aportes_previos = [], {}, set(), {}
+    familias_previas = set() # Si una tarea cambia de familia, también se invalida la de antes
+    for indice, elemento in enumerate(elementos):
+        tarea_id = elemento.get('id') if isinstance(elemento, dict) else None
+        tarea = tareas.get(tarea_id) if isinstance(tarea_id, int) else None # Una lista o un dict no sirven de clave
+        if tarea is None:
+            resultados.append(_error(indice, {'id': ["Tarea no encontrada."]}, tarea_id if isinstance(tarea_id, int) else None))
+            continue
+        datos = {campo: valor for campo, valor in elemento.items() if campo != 'id'}
+        serializer = TareaSerializer(tarea, data=datos, partial=True, context=contexto)
+        if not serializer.is_valid():
+            resultados.append(_error(indice, serializer.errors, tarea.id))
+            continue
+        aportes_previos.setdefault(tarea.id, cargas.aporte(tarea)) # Antes del primer cambio
+        familias_previas.add(tarea.familia_id)
+        for campo, valor in serializer.validated_data.items():
+            setattr(tarea, campo, valor)
+        tarea.sincronizar_dias()
+        campos_modificados.update(serializer.validated_data)
+        modificadas[tarea.id] = tarea
+        resultados.append({'indice': indice, 'id': tarea.id, 'ok': True})
+
+    if modificadas:
+        if campos_modificados & {'dias_recurrencia_csv', 'dias_recurrencia_mask', 'tipo', 'fecha_programada'}:
+            campos_modificados |= {'dias_recurrencia_csv', 'dias_recurrencia_mask', 'fecha_programada'}
+        _guardar_cambios(list(modificadas.values()), campos_modificados, aportes_previos, familias_previas)
+    return _resumen(resultados)
+
+@transaction.atomic
+def completar(ids, estado, membresia):
+    """Marca las tareas 'ids' (de las familias del usuario) con 'estado' ('hecha' o 'pendiente')."""
+    tareas = Tarea.objects.filter(familia_id__in=membresia.ids).select_for_update().in_bulk(
+        {tarea_id for tarea_id in ids if isinstance(tarea_id, int)}
+    )
+    resultados, modificadas, aportes_previos = [], {}, {}
+    for indice, tarea_id in enumerate(ids):
+        tarea = tareas.get(tarea_id) if isinstance(tarea_id, int) else None
+        if tarea is None:
+            resultados.append(_error(indice, {'id': ["Tarea no encontrada."]}, tarea_id))
+            continue
+        if tarea.estado != estado:
+            aportes_previos.setdefault(tarea.id, cargas.aporte(tarea))
+            tarea.estado = estado
+            modificadas[tarea.id] = tarea
+        resultados.append({'indice': indice, 'id': tarea.id, 'ok': True})
+
+    if modificadas:
+        _guardar_cambios(list(modificadas.values()), {'estado'}, aportes_previos)
+    return _resumen(resultados)
+
+def _guardar_cambios(tareas, campos, aportes_previos, familias_previas=()):
+    ahora = timezone.now()
+    for tarea in tareas:
+        tarea.modificado = ahora # bulk_update no aplica auto_now (sincronización por cambios)
+    with transaction.atomic():
+        Tarea.objects.bulk_update(tareas, sorted(campos | {'modificado'}))
+        cargas.registrar_cambios([(aportes_previos[tarea.id], tarea) for tarea in tareas])
+        registrar_tareas_movidas(tareas) # Eliminacion en la familia anterior (bulk_update no envía post_save)
+        invalidar_familias({tarea.familia_id for tarea in tareas} | set(familias_previas)) # bulk_update no envía post_save
@@ -0,0 +1,86 @@
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from myapp.models import Familia, nuevo_codigo_invitacion
+
+#🚨 Benchmark de creación de familias con muchas familias existentes 🚨
+# Todo ocurre dentro de una transacción que se deshace al final: la base de datos queda igual.
+# Cada familia necesita un jefe distinto (OneToOne), así que también se crean usuarios de prueba.
+
+
+def crear_jefes(prefijo, cantidad):
+    # Usuarios mínimos (sin contraseña utilizable: hashear un millón de claves tomaría horas)
+    return User.objects.bulk_create(
+        [User(username=f"{prefijo}-{numero}", password='!') for numero in range(cantidad)],
+        batch_size=1000,
+    )
+
+def crear_con_verificacion_previa(nombre, jefe):
+    # El algoritmo anterior: exists() por cada código candidato antes del INSERT (como referencia)
+    while True:
+        codigo = nuevo_codigo_invitacion()
+        if not Familia.objects.filter(codigo_invitacion=codigo).exists():
+            return Familia.objects.create(nombre=nombre, jefe=jefe, codigo_invitacion=codigo)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cuántas familias por segundo se crean (una a una y en bloque) con N familias ya existentes. "
+        "Los datos de prueba se deshacen al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--existentes', type=int, default=1_000_000, help="Familias a precargar (por defecto 10^6).")
+        parser.add_argument('--nuevas', type=int, default=1000, help="Familias a crear una a una en la medición.")
+        parser.add_argument('--lote', type=int, default=5000, help="Familias por bulk_create al precargar.")
+        parser.add_argument('--comparar', action='store_true', help="Mide también el algoritmo anterior (exists() antes de guardar).")
+
+    def handle(self, *args, **options):
+        existentes, nuevas, lote = options['existentes'], options['nuevas'], options['lote']
+        if existentes < 0 or nuevas <= 0 or lote <= 0:
+            raise CommandError("--existentes debe ser >= 0; --nuevas y --lote, positivos.")
+        prefijo = f"bench-{uuid.uuid4().hex[:8]}"
+
+        with transaction.atomic():
+            # 1. Precarga en bloque (crear_en_bloque), lote a lote para no tener todo en memoria
+            inicio = time.perf_counter()
+            for desde in range(0, existentes, lote):
+                cantidad = min(lote, existentes - desde)
+                jefes = crear_jefes(f"{prefijo}-e{desde}", cantidad)
+                Familia.crear_en_bloque([Familia(nombre=f"Familia {jefe.username}", jefe=jefe) for jefe in jefes], tamano_lote=lote)
+            self.informar("Precarga en bloque", existentes, time.perf_counter() - inicio)
+
+            # 2. Creación una a una (Familia.save: insertar y reintentar si el código choca)
+            self.medir("Una a una (sin verificación previa)", prefijo, 'n', nuevas,
+                       lambda nombre, jefe: Familia.objects.create(nombre=nombre, jefe=jefe))
+
+            if options['comparar']:
+                self.medir("Una a una (exists() antes de guardar)", prefijo, 'v', nuevas, crear_con_verificacion_previa)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Datos de prueba descartados (transacción deshecha)."))
+
+    def medir(self, titulo, prefijo, marca, cantidad, crear):
+        jefes = crear_jefes(f"{prefijo}-{marca}", cantidad)
+        sentencias = []
+
+        def contar(ejecutar, sql, params, many, contexto):
+            # Sin contar SAVEPOINT/RELEASE: solo lecturas y escrituras de datos
+            if not sql.upper().startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK')):
+                sentencias.append(sql)
+            return ejecutar(sql, params, many, contexto)
+
+        # execute_wrapper y no CaptureQueriesContext: el registro de consultas guarda solo las últimas 9000
+        with connection.execute_wrapper(contar):
+            inicio = time.perf_counter()
+            for jefe in jefes:
+                crear(f"Familia {jefe.username}", jefe)
+            segundos = time.perf_counter() - inicio
+        self.informar(titulo, cantidad, segundos, f"{len(sentencias) / cantidad:.2f} consultas por familia")
+
+    def informar(self, titulo, cantidad, segundos, detalle=''):
+        por_segundo = cantidad / segundos if segundos else float('inf')
+        self.stdout.write(f"{titulo}: {cantidad} familias en {segundos:.2f} s ({por_segundo:,.0f} familias/s) {detalle}".rstrip())
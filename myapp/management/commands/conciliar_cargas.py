@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from myapp.cargas import conciliar
+
+
+class Command(BaseCommand):
+    help = "Compara los contadores de carga pendiente (CargaPendiente) con las tareas reales y muestra los desvíos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--familias', type=int, nargs='+', help="IDs de familia (por defecto, todas).")
+        parser.add_argument('--corregir', action='store_true', help="Reescribe los contadores con los valores reales.")
+
+    def handle(self, *args, **options):
+        desvios = conciliar(options['familias'], corregir=options['corregir'])
+
+        if not desvios:
+            self.stdout.write(self.style.SUCCESS("Los contadores de carga están al día."))
+            return
+
+        for familia_id, usuario_id, guardado, real in desvios:
+            self.stdout.write(
+                f"  Familia {familia_id}, usuario {usuario_id}: guardado {guardado[0]} pendientes / {guardado[1]} min, "
+                f"real {real[0]} pendientes / {real[1]} min"
+            )
+
+        if options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f"{len(desvios)} contadores corregidos."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(desvios)} contadores desviados (usa --corregir para arreglarlos)."))
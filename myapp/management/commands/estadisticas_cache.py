@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from myapp.cache_fragmentos import estadisticas, reiniciar_estadisticas
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra los aciertos y fallos de la caché de fragmentos (lista de tareas y calendario). "
+        "Con LocMemCache cada proceso tiene su propia caché: usar un backend compartido para ver los del servidor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true', help="Pone los contadores en cero después de mostrarlos.")
+
+    def handle(self, *args, **options):
+        datos = estadisticas()
+        tasa = f"{datos['tasa_aciertos']:.1%}" if datos['tasa_aciertos'] is not None else "sin datos"
+        self.stdout.write(f"Aciertos: {datos['aciertos']}  Fallos: {datos['fallos']}  Tasa de aciertos: {tasa}")
+
+        if options['reiniciar']:
+            reiniciar_estadisticas()
+            self.stdout.write(self.style.SUCCESS("Contadores reiniciados."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from myapp.exportacion import exportar, FORMATOS, TAMANO_BLOQUE
+from myapp.models import Familia
+
+
+class Command(BaseCommand):
+    help = "Exporta el historial de tareas de una familia como NDJSON o CSV (por bloques, sin cargarlo todo en memoria)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('familia', type=int, help="ID de la familia.")
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='ndjson')
+        parser.add_argument('--salida', help="Archivo de destino (por defecto, la salida estándar).")
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help="Filas leídas por cada viaje a la base de datos.")
+
+    def handle(self, *args, **options):
+        if not Familia.objects.filter(id=options['familia']).exists():
+            raise CommandError(f"No existe la familia {options['familia']}.")
+        if options['bloque'] <= 0:
+            raise CommandError("--bloque debe ser un entero positivo.")
+
+        bloques = exportar(options['familia'], options['formato'], options['bloque'])
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8', newline='') as archivo:
+                for bloque in bloques:
+                    archivo.write(bloque)
+            self.stderr.write(self.style.SUCCESS(f"Exportación guardada en {options['salida']}."))
+        else:
+            for bloque in bloques:
+                self.stdout.write(bloque, ending='')
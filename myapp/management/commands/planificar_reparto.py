@@ -0,0 +1,37 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from myapp.models import Familia
+from myapp.reparto import planificar_reparto, plan_a_dict, MODO_VORAZ, MODOS_REPARTO
+
+
+class Command(BaseCommand):
+    help = "Muestra el reparto que se haría para una familia, sin escribir nada en la DB."
+
+    def add_arguments(self, parser):
+        parser.add_argument('familia_id', type=int)
+        parser.add_argument('--modo', default=MODO_VORAZ, choices=[valor for valor, _ in MODOS_REPARTO])
+        parser.add_argument('--json', action='store_true', help="Imprime el plan completo en JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            familia = Familia.objects.get(id=options['familia_id'])
+        except Familia.DoesNotExist:
+            raise CommandError(f"No existe la familia {options['familia_id']}.")
+
+        plan = plan_a_dict(planificar_reparto(familia, options['modo']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(plan, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f"Familia '{familia.nombre}' (modo {plan['modo']}): {plan['miembros']} miembros, "
+            f"{plan['plantillas']} plantillas, {len(plan['asignaciones'])} instancias propuestas."
+        )
+        for asignacion in plan['asignaciones']:
+            self.stdout.write(f"  {asignacion['nombre']} -> {asignacion['responsable']}")
+        for fallo in plan['no_asignables']:
+            self.stdout.write(self.style.WARNING(f"  Sin miembro disponible: {fallo['tarea']} ({fallo['dia']})"))
+
+        tiempos = ", ".join(f"{fase} {segundos * 1000:.1f} ms" for fase, segundos in plan['tiempos'].items())
+        self.stdout.write(f"Tiempos: {tiempos}")
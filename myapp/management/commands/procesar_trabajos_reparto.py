@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from myapp.trabajos import tomar_siguiente_trabajo, procesar_trabajo
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de repartos: ejecuta los trabajos encolados por la vista repartir_tareas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Procesa lo que haya en cola y termina.")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos de espera cuando la cola está vacía.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            trabajo = tomar_siguiente_trabajo()
+
+            if trabajo is None:
+                if options['una_vez']:
+                    return
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f"Procesando reparto #{trabajo.id} (familia {trabajo.familia_id}, modo {trabajo.modo})...")
+            try:
+                procesar_trabajo(trabajo)
+            except Exception as error:
+                self.stderr.write(self.style.ERROR(f"Reparto #{trabajo.id} falló: {error}"))
+                continue
+
+            self.stdout.write(self.style.SUCCESS(
+                f"Reparto #{trabajo.id} completado: {trabajo.asignaciones} instancias "
+                f"en {len(trabajo.lotes)} lote(s) {trabajo.lotes}, {len(trabajo.fallos)} fallos."
+            ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from myapp.sincronizacion import purgar_eliminaciones
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra los registros de eliminación más antiguos que la retención (settings.SYNC_RETENCION_DIAS). "
+        "Los clientes con un cursor más antiguo hacen una sincronización completa."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help="Retención en días (por defecto, settings.SYNC_RETENCION_DIAS).")
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError("--dias no puede ser negativo.")
+        borradas = purgar_eliminaciones(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f"{borradas} registros de eliminación borrados."))
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from myapp.models import DisponibilidadDiaria
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el resumen de disponibilidad diaria (DisponibilidadDiaria) a partir de los Horario."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, nargs='+', help="IDs de usuario (por defecto, todos).")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            filas = DisponibilidadDiaria.reconstruir(options['usuarios'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen reconstruido: {filas} filas (usuario, día) en {time.perf_counter() - inicio:.2f}s."
+        ))
@@ -0,0 +1,146 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from myapp.models import Familia
+from myapp.reparto import ejecutar_reparto, MODO_VORAZ, MODOS_REPARTO
+
+#🚨 Reparto semanal de TODAS las familias (o un subconjunto) en paralelo 🚨
+# Cada proceso del pool abre su PROPIA conexión a la DB y reparte un bloque de ids de familia.
+# Un usuario puede ser miembro de varias familias: sus repartos leen la misma agenda y la misma
+# carga, y en procesos paralelos lo ocuparían dos veces en la misma franja. Por eso las familias
+# que comparten miembros (directa o indirectamente) van en el MISMO bloque, una después de otra.
+
+def iniciar_proceso():
+    # En 'spawn' el proceso hijo arranca sin Django; en 'fork' hereda las conexiones del padre,
+    # que no se pueden compartir: se cierran para que cada proceso abra la suya.
+    django.setup()
+    connections.close_all()
+
+def agrupar_por_miembros(familia_ids):
+    """Grupos de familias unidas por miembros en común (cada grupo en orden de id, los grupos por su primer id)."""
+    padre = {familia_id: familia_id for familia_id in familia_ids}
+
+    def raiz(familia_id):
+        while padre[familia_id] != familia_id:
+            padre[familia_id] = padre[padre[familia_id]]
+            familia_id = padre[familia_id]
+        return familia_id
+
+    primera_de_usuario = {}
+    for familia_id, usuario_id in Familia.miembros.through.objects.filter(
+        familia_id__in=familia_ids
+    ).values_list('familia_id', 'user_id'):
+        otra = primera_de_usuario.setdefault(usuario_id, familia_id)
+        padre[raiz(familia_id)] = raiz(otra)
+
+    grupos = {}
+    for familia_id in sorted(familia_ids):
+        grupos.setdefault(raiz(familia_id), []).append(familia_id)
+    return list(grupos.values())
+
+def armar_bloques(grupos, tamano):
+    # Bloques de unas 'tamano' familias sin partir ningún grupo (uno grande queda entero en su bloque)
+    bloques, actual = [], []
+    for grupo in grupos:
+        actual.extend(grupo)
+        if len(actual) >= tamano:
+            bloques.append(actual)
+            actual = []
+    if actual:
+        bloques.append(actual)
+    return bloques
+
+def repartir_bloque(familia_ids, modo, tamano_lote):
+    """Reparte un bloque de familias dentro de un proceso del pool. Devuelve una fila por familia."""
+    resultados = []
+    for familia_id in familia_ids:
+        inicio = time.perf_counter()
+        try:
+            familia = Familia.objects.get(id=familia_id)
+            resultado = ejecutar_reparto(familia, tamano_lote=tamano_lote, modo=modo)
+            resultados.append({
+                'familia': familia_id,
+                'asignaciones': resultado['asignaciones'],
+                'fallos': len(resultado['fallos']),
+                'error': None,
+                'segundos': time.perf_counter() - inicio,
+            })
+        except Exception as error:
+            resultados.append({
+                'familia': familia_id,
+                'asignaciones': 0,
+                'fallos': 0,
+                'error': f"{type(error).__name__}: {error}",
+                'segundos': time.perf_counter() - inicio,
+            })
+    return resultados
+
+
+class Command(BaseCommand):
+    help = "Ejecuta el reparto de tareas de todas las familias (o las indicadas) usando varios procesos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--familias', nargs='+', type=int, help="IDs de las familias a repartir (por defecto, todas).")
+        parser.add_argument('--nombre', help="Solo familias cuyo nombre contenga este texto.")
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help="Cantidad de procesos del pool.")
+        parser.add_argument('--bloque', type=int, default=50, help="Familias por bloque enviado a cada proceso.")
+        parser.add_argument('--modo', default=MODO_VORAZ, choices=[valor for valor, _ in MODOS_REPARTO])
+        parser.add_argument('--tamano-lote', type=int, default=None, help="Instancias por INSERT (por defecto settings.REPARTO_TAMANO_LOTE).")
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 1 or options['bloque'] < 1:
+            raise CommandError("--procesos y --bloque deben ser enteros positivos.")
+
+        familias = Familia.objects.order_by('id')
+        if options['familias']:
+            familias = familias.filter(id__in=options['familias'])
+        if options['nombre']:
+            familias = familias.filter(nombre__icontains=options['nombre'])
+        familia_ids = list(familias.values_list('id', flat=True))
+
+        if not familia_ids:
+            self.stdout.write("No hay familias que repartir.")
+            return
+
+        bloques = armar_bloques(agrupar_por_miembros(familia_ids), options['bloque'])
+        self.stdout.write(
+            f"Repartiendo {len(familia_ids)} familias en {len(bloques)} bloques con {options['procesos']} procesos..."
+        )
+
+        inicio = time.perf_counter()
+        resultados = []
+        if options['procesos'] == 1:
+            # Sin pool: todo en este proceso y con su conexión
+            for ids in bloques:
+                resultados.extend(repartir_bloque(ids, options['modo'], options['tamano_lote']))
+        else:
+            # Las conexiones del proceso principal no deben heredarse en los hijos
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['procesos'], initializer=iniciar_proceso) as pool:
+                futuros = [
+                    pool.submit(repartir_bloque, ids, options['modo'], options['tamano_lote'])
+                    for ids in bloques
+                ]
+                for futuro in as_completed(futuros):
+                    resultados.extend(futuro.result())
+        segundos = time.perf_counter() - inicio
+
+        errores = [r for r in resultados if r['error']]
+        instancias = sum(r['asignaciones'] for r in resultados)
+        sin_candidato = sum(r['fallos'] for r in resultados)
+
+        for r in sorted(errores, key=lambda r: r['familia']):
+            self.stderr.write(self.style.ERROR(f"Familia {r['familia']}: {r['error']}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo en {segundos:.2f} s: {len(resultados) - len(errores)} familias repartidas, "
+            f"{len(errores)} con error, {instancias} instancias creadas, "
+            f"{sin_candidato} (tarea, día) sin miembro disponible."
+        ))
+        if segundos > 0:
+            self.stdout.write(
+                f"Rendimiento: {len(resultados) / segundos:.1f} familias/s, {instancias / segundos:.1f} instancias/s."
+            )
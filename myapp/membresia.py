@@ -0,0 +1,85 @@
+from django.db.models import Q
+from django.utils.functional import cached_property
+from .models import Familia
+
+#🚨 MEMBRESÍA DE LA PETICIÓN 🚨
+# MembresiaMiddleware deja en request.membresia las familias del usuario (como jefe y como miembro).
+# Se cargan con UNA consulta la primera vez que alguna vista las usa y quedan memorizadas
+# durante toda la petición; las páginas que no las usan no pagan nada.
+
+class Membresia:
+    """Familias que dirige y a las que pertenece 'usuario', resueltas una sola vez."""
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+
+    @cached_property
+    def _familias(self):
+        if not self.usuario.is_authenticated:
+            return []
+        como_miembro = Familia.miembros.through.objects.filter(user=self.usuario).values('familia_id')
+        return list(
+            Familia.objects.filter(Q(jefe=self.usuario) | Q(id__in=como_miembro))
+            .select_related('jefe')
+            .order_by('id')
+        )
+
+    @cached_property
+    def familias_jefe(self):
+        return [familia for familia in self._familias if familia.jefe_id == self.usuario.id]
+
+    @cached_property
+    def familias_miembro(self):
+        # Familias a las que pertenece sin ser el jefe
+        return [familia for familia in self._familias if familia.jefe_id != self.usuario.id]
+
+    @property
+    def familias(self):
+        # Primero las que dirige, luego las demás (el orden en que las mostraban las vistas)
+        return self.familias_jefe + self.familias_miembro
+
+    @property
+    def ids(self):
+        return [familia.id for familia in self.familias]
+
+    @property
+    def es_jefe(self):
+        return bool(self.familias_jefe)
+
+    @property
+    def familia(self):
+        # Familia principal: la que dirige o, si no dirige ninguna, la primera a la que pertenece
+        familias = self.familias
+        return familias[0] if familias else None
+
+    def es_jefe_de(self, familia_id):
+        return any(familia.id == familia_id for familia in self.familias_jefe)
+
+    def pertenece_a(self, familia_id):
+        return familia_id in self.ids
+
+    def olvidar(self):
+        # Tras crear o unirse a una familia en la misma petición
+        for atributo in ('_familias', 'familias_jefe', 'familias_miembro'):
+            self.__dict__.pop(atributo, None)
+
+
+def membresia_de(request):
+    """
+    request.membresia si corresponde al usuario de la petición. Si la petición no pasó por
+    el middleware, o la API autenticó a otro usuario (ej: por token), se crea una nueva.
+    """
+    membresia = getattr(request, 'membresia', None)
+    if membresia is None or membresia.usuario != request.user:
+        membresia = Membresia(request.user)
+    return membresia
+
+
+class MembresiaMiddleware:
+    # Va después de AuthenticationMiddleware: request.user sigue siendo perezoso hasta que se usa
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.membresia = Membresia(request.user)
+        return self.get_response(request)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_tarea_responsable'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReparto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modo', models.CharField(default='voraz', max_length=10)),
+                ('estado', models.CharField(choices=[('en_cola', 'En cola'), ('en_curso', 'En curso'), ('completado', 'Completado'), ('fallido', 'Fallido')], db_index=True, default='en_cola', max_length=12)),
+                ('progreso', models.PositiveSmallIntegerField(default=0)),
+                ('etapa', models.CharField(blank=True, max_length=50)),
+                ('asignaciones', models.IntegerField(default=0)),
+                ('fallos', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_termino', models.DateTimeField(blank=True, null=True)),
+                ('familia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_reparto', to='myapp.familia')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_trabajoreparto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='hora_inicio',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='hora_termino',
+            field=models.TimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+# Copia fija de los bits (una migración no debe depender del código actual del modelo)
+DIA_BITS = {'LUN': 1, 'MAR': 2, 'MIE': 4, 'JUE': 8, 'VIE': 16, 'SAB': 32, 'DOM': 64}
+
+
+def rellenar_tipo_y_mascara(apps, schema_editor):
+    # Plantillas: CSV con días -> máscara. Instancias (CSV NULL): el día sale del sufijo "Nombre (DIA)".
+    Tarea = apps.get_model('myapp', 'Tarea')
+    cambiadas = []
+    for tarea in Tarea.objects.only('id', 'nombre', 'dias_recurrencia_csv').iterator(chunk_size=500):
+        if tarea.dias_recurrencia_csv is None:
+            tarea.tipo = 'instancia'
+            sufijo = tarea.nombre.rstrip()[-5:]
+            dia = sufijo[1:4].upper() if sufijo.startswith('(') and sufijo.endswith(')') else ''
+            tarea.dias_recurrencia_mask = DIA_BITS.get(dia, 0)
+        else:
+            tarea.tipo = 'plantilla'
+            tarea.dias_recurrencia_mask = 0
+            for dia in tarea.dias_recurrencia_csv.split(','):
+                tarea.dias_recurrencia_mask |= DIA_BITS.get(dia.strip().upper(), 0)
+        cambiadas.append(tarea)
+    Tarea.objects.bulk_update(cambiadas, ['tipo', 'dias_recurrencia_mask'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_tarea_franja_horaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='dias_recurrencia_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, help_text='Días de la semana como máscara de 7 bits (LUN=1, MAR=2, MIE=4, ..., DOM=64). En una instancia, el bit de su día.'),
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='tipo',
+            field=models.CharField(choices=[('plantilla', 'Plantilla'), ('instancia', 'Instancia')], db_index=True, default='plantilla', max_length=10),
+        ),
+        migrations.RunPython(rellenar_tipo_y_mascara, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:55
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+
+# Índice de cada bit de día (LUN=1 -> lunes=0, ..., DOM=64 -> domingo=6)
+WEEKDAY_DE_BIT = {1 << indice: indice for indice in range(7)}
+
+
+def rellenar_plantilla_y_fecha(apps, schema_editor):
+    # Fecha: la misma que calculaba el calendario (su día en la semana de su creación, el mismo día cuenta).
+    # Plantilla: la de la familia con el nombre de la instancia sin el sufijo " (DIA)".
+    Tarea = apps.get_model('myapp', 'Tarea')
+    plantillas = {}
+    for tarea_id, familia_id, nombre in Tarea.objects.filter(tipo='plantilla').order_by('-fecha_creacion').values_list('id', 'familia_id', 'nombre'):
+        plantillas[(familia_id, nombre)] = tarea_id # Si hay nombres repetidos gana la más antigua
+
+    cambiadas = []
+    for tarea in Tarea.objects.filter(tipo='instancia').only('id', 'familia_id', 'nombre', 'dias_recurrencia_mask', 'fecha_creacion').iterator(chunk_size=500):
+        weekday = WEEKDAY_DE_BIT.get(tarea.dias_recurrencia_mask)
+        if weekday is not None:
+            creada = tarea.fecha_creacion.date()
+            tarea.fecha_programada = creada + timedelta(days=(weekday - creada.weekday()) % 7)
+            nombre_base = tarea.nombre.rstrip()[:-6].rstrip()
+            tarea.plantilla_id = plantillas.get((tarea.familia_id, nombre_base))
+            cambiadas.append(tarea)
+    Tarea.objects.bulk_update(cambiadas, ['fecha_programada', 'plantilla'], batch_size=500)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_tarea_tipo_dias_recurrencia_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='fecha_programada',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='plantilla',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='instancias', to='myapp.tarea'),
+        ),
+        migrations.RunPython(rellenar_plantilla_y_fecha, migrations.RunPython.noop),
+    ]
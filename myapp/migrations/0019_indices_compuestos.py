@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_tarea_plantilla_fecha_programada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='horario',
+            index=models.Index(fields=['usuario', 'dia', 'disponible'], name='horario_usuario_dia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['familia', 'estado', 'tipo', 'fecha_creacion'], name='tarea_fam_estado_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['responsable', 'estado', 'tipo'], name='tarea_resp_estado_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['familia', 'tipo', 'dias_recurrencia_mask'], name='tarea_fam_tipo_dia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['familia', 'tipo', 'fecha_programada'], name='tarea_fam_tipo_fecha_idx'),
+        ),
+    ]
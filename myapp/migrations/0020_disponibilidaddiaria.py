@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def construir_resumen(apps, schema_editor):
+    # Resumen inicial desde los Horario existentes (bloques fusionados por usuario y día)
+    Horario = apps.get_model('myapp', 'Horario')
+    DisponibilidadDiaria = apps.get_model('myapp', 'DisponibilidadDiaria')
+
+    bloques = {}
+    for usuario_id, dia, hora_inicio, hora_termino in Horario.objects.filter(disponible=True).values_list(
+        'usuario_id', 'dia', 'hora_inicio', 'hora_termino'
+    ):
+        bloques.setdefault((usuario_id, dia), []).append(
+            (hora_inicio.hour * 60 + hora_inicio.minute, hora_termino.hour * 60 + hora_termino.minute)
+        )
+
+    filas = []
+    for (usuario_id, dia), bloques_dia in bloques.items():
+        fusionados = []
+        for inicio, fin in sorted(bloques_dia):
+            if fin <= inicio:
+                continue
+            if fusionados and inicio <= fusionados[-1][1]:
+                fusionados[-1][1] = max(fusionados[-1][1], fin)
+            else:
+                fusionados.append([inicio, fin])
+        if fusionados:
+            filas.append(DisponibilidadDiaria(
+                usuario_id=usuario_id,
+                dia=dia,
+                minutos_totales=sum(fin - inicio for inicio, fin in fusionados),
+                intervalos=fusionados,
+            ))
+    DisponibilidadDiaria.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_indices_compuestos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisponibilidadDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.CharField(choices=[('LUN', 'Lunes'), ('MAR', 'Martes'), ('MIE', 'Miércoles'), ('JUE', 'Jueves'), ('VIE', 'Viernes'), ('SAB', 'Sábado'), ('DOM', 'Domingo')], max_length=3)),
+                ('minutos_totales', models.PositiveIntegerField(default=0)),
+                ('intervalos', models.JSONField(default=list)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disponibilidad_diaria', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'dia'), name='disponibilidad_usuario_dia_unica')],
+            },
+        ),
+        migrations.RunPython(construir_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def contar_cargas(apps, schema_editor):
+    # Contadores iniciales: instancias pendientes con responsable, por (familia, responsable)
+    Tarea = apps.get_model('myapp', 'Tarea')
+    CargaPendiente = apps.get_model('myapp', 'CargaPendiente')
+    filas = Tarea.objects.filter(
+        tipo='instancia', estado='pendiente', responsable__isnull=False, familia__isnull=False
+    ).values('familia_id', 'responsable_id').annotate(
+        pendientes=Count('id'), minutos=Sum('tiempo_requerido_minutos')
+    ).order_by()
+    CargaPendiente.objects.bulk_create([
+        CargaPendiente(
+            familia_id=fila['familia_id'],
+            usuario_id=fila['responsable_id'],
+            pendientes=fila['pendientes'],
+            minutos_pendientes=fila['minutos'] or 0,
+        )
+        for fila in filas
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_disponibilidaddiaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pendientes', models.PositiveIntegerField(default=0)),
+                ('minutos_pendientes', models.PositiveIntegerField(default=0)),
+                ('familia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cargas_pendientes', to='myapp.familia')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cargas_pendientes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'pendientes'], name='carga_usuario_idx')],
+                'constraints': [models.UniqueConstraint(fields=('familia', 'usuario'), name='carga_familia_usuario_unica')],
+            },
+        ),
+        migrations.RunPython(contar_cargas, migrations.RunPython.noop),
+    ]
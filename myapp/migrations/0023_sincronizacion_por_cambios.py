@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:22
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def modificado_desde_creacion(apps, schema_editor):
+    # Las tareas existentes toman su fecha de creación (mejor referencia que la hora de la migración)
+    Tarea = apps.get_model('myapp', 'Tarea')
+    Tarea.objects.update(modificado=F('fecha_creacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0022_tarea_lista_paginada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('tarea', 'Tarea'), ('horario', 'Horario')], max_length=10)),
+                ('objeto_id', models.BigIntegerField()),
+                ('familia_id', models.BigIntegerField(blank=True, null=True)),
+                ('usuario_id', models.BigIntegerField(blank=True, null=True)),
+                ('eliminado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='horario',
+            name='modificado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='modificado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(modificado_desde_creacion, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='horario',
+            index=models.Index(fields=['usuario', 'modificado', 'id'], name='horario_usuario_mod_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['familia', 'modificado', 'id'], name='tarea_fam_modificado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['familia_id', 'eliminado', 'id'], name='eliminacion_familia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['usuario_id', 'eliminado', 'id'], name='eliminacion_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['eliminado'], name='eliminacion_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0023_sincronizacion_por_cambios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfil',
+            name='modificado',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
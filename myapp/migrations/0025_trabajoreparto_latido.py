@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0024_perfil_modificado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreparto',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trabajoreparto',
+            name='latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+from datetime import timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+# Índice de cada bit de día (LUN=1 -> lunes=0, ..., DOM=64 -> domingo=6)
+WEEKDAY_DE_BIT = {1 << indice: indice for indice in range(7)}
+
+
+def fechar_instancias_sin_fecha(apps, schema_editor):
+    # Instancias creadas por la API o en lote después de 0018, sin fecha_programada: la misma regla
+    # que 0018 (su día en la semana de su creación, el mismo día cuenta) para que vuelvan al calendario
+    Tarea = apps.get_model('myapp', 'Tarea')
+    ahora = timezone.now() # bulk_update no aplica auto_now: /api/sync/ tiene que volver a enviarlas
+    cambiadas = []
+    sin_fecha = Tarea.objects.filter(tipo='instancia', fecha_programada__isnull=True)
+    for tarea in sin_fecha.only('id', 'dias_recurrencia_mask', 'fecha_creacion', 'modificado').iterator(chunk_size=500):
+        weekday = WEEKDAY_DE_BIT.get(tarea.dias_recurrencia_mask)
+        if weekday is not None:
+            creada = tarea.fecha_creacion.date()
+            tarea.fecha_programada = creada + timedelta(days=(weekday - creada.weekday()) % 7)
+            tarea.modificado = ahora
+            cambiadas.append(tarea)
+    Tarea.objects.bulk_update(cambiadas, ['fecha_programada', 'modificado'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0025_trabajoreparto_latido'),
+    ]
+
+    operations = [
+        migrations.RunPython(fechar_instancias_sin_fecha, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0026_instancias_sin_fecha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreparto',
+            name='lotes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
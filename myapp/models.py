@@ -1,11 +1,13 @@
-from django.db import models
-import random, string
+from django.db import models, IntegrityError, transaction
+from django.utils import timezone
+import secrets, string
 from django.contrib.auth.models import User
-from datetime import date
-from django.db.models.signals import post_save
+from datetime import date, time, timedelta
+from django.db.models.signals import post_save, pre_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django import forms
-from django.db.models import F, ExpressionWrapper, fields 
+from django.db.models import F, Q, Sum
+from .cache_fragmentos import invalidar_familias
 
 #🚨🚨🚨NO TOCAR NADA DE LO QUE YA ESTA HECHO A MENOS QUE SEA NECESARIO🚨🚨🚨
 
@@ -20,9 +22,46 @@ DIAS_SEMANA_CHOICES = [
     ('DOM', 'Domingo'),
 ]
 
+# Bit de cada día en Tarea.dias_recurrencia_mask (LUN=1, MAR=2, MIE=4, ..., DOM=64)
+DIA_BITS = {codigo: 1 << indice for indice, (codigo, _) in enumerate(DIAS_SEMANA_CHOICES)}
+
+def dias_a_mascara(dias):
+    # ['LUN', 'MIE'] -> 5 (ignora vacíos y códigos desconocidos)
+    mascara = 0
+    for dia in dias:
+        mascara |= DIA_BITS.get(dia.strip().upper(), 0)
+    return mascara
+
+def mascara_a_dias(mascara):
+    # 5 -> ['LUN', 'MIE'] (en orden de la semana)
+    return [codigo for codigo, bit in DIA_BITS.items() if mascara & bit]
+
+# Códigos de invitación: 8 caracteres de A-Z0-9 (36^8 ≈ 2,8 billones de combinaciones).
+# No se consulta si el código existe antes de guardar: se inserta y, si choca con la
+# restricción UNIQUE (muy improbable incluso con millones de familias), se reintenta con otro.
+ALFABETO_CODIGO = string.ascii_uppercase + string.digits
+LARGO_CODIGO = 8
+INTENTOS_CODIGO = 5
+
+def nuevo_codigo_invitacion():
+    # secrets en vez de random: el código es lo único que se pide para unirse a una familia.
+    # Un solo número al azar en [0, 36^8) escrito en base 36 (uniforme, sin sorteo por carácter)
+    numero = secrets.randbelow(len(ALFABETO_CODIGO) ** LARGO_CODIGO)
+    caracteres = []
+    for _ in range(LARGO_CODIGO):
+        numero, resto = divmod(numero, len(ALFABETO_CODIGO))
+        caracteres.append(ALFABETO_CODIGO[resto])
+    return ''.join(caracteres)
+
+def es_conflicto_de_codigo(error):
+    # El mensaje de la IntegrityError nombra la columna/índice en SQLite, PostgreSQL y MySQL
+    return 'codigo_invitacion' in str(error)
+
 class Perfil(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE) 
     fecha_nacimiento = models.DateField(null=True, blank=True)
+    # Última modificación (validador del GET condicional, ver condicional.py)
+    modificado = models.DateTimeField(auto_now=True)
 
     def edad(self):
         if self.fecha_nacimiento:
@@ -33,24 +72,9 @@ class Perfil(models.Model):
         return None
     
     def minutos_disponibles(self):
-        #calcula el total de minutos disponibles sumando los bloques de Horario
-        
-        # Obtenemos los horarios del usuario actual que están marcados como disponibles
-        horarios_query = self.usuario.horario_set.filter(disponible=True).annotate(
-            # Calcula la diferencia entre hora_termino y hora_inicio
-            duracion_td=ExpressionWrapper(
-                F('hora_termino') - F('hora_inicio'),
-                output_field=fields.DurationField()
-            )
-        )
-        
-        total_minutos = 0
-        for horario in horarios_query:
-            # Convertir la duración total a segundos y luego a minutos
-            total_segundos = horario.duracion_td.total_seconds()
-            total_minutos += int(total_segundos / 60)
-            
-        return total_minutos
+        #total de minutos disponibles de la semana, leído del resumen precalculado (DisponibilidadDiaria)
+        total = self.usuario.disponibilidad_diaria.aggregate(total=Sum('minutos_totales'))['total']
+        return total or 0
 
     def __str__(self):
         return self.usuario.username
@@ -84,23 +108,67 @@ class Familia(models.Model):
 
     def save(self, *args, **kwargs):
         """Genera un código de invitación único automáticamente al guardar."""
-        if not self.codigo_invitacion:
-            while True:
-                codigo = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-                if not Familia.objects.filter(codigo_invitacion=codigo).exists():
-                    self.codigo_invitacion = codigo
-                    break
-        super().save(*args, **kwargs)
+        if self.codigo_invitacion:
+            super().save(*args, **kwargs)
+        else:
+            self._guardar_con_codigo_nuevo(*args, **kwargs)
 
     def generar_codigo(self):
         """Permite regenerar un nuevo código de invitación."""
-        letras = string.ascii_uppercase + string.digits
-        while True:
-            codigo = ''.join(random.choices(letras, k=8))
-            if not Familia.objects.filter(codigo_invitacion=codigo).exists():
-                self.codigo_invitacion = codigo
-                self.save()
-                break
+        self._guardar_con_codigo_nuevo(update_fields=['codigo_invitacion'] if self.pk else None)
+
+    def _guardar_con_codigo_nuevo(self, *args, **kwargs):
+        # Cada intento va en un savepoint: si el código choca, se deshace solo ese INSERT/UPDATE
+        for intento in range(INTENTOS_CODIGO):
+            self.codigo_invitacion = nuevo_codigo_invitacion()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError as error:
+                if not es_conflicto_de_codigo(error) or intento == INTENTOS_CODIGO - 1:
+                    raise
+
+    @classmethod
+    def crear_en_bloque(cls, familias, tamano_lote=1000):
+        """
+        Inserta 'familias' (sin guardar) con bulk_create, asignando códigos a las que no tienen.
+        Para cargas iniciales e importaciones: no envía post_save, igual que bulk_create.
+        """
+        for inicio in range(0, len(familias), tamano_lote):
+            lote = familias[inicio:inicio + tamano_lote]
+            usados = {familia.codigo_invitacion for familia in lote if familia.codigo_invitacion}
+            generadas = [familia for familia in lote if not familia.codigo_invitacion]
+            for familia in generadas:
+                familia.codigo_invitacion = cls._codigo_fuera_de(usados)
+
+            for intento in range(INTENTOS_CODIGO):
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_create(lote)
+                    break
+                except IntegrityError as error:
+                    if not es_conflicto_de_codigo(error) or intento == INTENTOS_CODIGO - 1:
+                        raise
+                    # Solo tras un choque se consulta cuáles códigos generados ya existían, y se cambian
+                    ocupados = set(cls.objects.filter(
+                        codigo_invitacion__in=[familia.codigo_invitacion for familia in generadas]
+                    ).values_list('codigo_invitacion', flat=True))
+                    if not ocupados: # El choque es con un código que trajo la importación
+                        raise
+                    for familia in generadas:
+                        if familia.codigo_invitacion in ocupados:
+                            familia.codigo_invitacion = cls._codigo_fuera_de(usados)
+        return familias
+
+    @staticmethod
+    def _codigo_fuera_de(usados):
+        # Código nuevo que no se repite dentro del mismo lote
+        codigo = nuevo_codigo_invitacion()
+        while codigo in usados:
+            codigo = nuevo_codigo_invitacion()
+        usados.add(codigo)
+        return codigo
 
 
 class Horario(models.Model):
@@ -119,22 +187,167 @@ class Horario(models.Model):
     hora_inicio = models.TimeField()
     hora_termino = models.TimeField()
     disponible = models.BooleanField(default=True)
+    # Última modificación (sincronización por cambios, ver sincronizacion.py)
+    modificado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Disponibilidad de un miembro en un día (perfil, reparto, reasignación)
+            models.Index(fields=['usuario', 'dia', 'disponible'], name='horario_usuario_dia_idx'),
+            # Horarios de un usuario cambiados desde un cursor (/api/sync/)
+            models.Index(fields=['usuario', 'modificado', 'id'], name='horario_usuario_mod_idx'),
+        ]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.get_dia_display()} ({self.hora_inicio} a {self.hora_termino})"
 
 
+class DisponibilidadDiaria(models.Model):
+    """
+    Resumen precalculado de los Horario disponibles de un usuario en un día: minutos totales
+    y bloques fusionados (sin traslapes). Se mantiene con las señales de Horario (ver abajo)
+    y se reconstruye con 'manage.py reconstruir_disponibilidad'. Un día sin bloques no tiene fila.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='disponibilidad_diaria')
+    dia = models.CharField(max_length=3, choices=DIAS_SEMANA_CHOICES)
+    minutos_totales = models.PositiveIntegerField(default=0)
+    # [[inicio, fin], ...] en minutos desde las 00:00, ordenados y sin traslapes
+    intervalos = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'dia'], name='disponibilidad_usuario_dia_unica'),
+        ]
+
+    @staticmethod
+    def fusionar(bloques):
+        # [(inicio, fin), ...] en minutos -> intervalos ordenados, fusionando los que se traslapan
+        fusionados = []
+        for inicio, fin in sorted(bloques):
+            if fin <= inicio:
+                continue
+            if fusionados and inicio <= fusionados[-1][1]:
+                fusionados[-1][1] = max(fusionados[-1][1], fin)
+            else:
+                fusionados.append([inicio, fin])
+        return fusionados
+
+    @classmethod
+    def desde_bloques(cls, usuario_id, dia, bloques):
+        intervalos = cls.fusionar(bloques)
+        return cls(
+            usuario_id=usuario_id,
+            dia=dia,
+            minutos_totales=sum(fin - inicio for inicio, fin in intervalos),
+            intervalos=intervalos,
+        )
+
+    @classmethod
+    def recalcular(cls, usuario_id, dias):
+        """Vuelve a calcular el resumen de 'usuario_id' en los días indicados a partir de sus Horario."""
+        dias = set(dias)
+        bloques = {dia: [] for dia in dias}
+        horarios = Horario.objects.filter(usuario_id=usuario_id, dia__in=dias, disponible=True).values_list(
+            'dia', 'hora_inicio', 'hora_termino'
+        )
+        for dia, hora_inicio, hora_termino in horarios:
+            bloques[dia].append((hora_inicio.hour * 60 + hora_inicio.minute, hora_termino.hour * 60 + hora_termino.minute))
+
+        for dia, bloques_dia in bloques.items():
+            resumen = cls.desde_bloques(usuario_id, dia, bloques_dia)
+            if resumen.intervalos:
+                cls.objects.update_or_create(
+                    usuario_id=usuario_id,
+                    dia=dia,
+                    defaults={'minutos_totales': resumen.minutos_totales, 'intervalos': resumen.intervalos},
+                )
+            else:
+                cls.objects.filter(usuario_id=usuario_id, dia=dia).delete()
+
+    @classmethod
+    def reconstruir(cls, usuarios=None):
+        """Reconstruye todo el resumen (o el de 'usuarios') desde Horario. Devuelve las filas creadas."""
+        horarios = Horario.objects.filter(disponible=True)
+        resumenes = cls.objects.all()
+        if usuarios is not None:
+            horarios = horarios.filter(usuario__in=usuarios)
+            resumenes = resumenes.filter(usuario__in=usuarios)
+
+        bloques = {}
+        for usuario_id, dia, hora_inicio, hora_termino in horarios.values_list('usuario_id', 'dia', 'hora_inicio', 'hora_termino'):
+            bloques.setdefault((usuario_id, dia), []).append(
+                (hora_inicio.hour * 60 + hora_inicio.minute, hora_termino.hour * 60 + hora_termino.minute)
+            )
+        nuevos = [cls.desde_bloques(usuario_id, dia, bloques_dia) for (usuario_id, dia), bloques_dia in bloques.items()]
+        nuevos = [resumen for resumen in nuevos if resumen.intervalos]
+
+        resumenes.delete()
+        cls.objects.bulk_create(nuevos, batch_size=500)
+        return len(nuevos)
+
+    def franjas(self):
+        # Intervalos como pares (time, time)
+        return [(time(inicio // 60, inicio % 60), time(fin // 60, fin % 60)) for inicio, fin in self.intervalos]
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.dia}: {self.minutos_totales} min"
+
+# Mantener DisponibilidadDiaria al día con cada cambio de Horario
+@receiver(pre_save, sender=Horario)
+def recordar_dia_anterior_horario(sender, instance, **kwargs):
+    # Si se cambia el día de un bloque hay que recalcular también el día anterior
+    instance._dia_anterior = None
+    if instance.pk:
+        instance._dia_anterior = Horario.objects.filter(pk=instance.pk).values_list('dia', flat=True).first()
+
+@receiver(post_save, sender=Horario)
+def actualizar_disponibilidad_al_guardar(sender, instance, raw=False, **kwargs):
+    if raw: # loaddata: el resumen se reconstruye con el comando
+        return
+    dias = {instance.dia}
+    if getattr(instance, '_dia_anterior', None):
+        dias.add(instance._dia_anterior)
+    DisponibilidadDiaria.recalcular(instance.usuario_id, dias)
+
+@receiver(post_delete, sender=Horario)
+def actualizar_disponibilidad_al_eliminar(sender, instance, **kwargs):
+    DisponibilidadDiaria.recalcular(instance.usuario_id, [instance.dia])
+
+
+class TareaQuerySet(models.QuerySet):
+    def plantillas(self):
+        return self.filter(tipo=Tarea.PLANTILLA)
+
+    def instancias(self):
+        return self.filter(tipo=Tarea.INSTANCIA)
+
+    def del_dia(self, dia_codigo):
+        # Tareas que caen en 'dia_codigo' (predicado entero sobre la máscara, sin parsear texto)
+        bit = DIA_BITS[dia_codigo.upper()]
+        return self.alias(dia_bit=F('dias_recurrencia_mask').bitand(bit)).filter(dia_bit=bit)
+
+
 class Tarea(models.Model):
     ESTADOS = [
         ('pendiente', 'Pendiente'),
         ('hecha', 'Hecha'),
     ]
 
+    # Tipo: las PLANTILLAS tienen recurrencia y las reparte el jefe; las INSTANCIAS las crea el reparto
+    PLANTILLA = 'plantilla'
+    INSTANCIA = 'instancia'
+    TIPOS = [
+        (PLANTILLA, 'Plantilla'),
+        (INSTANCIA, 'Instancia'),
+    ]
+
     nombre = models.CharField(max_length=100)
     responsable = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     familia = models.ForeignKey('Familia', on_delete=models.CASCADE, related_name='tareas', null=True, blank=True)
     estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Última modificación. bulk_update() y update() no la actualizan solos: hay que incluirla (ver sincronizacion.py)
+    modificado = models.DateTimeField(auto_now=True)
 
     # Tiempo y Restricción de Edad
     tiempo_requerido_minutos = models.IntegerField(
@@ -150,7 +363,22 @@ class Tarea(models.Model):
         blank=True, 
         help_text="Edad mínima requerida para realizar la tarea (solo si requiere_edad_minima está marcado)."
     )
+    # Franja asignada por el reparto dentro del horario del responsable (solo instancias)
+    hora_inicio = models.TimeField(null=True, blank=True)
+    hora_termino = models.TimeField(null=True, blank=True)
+
+    tipo = models.CharField(max_length=10, choices=TIPOS, default=PLANTILLA, db_index=True)
+    # Solo instancias: plantilla de la que salió y fecha concreta en el calendario
+    plantilla = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='instancias')
+    fecha_programada = models.DateField(null=True, blank=True, db_index=True)
+
     #CAMPO PARA RECURRENCIA SEMANAL
+    dias_recurrencia_mask = models.PositiveSmallIntegerField(
+        default=0,
+        db_index=True,
+        help_text="Días de la semana como máscara de 7 bits (LUN=1, MAR=2, MIE=4, ..., DOM=64). En una instancia, el bit de su día."
+    )
+    # Copia en texto de la máscara (se mantiene por compatibilidad; en instancias es NULL)
     dias_recurrencia_csv = models.CharField(
         max_length=50, 
         blank=True, 
@@ -158,5 +386,225 @@ class Tarea(models.Model):
         help_text="Días de la semana en formato CSV (ej: LUN,MIE,VIE)."
     )
 
+    objects = TareaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Tareas de una familia por estado y tipo, en orden de creación (lista, plantillas del reparto, calendario)
+            models.Index(fields=['familia', 'estado', 'tipo', 'fecha_creacion'], name='tarea_fam_estado_tipo_idx'),
+            # Lista paginada por clave (fecha_creacion, id): se recorre el índice en orden, sin ordenar
+            models.Index(fields=['familia', 'estado', '-fecha_creacion', '-id'], name='tarea_fam_estado_fecha_idx'),
+            # Carga pendiente y franjas ocupadas de cada miembro
+            models.Index(fields=['responsable', 'estado', 'tipo'], name='tarea_resp_estado_tipo_idx'),
+            # Instancias de un día o de una semana (limpieza por día/fecha)
+            models.Index(fields=['familia', 'tipo', 'dias_recurrencia_mask'], name='tarea_fam_tipo_dia_idx'),
+            models.Index(fields=['familia', 'tipo', 'fecha_programada'], name='tarea_fam_tipo_fecha_idx'),
+            # Tareas de una familia cambiadas desde un cursor (/api/sync/)
+            models.Index(fields=['familia', 'modificado', 'id'], name='tarea_fam_modificado_idx'),
+        ]
+
+    def dias_recurrencia(self):
+        return mascara_a_dias(self.dias_recurrencia_mask)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        tarea = super().from_db(db, field_names, values)
+        tarea._recordar_dias()
+        # Familia tal como se leyó: si cambia, la anterior registra una Eliminacion (sincronización)
+        tarea._familia_cargada = tarea.__dict__.get('familia_id')
+        return tarea
+
+    def _recordar_dias(self):
+        # Máscara y CSV tal como se leyeron o sincronizaron (None si alguno quedó diferido con .only())
+        if {'dias_recurrencia_csv', 'dias_recurrencia_mask'} <= self.__dict__.keys():
+            self._dias_sincronizados = (self.dias_recurrencia_csv, self.dias_recurrencia_mask)
+        else:
+            self._dias_sincronizados = None
+
+    def sincronizar_dias(self):
+        """
+        Mantiene sincronizadas la máscara y su copia CSV (bulk_create/bulk_update no llaman a save).
+        Gana el campo que cambió quien llama (ej: un PATCH solo de la máscara); si cambiaron los dos,
+        o la tarea es nueva, manda el CSV. También pone la fecha a las instancias que no la traen.
+        """
+        previos = getattr(self, '_dias_sincronizados', None)
+        solo_cambio_la_mascara = (
+            previos is not None
+            and self.dias_recurrencia_csv == previos[0]
+            and self.dias_recurrencia_mask != previos[1]
+        )
+        if solo_cambio_la_mascara:
+            # Las instancias no llevan CSV; una plantilla sin días queda con "" (como en TareaForm)
+            self.dias_recurrencia_csv = ','.join(self.dias_recurrencia()) if self.tipo == Tarea.PLANTILLA else None
+        elif self.dias_recurrencia_csv:
+            self.dias_recurrencia_mask = dias_a_mascara(self.dias_recurrencia_csv.split(','))
+        elif self.tipo == Tarea.PLANTILLA and self.dias_recurrencia_mask:
+            self.dias_recurrencia_csv = ','.join(self.dias_recurrencia())
+        self._recordar_dias()
+        self._programar()
+
+    def _programar(self):
+        # Una instancia creada sin fecha (API, lotes) toma su día en la semana actual, el mismo día
+        # cuenta (como construir_instancias): sin fecha_programada no aparecería en el calendario
+        if self.tipo != Tarea.INSTANCIA or self.fecha_programada is not None:
+            return
+        dias = self.dias_recurrencia()
+        if len(dias) == 1:
+            hoy = timezone.now().date()
+            self.fecha_programada = hoy + timedelta(days=(list(DIA_BITS).index(dias[0]) - hoy.weekday()) % 7)
+
+    def save(self, *args, **kwargs):
+        self.sincronizar_dias()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.estado})"
+
+
+# Invalidar los fragmentos en caché (lista de tareas, calendario) de las familias afectadas.
+# Las escrituras en bloque no envían señales: quien las hace llama a invalidar_familias.
+def familias_de_usuario(usuario_id):
+    como_miembro = Familia.miembros.through.objects.filter(user_id=usuario_id).values('familia_id')
+    return Familia.objects.filter(Q(jefe_id=usuario_id) | Q(id__in=como_miembro)).values_list('id', flat=True)
+
+@receiver([post_save, post_delete], sender=Tarea)
+def invalidar_cache_por_tarea(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidar_familias([instance.familia_id])
+
+@receiver([post_save, post_delete], sender=Horario)
+def invalidar_cache_por_horario(sender, instance, raw=False, **kwargs):
+    # La disponibilidad de un usuario se ve en todas sus familias
+    if not raw:
+        invalidar_familias(familias_de_usuario(instance.usuario_id))
+
+@receiver(post_save, sender=Familia)
+def invalidar_cache_por_familia(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidar_familias([instance.pk])
+
+@receiver(m2m_changed, sender=Familia.miembros.through)
+def invalidar_cache_por_miembros(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'): # pre_clear: después ya no se sabe de qué familias salió
+        return
+    if not reverse: # familia.miembros.add/remove/clear
+        invalidar_familias([instance.pk])
+    elif pk_set is not None: # usuario.familias.add/remove
+        invalidar_familias(pk_set)
+    else: # usuario.familias.clear
+        invalidar_familias(familias_de_usuario(instance.pk))
+
+
+class TrabajoReparto(models.Model):
+    # Reparto encolado: lo ejecuta el worker 'manage.py procesar_trabajos_reparto' fuera de la petición HTTP
+    ESTADOS = [
+        ('en_cola', 'En cola'),
+        ('en_curso', 'En curso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    familia = models.ForeignKey(Familia, on_delete=models.CASCADE, related_name='trabajos_reparto')
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    modo = models.CharField(max_length=10, default='voraz')
+    estado = models.CharField(max_length=12, choices=ESTADOS, default='en_cola', db_index=True)
+
+    # Avance (0-100) y etapa actual, para el endpoint de estado
+    progreso = models.PositiveSmallIntegerField(default=0)
+    etapa = models.CharField(max_length=50, blank=True)
+    # Último aviso del worker (al reclamarlo y en cada etapa) y veces que se reclamó:
+    # un trabajo 'en_curso' sin latido reciente es de un worker que murió (ver trabajos.py)
+    latido = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+
+    # Resultado
+    asignaciones = models.IntegerField(default=0)
+    lotes = models.JSONField(default=list, blank=True) # Filas escritas por cada INSERT (ej: [200, 200, 37])
+    fallos = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+
+    # Tiempos
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_termino = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reparto #{self.id} de {self.familia.nombre} ({self.estado})"
+
+
+class CargaPendiente(models.Model):
+    # Contador de instancias pendientes (y sus minutos) de un miembro en una familia.
+    # Lo mantiene el módulo cargas.py; 'manage.py conciliar_cargas' detecta y corrige desvíos.
+    familia = models.ForeignKey(Familia, on_delete=models.CASCADE, related_name='cargas_pendientes')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cargas_pendientes')
+    pendientes = models.PositiveIntegerField(default=0)
+    minutos_pendientes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['familia', 'usuario'], name='carga_familia_usuario_unica'),
+        ]
+        indexes = [
+            # Carga de un miembro sumando todas sus familias (reparto)
+            models.Index(fields=['usuario', 'pendientes'], name='carga_usuario_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.nombre} ({self.estado})"
\ No newline at end of file
+        return f"{self.usuario_id} en familia {self.familia_id}: {self.pendientes} pendientes ({self.minutos_pendientes} min)"
+
+
+class Eliminacion(models.Model):
+    # Registro de una Tarea u Horario borrado (o de una Tarea que pasó a otra familia: la anterior ya
+    # no la ve), para que /api/sync/ informe el borrado a los clientes.
+    # familia_id/usuario_id son enteros y no FK: la fila se escribe mientras la familia o el usuario
+    # se están borrando en cascada. 'manage.py purgar_eliminaciones' borra las antiguas.
+    TAREA = 'tarea'
+    HORARIO = 'horario'
+    MODELOS = [
+        (TAREA, 'Tarea'),
+        (HORARIO, 'Horario'),
+    ]
+
+    modelo = models.CharField(max_length=10, choices=MODELOS)
+    objeto_id = models.BigIntegerField()
+    familia_id = models.BigIntegerField(null=True, blank=True) # Tareas
+    usuario_id = models.BigIntegerField(null=True, blank=True) # Horarios
+    eliminado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['familia_id', 'eliminado', 'id'], name='eliminacion_familia_idx'),
+            models.Index(fields=['usuario_id', 'eliminado', 'id'], name='eliminacion_usuario_idx'),
+            models.Index(fields=['eliminado'], name='eliminacion_fecha_idx'), # Purga
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} eliminado el {self.eliminado:%d/%m/%Y %H:%M}"
+
+@receiver(post_delete, sender=Tarea)
+def registrar_eliminacion_de_tarea(sender, instance, **kwargs):
+    if instance.familia_id is not None: # Sin familia no la ve ningún cliente
+        Eliminacion.objects.create(modelo=Eliminacion.TAREA, objeto_id=instance.pk, familia_id=instance.familia_id)
+
+def registrar_tareas_movidas(tareas):
+    """
+    Registra una Eliminacion en la familia ANTERIOR de cada tarea que cambió de familia (la nueva
+    la recibe por 'modificado'). save() lo hace con la señal; las escrituras en bloque la llaman.
+    """
+    movidas = []
+    for tarea in tareas:
+        anterior = getattr(tarea, '_familia_cargada', None)
+        if anterior is not None and anterior != tarea.familia_id:
+            movidas.append(Eliminacion(modelo=Eliminacion.TAREA, objeto_id=tarea.pk, familia_id=anterior))
+        tarea._familia_cargada = tarea.familia_id
+    if movidas:
+        Eliminacion.objects.bulk_create(movidas)
+
+@receiver(post_save, sender=Tarea)
+def registrar_cambio_de_familia(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        registrar_tareas_movidas([instance])
+
+@receiver(post_delete, sender=Horario)
+def registrar_eliminacion_de_horario(sender, instance, **kwargs):
+    Eliminacion.objects.create(modelo=Eliminacion.HORARIO, objeto_id=instance.pk, usuario_id=instance.usuario_id)
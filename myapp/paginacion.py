@@ -0,0 +1,57 @@
+import base64
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+#🚨 PAGINACIÓN POR CLAVE (keyset) DE LA LISTA DE TAREAS 🚨
+# En vez de OFFSET (que lee y descarta todas las filas anteriores), cada página sigue desde la
+# última fila de la anterior: WHERE (fecha_creacion, id) < cursor ORDER BY fecha_creacion DESC, id DESC LIMIT n.
+# El costo de una página no depende de cuántas tareas haya antes.
+
+TAREAS_POR_PAGINA_POR_DEFECTO = 20
+
+def codificar_cursor(tarea):
+    # (fecha_creacion, id) de la última fila mostrada -> texto opaco para la URL
+    clave = f"{tarea.fecha_creacion.isoformat()}|{tarea.id}"
+    return base64.urlsafe_b64encode(clave.encode()).decode()
+
+def decodificar_cursor(texto):
+    """Devuelve (fecha_creacion, id) o None si no hay cursor o no es válido (se vuelve a la primera página)."""
+    if not texto:
+        return None
+    try:
+        fecha, tarea_id = base64.urlsafe_b64decode(texto.encode()).decode().split('|')
+        return datetime.fromisoformat(fecha), int(tarea_id)
+    except ValueError:
+        return None
+
+def pagina_por_clave(queryset, cursor=None, tamano=TAREAS_POR_PAGINA_POR_DEFECTO):
+    """
+    Una página de 'queryset' ordenada de la más nueva a la más antigua (fecha_creacion, id).
+    Devuelve (filas, cursor_siguiente); cursor_siguiente es None en la última página.
+    """
+    queryset = queryset.order_by('-fecha_creacion', '-id')
+    if cursor:
+        fecha, tarea_id = cursor
+        queryset = queryset.filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=tarea_id))
+
+    filas = list(queryset[:tamano + 1]) # Una fila extra solo para saber si hay otra página
+    siguiente = codificar_cursor(filas[tamano - 1]) if len(filas) > tamano else None
+    return filas[:tamano], siguiente
+
+
+#🚨 PAGINACIÓN DE LA API (/api/tareas/) 🚨
+# Misma idea con la paginación por cursor de DRF: ?cursor=... viene en 'next'/'previous' y cada
+# página lee solo sus filas (sin COUNT ni OFFSET), ordenadas por el índice (familia, estado, -fecha_creacion, -id).
+
+API_TAREAS_POR_PAGINA_POR_DEFECTO = 50
+
+class TareasCursorPagination(CursorPagination):
+    ordering = ('-fecha_creacion', '-id')
+    page_size_query_param = 'tamano' # ?tamano=N, hasta max_page_size
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'API_TAREAS_POR_PAGINA', API_TAREAS_POR_PAGINA_POR_DEFECTO)
+        return super().get_page_size(request)
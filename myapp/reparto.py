@@ -0,0 +1,628 @@
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta, time as dt_time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Tarea, DisponibilidadDiaria, DIAS_SEMANA_CHOICES, DIA_BITS, mascara_a_dias
+from .solver import np, solver_disponible, asignar_optimo
+from . import cargas
+from .cache_fragmentos import invalidar_familias
+
+#🚨 MOTOR DE REPARTO: aquí vive la lógica que antes estaba dentro de la vista repartir_tareas 🚨
+
+# Cantidad de instancias por INSERT al guardar un reparto (configurable con settings.REPARTO_TAMANO_LOTE)
+TAMANO_LOTE_POR_DEFECTO = 200
+
+# Modos de reparto: 'voraz' (instancia por instancia) u 'optimo' (solver de asignación, requiere NumPy)
+MODO_VORAZ = 'voraz'
+MODO_OPTIMO = 'optimo'
+MODOS_REPARTO = [
+    (MODO_VORAZ, 'Rápido (voraz)'),
+    (MODO_OPTIMO, 'Óptimo (más parejo)'),
+]
+
+DIAS_REPARTO = [codigo for codigo, _ in DIAS_SEMANA_CHOICES]
+
+#funciónes helper
+
+def get_next_weekday(start_date, day_code):
+    """Calcula la fecha del próximo día de la semana a partir de start_date."""
+    # Mapeo de códigos de día a índice de día de la semana (Lunes=0, Domingo=6)
+    day_map = {'LUN': 0, 'MAR': 1, 'MIE': 2, 'JUE': 3, 'VIE': 4, 'SAB': 5, 'DOM': 6}
+
+    target_weekday = day_map.get(day_code)
+    if target_weekday is None:
+        return None
+
+    # current_weekday es el día de la semana de start_date (Lunes=0, Domingo=6)
+    current_weekday = start_date.weekday()
+
+    # Calcular la diferencia de días
+    days_until_target = target_weekday - current_weekday
+
+    # Si el día objetivo ya pasó o es hoy, se calcula para la próxima semana (+7 días)
+    if days_until_target <= 0:
+        days_until_target += 7
+
+    return start_date + timedelta(days=days_until_target)
+
+def fecha_de_dia(desde, day_code):
+    """Fecha del día 'day_code' en la semana que empieza en 'desde' (el mismo día cuenta)."""
+    dias_a_avanzar = (DIAS_REPARTO.index(day_code) - desde.weekday()) % 7
+    return desde + timedelta(days=dias_a_avanzar)
+
+def a_minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+def a_hora(minutos):
+    return dt_time(minutos // 60, minutos % 60)
+
+class AgendaDia:
+    """
+    Intervalos LIBRES (en minutos desde las 00:00) de un miembro en un día de la semana.
+    Los bloques de Horario que se traslapan se fusionan, así los minutos no se cuentan dos veces.
+    Los intervalos libres se guardan ordenados por (largo, inicio): encontrar el hueco más
+    ajustado para una tarea es una búsqueda binaria (O(log n)).
+    """
+
+    def __init__(self, bloques=()):
+        self._por_largo = []
+        self.libre = 0
+        for inicio, fin in DisponibilidadDiaria.fusionar(bloques):
+            self._agregar(inicio, fin)
+
+    def _agregar(self, inicio, fin):
+        if fin > inicio:
+            insort(self._por_largo, (fin - inicio, inicio))
+            self.libre += fin - inicio
+
+    def _quitar(self, posicion):
+        largo, inicio = self._por_largo.pop(posicion)
+        self.libre -= largo
+        return inicio, inicio + largo
+
+    def cabe(self, duracion):
+        # ¿Hay algún hueco continuo de al menos 'duracion' minutos?
+        return bool(self._por_largo) and self._por_largo[-1][0] >= duracion
+
+    def reservar(self, duracion):
+        """Ocupa el hueco más ajustado que sirva (best-fit). Devuelve (inicio, fin) o None."""
+        posicion = bisect_left(self._por_largo, (duracion, -1))
+        if posicion == len(self._por_largo):
+            return None
+        inicio, fin = self._quitar(posicion)
+        self._agregar(inicio + duracion, fin)
+        return inicio, inicio + duracion
+
+    def ocupar(self, inicio, fin):
+        """Descuenta una franja ya comprometida (ej: una instancia asignada en un reparto anterior)."""
+        # Primero se juntan los huecos que se traslapan: _quitar/_agregar mueven las posiciones de la lista
+        solapados = [
+            posicion for posicion, (largo, libre_inicio) in enumerate(self._por_largo)
+            if libre_inicio < fin and inicio < libre_inicio + largo
+        ]
+        quitados = [self._quitar(posicion) for posicion in reversed(solapados)] # De atrás hacia adelante
+        for libre_inicio, libre_fin in quitados:
+            self._agregar(libre_inicio, min(inicio, libre_fin))
+            self._agregar(max(fin, libre_inicio), libre_fin)
+
+    def contiene(self, inicio, fin):
+        # ¿La franja [inicio, fin) está completamente libre?
+        return any(libre_inicio <= inicio and fin <= libre_inicio + largo for largo, libre_inicio in self._por_largo)
+
+def cargar_disponibilidad(miembros, descontar_asignadas=True, desde=None):
+    """
+    Carga en UNA sola consulta el resumen de disponibilidad (DisponibilidadDiaria: una fila
+    por miembro y día, con los bloques ya fusionados) y arma en memoria {usuario_id: {dia: AgendaDia}}.
+    Con 'descontar_asignadas' (una consulta más) se restan las franjas de las instancias
+    pendientes que ya tienen horario asignado en la semana que empieza en 'desde' (hoy por
+    defecto, la misma que programa construir_instancias). Las instancias sin fecha_programada
+    (anteriores a ese campo) se descuentan en cualquier semana.
+    """
+    disponibilidad = {miembro.id: {} for miembro in miembros}
+
+    resumenes = DisponibilidadDiaria.objects.filter(
+        usuario__in=miembros
+    ).values_list('usuario_id', 'dia', 'intervalos')
+
+    for usuario_id, dia, intervalos in resumenes:
+        disponibilidad[usuario_id][dia] = AgendaDia(intervalos)
+
+    if descontar_asignadas:
+        desde = desde or timezone.now().date()
+        asignadas = Tarea.objects.instancias().filter(
+            Q(fecha_programada__gte=desde, fecha_programada__lt=desde + timedelta(days=7))
+            | Q(fecha_programada__isnull=True),
+            responsable__in=miembros,
+            estado='pendiente',
+            hora_inicio__isnull=False,
+            hora_termino__isnull=False,
+        ).values_list('responsable_id', 'dias_recurrencia_mask', 'hora_inicio', 'hora_termino')
+
+        for usuario_id, mascara, hora_inicio, hora_termino in asignadas:
+            # Una instancia lleva en la máscara solo el bit de su día
+            dias = mascara_a_dias(mascara)
+            agenda = disponibilidad[usuario_id].get(dias[0]) if dias else None
+            if agenda:
+                agenda.ocupar(a_minutos(hora_inicio), a_minutos(hora_termino))
+
+    return disponibilidad
+
+def edad_de(miembro):
+    # Edad del miembro según su Perfil (0 si no la registró)
+    perfil = getattr(miembro, 'perfil', None)
+    edad = perfil.edad() if perfil else None
+    return edad if edad is not None else 0
+
+class TablaElegibilidad:
+    """
+    Elegibilidad por edad precalculada UNA vez por reparto: las edades se calculan al crear
+    la tabla y se guardan ordenadas, así el filtro de edad_minima es una búsqueda binaria.
+    Cada umbral distinto se resuelve una sola vez y se reutiliza (en el orden original
+    de los miembros, para no alterar los desempates del reparto).
+    """
+
+    def __init__(self, miembros):
+        self.miembros = list(miembros)
+        self.edades = {miembro.id: edad_de(miembro) for miembro in self.miembros}
+        self._edades_ordenadas = sorted(self.edades.values())
+        self._por_umbral = {}
+
+    def elegibles(self, edad_minima):
+        edad_minima = edad_minima or 0
+        if edad_minima not in self._por_umbral:
+            if bisect_left(self._edades_ordenadas, edad_minima) == 0:
+                self._por_umbral[edad_minima] = self.miembros # Todos cumplen
+            else:
+                self._por_umbral[edad_minima] = [m for m in self.miembros if self.edades[m.id] >= edad_minima]
+        return self._por_umbral[edad_minima]
+
+def cargar_carga_pendiente(miembros):
+    """
+    Siembra el registro de carga del reparto leyendo los contadores CargaPendiente (sin contar
+    filas de Tarea): {usuario_id: instancias pendientes}. Durante el reparto se actualiza en memoria.
+    """
+    return cargas.carga_por_usuario(miembros)
+
+def calcular_capacidad_para_tarea(miembro, tarea, dia_requerido, disponibilidad=None):
+    #Calcula el score de capacidad de un miembro para UNA TAREA ESPECÍFICA, filtrando SOLO por el día requerido (dia_requerido).
+    # Si se entrega 'disponibilidad' (ver cargar_disponibilidad) se responde desde memoria, sin consultar la DB.
+
+    # 1. Preparación del día requerido (en MAYÚSCULAS)
+    dia_codigo = dia_requerido.upper()
+
+    if disponibilidad is not None:
+        # Debe existir un hueco CONTINUO donde quepa la tarea; el score son los minutos libres del día
+        agenda = disponibilidad.get(miembro.id, {}).get(dia_codigo)
+        if agenda is None or not agenda.cabe(tarea.tiempo_requerido_minutos):
+            return 0
+        return agenda.libre
+
+    # 2. Sin mapa en memoria: se lee la fila precalculada de ese miembro y día (una consulta)
+    resumen = DisponibilidadDiaria.objects.filter(usuario=miembro, dia=dia_codigo).first()
+    if resumen is None:
+        # Si no hay NINGÚN horario para este día, descalificado.
+        return 0
+
+    # 3. Misma regla que con el mapa: hueco continuo para la tarea y score = minutos libres del día
+    agenda = AgendaDia(resumen.intervalos)
+    if not agenda.cabe(tarea.tiempo_requerido_minutos):
+        return 0
+    return agenda.libre
+
+# MOTOR DE REPARTO
+
+def obtener_plantillas(familia):
+    # TAREAS ORIGINALES (Plantillas): Las que tienen recurrencia y están pendientes
+    return Tarea.objects.plantillas().filter(
+        familia=familia,
+        estado='pendiente',
+        dias_recurrencia_mask__gt=0, # Al menos un día marcado
+    ).order_by('fecha_creacion')
+
+def evaluar_candidatos(miembros, tareas_a_procesar, disponibilidad):
+    """
+    Calcula, para cada (plantilla, día), los miembros que pueden hacerla y su score de capacidad.
+    Devuelve una lista de (tarea_original, dia_codigo, {miembro: score}).
+    """
+    tabla_edades = TablaElegibilidad(miembros)
+    pares = []
+
+    # Se crea una INSTANCIA ÚNICA por cada día de la semana que se requiere la tarea.
+    for tarea_original in tareas_a_procesar:
+        dias_requeridos = tarea_original.dias_recurrencia() # En orden de la semana
+
+        for dia_codigo in dias_requeridos:
+
+            candidatos_validos = {} # {miembro: score}
+
+            # Cálculo de Candidatos: Filtro y Score
+            # A. FILTRO DE EDAD: búsqueda en la tabla precalculada
+            for miembro in tabla_edades.elegibles(tarea_original.edad_minima):
+
+                # B. FILTRO DE CAPACIDAD Y DÍAS (Usando la función Helper)
+                score = calcular_capacidad_para_tarea(miembro, tarea_original, dia_codigo, disponibilidad)
+
+                if score > 0:
+                    candidatos_validos[miembro] = score
+
+            pares.append((tarea_original, dia_codigo, candidatos_validos))
+
+    return pares
+
+def elegir_voraz(pares, carga_pendiente, disponibilidad):
+    """
+    Reparto VORAZ: instancia por instancia, al candidato con MENOR carga y luego MAYOR score,
+    reservando su franja en la agenda del día (así lo ya asignado descuenta capacidad).
+    Devuelve, por par, (responsable, (inicio, fin)) o None.
+    """
+    elegidos = []
+    for tarea_original, dia_codigo, candidatos_validos in pares:
+        duracion = tarea_original.tiempo_requerido_minutos
+
+        candidatos_finales = []
+        for miembro in candidatos_validos:
+            agenda = disponibilidad[miembro.id][dia_codigo]
+            if not agenda.cabe(duracion): # Ya no le queda un hueco (se llenó en este reparto)
+                continue
+            # LÓGICA DE EQUIDAD: la carga sale del registro en memoria (incluye lo asignado en este reparto)
+            tareas_pendientes_count = carga_pendiente[miembro.id]
+
+            candidatos_finales.append((miembro, agenda.libre, tareas_pendientes_count))
+
+        if not candidatos_finales:
+            elegidos.append(None)
+            continue
+
+        # Ordenar por MENOR carga (x[2]), luego por MAYOR score (-x[1])
+        candidatos_finales.sort(key=lambda x: (x[2], -x[1]))
+        responsable_elegido = candidatos_finales[0][0]
+        franja = disponibilidad[responsable_elegido.id][dia_codigo].reservar(duracion)
+        carga_pendiente[responsable_elegido.id] += 1
+        elegidos.append((responsable_elegido, franja))
+
+    return elegidos
+
+def elegir_optimo(pares, miembros, carga_pendiente, disponibilidad):
+    """
+    Reparto ÓPTIMO: toda la semana como un solo problema de asignación (ver solver.py).
+    Luego se ubica cada instancia en la agenda de su responsable (las más largas primero);
+    si su hueco ya se ocupó, pasa al siguiente candidato con menor carga.
+    """
+    factible = np.zeros((len(pares), len(miembros)), dtype=bool)
+    capacidad = np.zeros((len(pares), len(miembros)))
+    posicion = {miembro: indice for indice, miembro in enumerate(miembros)}
+
+    for fila, (tarea_original, dia_codigo, candidatos_validos) in enumerate(pares):
+        for miembro, score in candidatos_validos.items():
+            factible[fila, posicion[miembro]] = True
+            capacidad[fila, posicion[miembro]] = score
+
+    carga_inicial = np.array([carga_pendiente[miembro.id] for miembro in miembros])
+    preferidos = asignar_optimo(factible, capacidad, carga_inicial)
+    for indice in preferidos:
+        if indice >= 0:
+            carga_pendiente[miembros[indice].id] += 1
+
+    elegidos = [None] * len(pares)
+    orden = sorted(range(len(pares)), key=lambda fila: -pares[fila][0].tiempo_requerido_minutos)
+    for fila in orden:
+        tarea_original, dia_codigo, candidatos_validos = pares[fila]
+        if preferidos[fila] < 0:
+            continue
+        preferido = miembros[preferidos[fila]]
+        duracion = tarea_original.tiempo_requerido_minutos
+
+        franja = disponibilidad[preferido.id][dia_codigo].reservar(duracion)
+        if franja:
+            elegidos[fila] = (preferido, franja)
+            continue
+
+        # El hueco del preferido ya se usó: probar con los demás candidatos
+        carga_pendiente[preferido.id] -= 1
+        alternativos = sorted(
+            (m for m in candidatos_validos if disponibilidad[m.id][dia_codigo].cabe(duracion)),
+            key=lambda m: (carga_pendiente[m.id], -disponibilidad[m.id][dia_codigo].libre),
+        )
+        if alternativos:
+            responsable_elegido = alternativos[0]
+            franja = disponibilidad[responsable_elegido.id][dia_codigo].reservar(duracion)
+            carga_pendiente[responsable_elegido.id] += 1
+            elegidos[fila] = (responsable_elegido, franja)
+
+    return elegidos
+
+def construir_instancias(familia, pares, elegidos):
+    """
+    Construye EN MEMORIA (sin guardarlas) las instancias diarias a partir de los responsables
+    y franjas elegidos. Devuelve (instancias, no_asignables) donde no_asignables son los (plantilla, día)
+    que no encontraron ningún miembro.
+    """
+    instancias = []
+    no_asignables = []
+    hoy = timezone.now().date() # Las fechas programadas parten del día del reparto
+
+    for (tarea_original, dia_codigo, _), elegido in zip(pares, elegidos):
+        if elegido is None:
+            no_asignables.append((tarea_original, dia_codigo))
+            continue
+        responsable_elegido, (inicio, fin) = elegido
+
+        # INSTANCIA DE TAREA DIARIA (se guarda después, en lotes)
+        instancias.append(Tarea(
+            nombre=f"{tarea_original.nombre} ({dia_codigo})", # Nombre con día para referencia
+            responsable=responsable_elegido,
+            familia=familia,
+            estado='pendiente',
+            tiempo_requerido_minutos=tarea_original.tiempo_requerido_minutos,
+            hora_inicio=a_hora(inicio), # Franja concreta dentro del horario del responsable
+            hora_termino=a_hora(fin),
+            # La restricción de edad se copia para poder reasignar la instancia sin su plantilla
+            requiere_edad_minima=tarea_original.requiere_edad_minima,
+            edad_minima=tarea_original.edad_minima,
+            # 🚨 CLAVE: tipo INSTANCIA con solo el bit de su día (y sin CSV de recurrencia)
+            tipo=Tarea.INSTANCIA,
+            dias_recurrencia_mask=DIA_BITS[dia_codigo],
+            dias_recurrencia_csv=None,
+            plantilla=tarea_original,
+            fecha_programada=fecha_de_dia(hoy, dia_codigo),
+        ))
+
+    return instancias, no_asignables
+
+def planificar_reparto(familia, modo=MODO_VORAZ):
+    """
+    Calcula el reparto de una familia SIN escribir en la DB (solo lecturas).
+    Devuelve un plan con las instancias propuestas (sin guardar), los (plantilla, día) sin
+    candidato, los mensajes de fallo y los tiempos de cada fase en segundos.
+    Si se pide el modo 'optimo' sin NumPy instalado, se usa el modo voraz (ver plan['modo']).
+    """
+    if modo == MODO_OPTIMO and not solver_disponible():
+        modo = MODO_VORAZ
+
+    plan = {
+        'modo': modo,
+        'miembros': [],
+        'plantillas': [],
+        'instancias': [],
+        'no_asignables': [],
+        'fallos': [],
+        'tiempos': {},
+    }
+    tiempos = plan['tiempos']
+    inicio_total = inicio = time.perf_counter()
+
+    # 1. CARGA: miembros (con su Perfil, en la misma consulta), plantillas, disponibilidad y
+    # carga pendiente (número fijo de consultas)
+    miembros = list(familia.miembros.select_related('perfil'))
+    tareas_a_procesar = list(obtener_plantillas(familia)) if miembros else []
+    plan['miembros'] = miembros
+    plan['plantillas'] = tareas_a_procesar
+
+    if miembros and tareas_a_procesar:
+        # Matriz miembro x día con los minutos disponibles: una sola consulta para todo el reparto
+        disponibilidad = cargar_disponibilidad(miembros)
+        # Registro de carga (instancias pendientes por miembro), se actualiza al asignar
+        carga_pendiente = cargar_carga_pendiente(miembros)
+    tiempos['carga'] = time.perf_counter() - inicio
+
+    if not miembros or not tareas_a_procesar:
+        tiempos['total'] = time.perf_counter() - inicio_total
+        return plan
+
+    # 2. CANDIDATOS: filtro de edad y capacidad para cada (plantilla, día)
+    inicio = time.perf_counter()
+    pares = evaluar_candidatos(miembros, tareas_a_procesar, disponibilidad)
+    tiempos['candidatos'] = time.perf_counter() - inicio
+
+    # 3. ASIGNACIÓN: voraz u óptima
+    inicio = time.perf_counter()
+    if modo == MODO_OPTIMO:
+        elegidos = elegir_optimo(pares, miembros, carga_pendiente, disponibilidad)
+    else:
+        elegidos = elegir_voraz(pares, carga_pendiente, disponibilidad)
+    tiempos['asignacion'] = time.perf_counter() - inicio
+
+    # 4. CONSTRUCCIÓN de las instancias en memoria
+    inicio = time.perf_counter()
+    plan['instancias'], plan['no_asignables'] = construir_instancias(familia, pares, elegidos)
+    plan['fallos'] = [
+        f"La tarea '{tarea_original.nombre}' para el día **{dia_codigo}** no encontró ningún miembro disponible."
+        for tarea_original, dia_codigo in plan['no_asignables']
+    ]
+    tiempos['construccion'] = time.perf_counter() - inicio
+
+    tiempos['total'] = time.perf_counter() - inicio_total
+    return plan
+
+def plan_a_dict(plan):
+    # Versión serializable (JSON) de un plan de reparto
+    return {
+        'modo': plan['modo'],
+        'miembros': len(plan['miembros']),
+        'plantillas': len(plan['plantillas']),
+        'asignaciones': [
+            {
+                'nombre': instancia.nombre,
+                'responsable_id': instancia.responsable_id,
+                'responsable': instancia.responsable.username,
+                'tiempo_requerido_minutos': instancia.tiempo_requerido_minutos,
+                'hora_inicio': instancia.hora_inicio.isoformat(),
+                'hora_termino': instancia.hora_termino.isoformat(),
+                'plantilla_id': instancia.plantilla_id,
+                'fecha_programada': instancia.fecha_programada.isoformat(),
+            }
+            for instancia in plan['instancias']
+        ],
+        'no_asignables': [
+            {'tarea_id': tarea_original.id, 'tarea': tarea_original.nombre, 'dia': dia_codigo}
+            for tarea_original, dia_codigo in plan['no_asignables']
+        ],
+        'tiempos': {fase: round(segundos, 6) for fase, segundos in plan['tiempos'].items()},
+    }
+
+@transaction.atomic
+def reasignar_por_cambio_horario(usuario, dia_codigo):
+    """
+    Reparto INCREMENTAL tras editar/eliminar un Horario de 'usuario' en 'dia_codigo':
+    solo se revisan las instancias pendientes de ese usuario en ese día. Cada una conserva
+    su franja si sigue dentro del nuevo horario, o se reubica en otro hueco del mismo día;
+    las que ya no caben se reasignan (misma regla que el reparto voraz: menor carga y luego
+    mayor capacidad) y las que no tienen candidato quedan sin responsable.
+    Cada fecha_programada se resuelve por separado (una instancia de la semana siguiente no
+    ocupa el hueco de la de esta semana). El resto de las instancias no se toca. Las revisadas
+    se leen bloqueadas hasta el final.
+    """
+    resumen = {'revisadas': 0, 'reasignadas': 0, 'sin_candidato': []}
+    dia_codigo = dia_codigo.upper()
+
+    instancias = list(Tarea.objects.instancias().filter(
+        responsable=usuario,
+        estado='pendiente',
+        dias_recurrencia_mask=DIA_BITS[dia_codigo], # Igualdad entera: la instancia es de ese día
+    ).select_related('familia').select_for_update(of=('self',)).order_by('hora_inicio', 'id'))
+    resumen['revisadas'] = len(instancias)
+    if not instancias:
+        return resumen
+
+    # Cada fecha es una agenda aparte: las instancias de semanas distintas no compiten por los
+    # mismos huecos. Agenda del usuario SOLO con sus bloques nuevos: se vuelven a ubicar sus
+    # instancias una a una (las sin fecha_programada, anteriores a ese campo, van juntas).
+    por_fecha = {}
+    for instancia in instancias:
+        por_fecha.setdefault(instancia.fecha_programada, []).append(instancia)
+    intervalos = DisponibilidadDiaria.objects.filter(usuario=usuario, dia=dia_codigo).values_list('intervalos', flat=True).first()
+
+    modificadas = []
+    afectadas = {} # {(familia_id, fecha): [instancia, ...]}
+    aportes_previos = {instancia.id: cargas.aporte(instancia) for instancia in instancias}
+    for fecha, instancias_fecha in por_fecha.items():
+        agenda = AgendaDia(intervalos or ())
+        for instancia in instancias_fecha:
+            if instancia.hora_inicio and instancia.hora_termino:
+                inicio, fin = a_minutos(instancia.hora_inicio), a_minutos(instancia.hora_termino)
+                if agenda.contiene(inicio, fin):
+                    agenda.ocupar(inicio, fin) # Su franja sigue siendo válida: no se toca
+                    continue
+
+            franja = agenda.reservar(instancia.tiempo_requerido_minutos)
+            if franja is None:
+                afectadas.setdefault((instancia.familia_id, fecha), []).append(instancia)
+                continue
+            instancia.hora_inicio, instancia.hora_termino = a_hora(franja[0]), a_hora(franja[1])
+            modificadas.append(instancia)
+
+    # Los candidatos son los OTROS miembros de la familia de cada instancia, con su agenda de la
+    # semana de esa fecha (descontando lo que ya tienen asignado ese día)
+    por_familia = {}
+    for (familia_id, fecha), instancias_fecha in afectadas.items():
+        por_familia.setdefault(familia_id, []).append((fecha, instancias_fecha))
+
+    for grupos in por_familia.values():
+        familia = grupos[0][1][0].familia
+        miembros = [m for m in familia.miembros.select_related('perfil') if m.id != usuario.id]
+        tabla_edades = TablaElegibilidad(miembros)
+        carga_pendiente = cargar_carga_pendiente(miembros) # Se acumula entre fechas
+
+        for fecha, instancias_fecha in grupos:
+            disponibilidad = cargar_disponibilidad(miembros, desde=fecha)
+            for instancia in instancias_fecha:
+                candidatos_finales = []
+                for miembro in tabla_edades.elegibles(instancia.edad_minima):
+                    score = calcular_capacidad_para_tarea(miembro, instancia, dia_codigo, disponibilidad)
+                    if score > 0:
+                        candidatos_finales.append((miembro, score, carga_pendiente[miembro.id]))
+
+                if candidatos_finales:
+                    # Ordenar por MENOR carga, luego por MAYOR score (igual que el reparto voraz)
+                    candidatos_finales.sort(key=lambda x: (x[2], -x[1]))
+                    instancia.responsable = candidatos_finales[0][0]
+                    inicio, fin = disponibilidad[instancia.responsable.id][dia_codigo].reservar(instancia.tiempo_requerido_minutos)
+                    instancia.hora_inicio, instancia.hora_termino = a_hora(inicio), a_hora(fin)
+                    carga_pendiente[instancia.responsable.id] += 1
+                    resumen['reasignadas'] += 1
+                else:
+                    instancia.responsable = None
+                    instancia.hora_inicio = instancia.hora_termino = None
+                    resumen['sin_candidato'].append(instancia)
+                modificadas.append(instancia)
+
+    if modificadas:
+        ahora = timezone.now()
+        for instancia in modificadas:
+            instancia.modificado = ahora # bulk_update no aplica auto_now (sincronización por cambios)
+        with transaction.atomic():
+            Tarea.objects.bulk_update(modificadas, ['responsable', 'hora_inicio', 'hora_termino', 'modificado'])
+            cargas.registrar_cambios([(aportes_previos[instancia.id], instancia) for instancia in modificadas])
+            invalidar_familias({instancia.familia_id for instancia in modificadas}) # bulk_update no envía post_save
+    return resumen
+
+def guardar_instancias(instancias, tamano_lote=None):
+    """
+    Guarda las instancias con INSERTs por lotes dentro de una sola transacción.
+    Devuelve la cantidad de filas escritas en cada lote (ej: [200, 200, 37]).
+    """
+    if tamano_lote is None:
+        tamano_lote = getattr(settings, 'REPARTO_TAMANO_LOTE', TAMANO_LOTE_POR_DEFECTO)
+    if tamano_lote <= 0:
+        raise ValueError("El tamaño de lote debe ser un entero positivo.")
+
+    filas_por_lote = []
+    familia_ids = {instancia.familia_id for instancia in instancias}
+    with transaction.atomic():
+        inicio_guardado = timezone.now()
+        for inicio in range(0, len(instancias), tamano_lote):
+            lote = instancias[inicio:inicio + tamano_lote]
+            Tarea.objects.bulk_create(lote)
+            filas_por_lote.append(len(lote))
+        cargas.sumar(instancias) # Contadores de carga (una escritura por miembro) en la misma transacción
+        # 'modificado' de nuevo justo antes del COMMIT (un UPDATE por el índice familia/modificado):
+        # /api/sync/ solo espera SOLAPE segundos a las transacciones y guardar muchos lotes puede
+        # tardar más; con la hora del lote, los clientes que sincronizan a la vez perderían esas filas
+        ahora = timezone.now()
+        Tarea.objects.filter(familia_id__in=familia_ids, modificado__gte=inicio_guardado).update(modificado=ahora)
+        for instancia in instancias:
+            instancia.modificado = ahora
+        invalidar_familias(familia_ids) # bulk_create no envía post_save
+
+    return filas_por_lote
+
+def ejecutar_reparto(familia, tamano_lote=None, modo=MODO_VORAZ, progreso=None):
+    """
+    Ejecuta el algoritmo de reparto para una familia: primero planifica todas las instancias
+    en memoria (planificar_reparto) y luego las guarda en lotes (la escritura solo ocurre al final).
+    'progreso' (opcional) se llama con (porcentaje, etapa) a medida que avanza el reparto.
+    """
+
+    def avisar(porcentaje, etapa):
+        if progreso:
+            progreso(porcentaje, etapa)
+
+    avisar(0, 'Calculando el reparto')
+    plan = planificar_reparto(familia, modo)
+
+    resultado = {
+        'modo': plan['modo'],
+        'miembros': len(plan['miembros']),
+        'plantillas': len(plan['plantillas']),
+        'asignaciones': 0,
+        'fallos': plan['fallos'],
+        'lotes': [],
+        'tiempos': plan['tiempos'],
+    }
+    if not plan['instancias']:
+        return resultado
+
+    # Sin avance por lote: se guarda en UNA transacción y quien consulta el estado del trabajo
+    # (otra conexión) no vería las actualizaciones hechas dentro de ella hasta el COMMIT
+    instancias = plan['instancias']
+    avisar(60, f'Guardando {len(instancias)} instancias')
+    inicio = time.perf_counter()
+    resultado['lotes'] = guardar_instancias(instancias, tamano_lote)
+    avisar(95, 'Instancias guardadas')
+    resultado['tiempos']['guardado'] = time.perf_counter() - inicio
+    resultado['tiempos']['total'] += resultado['tiempos']['guardado']
+    resultado['asignaciones'] = len(instancias)
+    return resultado
@@ -1,7 +1,38 @@
 from rest_framework import serializers
-from .models import Tarea
+from .models import Tarea, Horario
+
+class RelacionPrecargada(serializers.PrimaryKeyRelatedField):
+    # En las operaciones en lote (lotes.py) las filas referidas se cargan antes, una consulta por
+    # relación, y llegan en context['precargados'][campo] = {id: objeto}. Sin eso, funciona como siempre.
+    def to_internal_value(self, data):
+        precargados = self.context.get('precargados', {}).get(self.field_name)
+        if precargados is None:
+            return super().to_internal_value(data)
+        try:
+            return precargados[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
 
 class TareaSerializer(serializers.ModelSerializer):
+    serializer_related_field = RelacionPrecargada
+
     class Meta:
         model = Tarea
         fields = '__all__'  #incluye todos los campos del modelo
+
+    def __init__(self, *args, campos=None, **kwargs):
+        # 'campos': solo esos campos en la respuesta (?fields=id,nombre,estado en la API)
+        super().__init__(*args, **kwargs)
+        if campos is not None:
+            desconocidos = set(campos) - set(self.fields)
+            if desconocidos:
+                raise serializers.ValidationError({'fields': f"Campos desconocidos: {', '.join(sorted(desconocidos))}."})
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
+class HorarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Horario
+        fields = '__all__'
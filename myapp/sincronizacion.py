@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import json
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import Tarea, Horario, Eliminacion
+from .serializers import TareaSerializer, HorarioSerializer
+
+#🚨 SINCRONIZACIÓN POR CAMBIOS (/api/sync/?since=<cursor>) 🚨
+# El cliente guarda el cursor de la respuesta y lo envía en la siguiente: solo recibe las tareas de
+# sus familias y sus horarios creados/modificados después, y los ids borrados (tabla Eliminacion).
+# Cada flujo se lee por clave (modificado, id) con el índice (familia|usuario, modificado, id):
+# si nada cambió, son tres consultas que no devuelven filas.
+#
+# Una transacción puede confirmarse DESPUÉS de que se leyó una fila con 'modificado' posterior al
+# suyo. Por eso el cursor nunca avanza más allá de (ahora - SOLAPE): las filas de los últimos
+# segundos se pueden recibir dos veces (el cliente las aplica por id), pero no se pierden.
+# Eso exige que cada transacción se confirme a menos de SOLAPE de poner 'modificado': las que
+# escriben mucho (guardar_instancias del reparto) lo vuelven a poner justo antes del COMMIT.
+# OJO: bulk_update() y update() no actualizan 'modificado' (auto_now); quien los usa lo incluye.
+
+LIMITE_POR_DEFECTO = 500 # Filas por flujo y por respuesta
+SOLAPE_POR_DEFECTO = 5 # Segundos
+RETENCION_POR_DEFECTO = 90 # Días que se guardan las eliminaciones
+
+FLUJOS = ('tarea', 'horario', 'eliminacion')
+
+def _configuracion(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+def _huella_familias(familia_ids):
+    # Si cambian las familias del usuario, el cursor deja de valer (hay tareas que nunca recibió)
+    return hashlib.sha1(','.join(map(str, sorted(familia_ids))).encode()).hexdigest()[:12]
+
+def codificar_cursor(posiciones, familia_ids):
+    # {flujo: (fecha, id)} -> texto opaco para el cliente
+    datos = {'f': _huella_familias(familia_ids)}
+    for flujo in FLUJOS:
+        fecha, objeto_id = posiciones[flujo]
+        datos[flujo] = [fecha.isoformat(), objeto_id] if fecha else None
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode()).decode()
+
+def decodificar_cursor(texto, familia_ids):
+    """{flujo: (fecha, id)} o None si no hay cursor o ya no sirve (se hace una sincronización completa)."""
+    if not texto:
+        return None
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(texto.encode()))
+        posiciones = {
+            flujo: (datetime.fromisoformat(datos[flujo][0]), int(datos[flujo][1])) if datos[flujo] else (None, 0)
+            for flujo in FLUJOS
+        }
+    except (ValueError, KeyError, TypeError, IndexError):
+        return None
+    if datos.get('f') != _huella_familias(familia_ids):
+        return None
+    # Las eliminaciones más antiguas que la retención ya se purgaron: el cliente podría no enterarse
+    fecha_eliminaciones = posiciones['eliminacion'][0]
+    retencion = timedelta(days=_configuracion('SYNC_RETENCION_DIAS', RETENCION_POR_DEFECTO))
+    if fecha_eliminaciones is None or fecha_eliminaciones < timezone.now() - retencion:
+        return None
+    return posiciones
+
+def _siguientes(queryset, campo_fecha, posicion, limite):
+    # Filas posteriores a 'posicion' en orden (campo_fecha, id); una extra para saber si hay más
+    fecha, objeto_id = posicion
+    if fecha is not None:
+        queryset = queryset.filter(Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, 'id__gt': objeto_id}))
+    filas = list(queryset.order_by(campo_fecha, 'id')[:limite + 1])
+    return filas[:limite], len(filas) > limite
+
+def _avanzar(posicion, filas, campo_fecha, hay_mas, limite_seguro):
+    if not filas:
+        return posicion
+    ultima = (getattr(filas[-1], campo_fecha), filas[-1].id)
+    if hay_mas: # El cliente pide la página siguiente enseguida: se avanza hasta la última fila
+        return ultima
+    # Sin pasar de (ahora - SOLAPE), pero nunca hacia atrás
+    nueva = min(ultima, (limite_seguro, 0))
+    return max(posicion, nueva) if posicion[0] is not None else nueva
+
+def cambios_desde(usuario, membresia, cursor_texto, limite=None):
+    """Respuesta de /api/sync/: filas cambiadas desde el cursor, ids borrados y el cursor siguiente."""
+    limite = limite or _configuracion('SYNC_LIMITE', LIMITE_POR_DEFECTO)
+    familia_ids = membresia.ids
+    ahora = timezone.now()
+    limite_seguro = ahora - timedelta(seconds=_configuracion('SYNC_SOLAPE_SEGUNDOS', SOLAPE_POR_DEFECTO))
+
+    posiciones = decodificar_cursor(cursor_texto, familia_ids)
+    completa = posiciones is None
+    if completa:
+        # Todo desde el principio; de las eliminaciones solo las que ocurran desde ahora
+        posiciones = {'tarea': (None, 0), 'horario': (None, 0), 'eliminacion': (limite_seguro, 0)}
+
+    tareas, mas_tareas = _siguientes(Tarea.objects.filter(familia_id__in=familia_ids), 'modificado', posiciones['tarea'], limite)
+    horarios, mas_horarios = _siguientes(Horario.objects.filter(usuario=usuario), 'modificado', posiciones['horario'], limite)
+    # Una tarea que pasó de una familia del usuario a otra que también es suya no se informa como
+    # borrada (llega por el flujo de tareas); se comprueba por clave primaria, solo en las filas leídas
+    sigue_visible = Exists(Tarea.objects.filter(id=OuterRef('objeto_id'), familia_id__in=familia_ids))
+    eliminaciones, mas_eliminaciones = _siguientes(
+        Eliminacion.objects.filter(
+            (Q(modelo=Eliminacion.TAREA, familia_id__in=familia_ids) & ~sigue_visible)
+            | Q(modelo=Eliminacion.HORARIO, usuario_id=usuario.id)
+        ),
+        'eliminado', posiciones['eliminacion'], limite,
+    )
+
+    siguientes = {
+        'tarea': _avanzar(posiciones['tarea'], tareas, 'modificado', mas_tareas, limite_seguro),
+        'horario': _avanzar(posiciones['horario'], horarios, 'modificado', mas_horarios, limite_seguro),
+        'eliminacion': _avanzar(posiciones['eliminacion'], eliminaciones, 'eliminado', mas_eliminaciones, limite_seguro),
+    }
+    return {
+        'completa': completa, # True: el cliente debe reemplazar sus datos, no mezclarlos
+        'tareas': TareaSerializer(tareas, many=True).data,
+        'horarios': HorarioSerializer(horarios, many=True).data,
+        'eliminadas': {
+            'tareas': [fila.objeto_id for fila in eliminaciones if fila.modelo == Eliminacion.TAREA],
+            'horarios': [fila.objeto_id for fila in eliminaciones if fila.modelo == Eliminacion.HORARIO],
+        },
+        'hay_mas': mas_tareas or mas_horarios or mas_eliminaciones,
+        'cursor': codificar_cursor(siguientes, familia_ids),
+    }
+
+def purgar_eliminaciones(dias=None):
+    """Borra las eliminaciones más antiguas que la retención. Devuelve cuántas se borraron."""
+    dias = dias if dias is not None else _configuracion('SYNC_RETENCION_DIAS', RETENCION_POR_DEFECTO)
+    borradas, _ = Eliminacion.objects.filter(eliminado__lt=timezone.now() - timedelta(days=dias)).delete()
+    return borradas
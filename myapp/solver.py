@@ -0,0 +1,193 @@
+try:
+    import numpy as np
+except ImportError: # NumPy es opcional: sin él solo existe el reparto voraz
+    np = None
+
+#🚨 SOLVER DE ASIGNACIÓN ÓPTIMA (modo 'optimo' del reparto) 🚨
+# Plantea la semana completa de una familia como UN problema de asignación:
+#   filas    -> instancias (plantilla, día)
+#   columnas -> "cupos" de cada miembro (cupo k = su (k+1)-ésima tarea nueva)
+# El costo de un cupo crece con la carga del miembro, así que minimizar el costo total
+# equivale a repartir lo más parejo posible. Las combinaciones no permitidas (edad o
+# capacidad) quedan con un costo prohibitivo.
+# Los costos son enteros: hay muchos empates exactos y el solver los resuelve a favor de una
+# columna libre (termina ahí) y, entre esas, del miembro con más capacidad para la instancia.
+# Un desempate fraccionario dentro del costo obligaría a recorrer casi todas las columnas
+# asignadas por cada instancia.
+
+# Costo de una combinación prohibida (mucho mayor que cualquier costo real)
+COSTO_PROHIBIDO = 1e9
+
+# Cupos extra por miembro sobre lo que estima el reparto voraz
+HOLGURA_CUPOS = 2
+
+def solver_disponible():
+    return np is not None
+
+def hungaro(costos, preferencia=None):
+    """
+    Resuelve una asignación de costo mínimo (filas <= columnas) con el algoritmo
+    húngaro de caminos aumentantes más cortos. El paso interno sobre las columnas
+    está vectorizado con NumPy. Devuelve, para cada fila, el índice de su columna.
+    'preferencia' (filas x columnas, mayor es mejor) solo decide entre columnas empatadas.
+    """
+    n, m = costos.shape
+    if n > m:
+        raise ValueError("El solver necesita al menos tantas columnas como filas.")
+
+    # Arranque en caliente (reducción por filas): u = mínimo de cada fila, v = 0, y cada
+    # fila cuya columna más barata sigue libre queda asignada de inmediato.
+    u = costos.min(axis=1)
+    v = np.zeros(m)
+    fila_de_columna = np.full(m, -1, dtype=np.int64)
+    columna_de_fila = np.full(n, -1, dtype=np.int64)
+    mas_baratas = costos == u[:, None]
+    if preferencia is not None:
+        mas_baratas = np.where(mas_baratas, preferencia, -np.inf)
+    for fila, columna in enumerate(mas_baratas.argmax(axis=1)):
+        if fila_de_columna[columna] < 0:
+            columna_de_fila[fila] = columna
+            fila_de_columna[columna] = fila
+
+    camino = np.empty(m, dtype=np.int64)
+    minimo = np.empty(m)
+    distancia_final = np.empty(m)
+    v_trabajo = np.empty(m)
+    reducido = np.empty(m)
+    mejora = np.empty(m, dtype=bool)
+
+    for fila in np.nonzero(columna_de_fila < 0)[0]:
+        # Búsqueda tipo Dijkstra desde 'fila' hasta llegar a una columna libre.
+        # Las columnas ya visitadas quedan con v_trabajo = -inf (costo reducido +inf) y
+        # minimo = +inf, así no hace falta enmascararlas en cada paso.
+        np.copyto(v_trabajo, v)
+        np.subtract(costos[fila], v, out=minimo)
+        minimo -= u[fila]
+        camino.fill(-1)
+        filas_visitadas = [fila]
+        columnas_visitadas = []
+
+        while True:
+            columna = int(np.argmin(minimo))
+            distancia = minimo[columna]
+            if fila_de_columna[columna] >= 0:
+                # Si una columna libre está a la misma distancia, el camino termina en ella
+                libres = np.flatnonzero((minimo == distancia) & (fila_de_columna < 0))
+                if len(libres) and preferencia is not None:
+                    # La fila que entraría en cada una: la inicial o la de la columna anterior
+                    anteriores = camino[libres]
+                    entrantes = np.where(anteriores < 0, fila, fila_de_columna[anteriores])
+                    columna = int(libres[np.argmax(preferencia[entrantes, libres])])
+                elif len(libres):
+                    columna = int(libres[0])
+            distancia_final[columna] = distancia
+            minimo[columna] = np.inf
+            v_trabajo[columna] = -np.inf
+            columnas_visitadas.append(columna)
+
+            fila_siguiente = fila_de_columna[columna]
+            if fila_siguiente < 0:
+                break
+
+            # Relajar las columnas libres a través de la fila emparejada con 'columna'
+            filas_visitadas.append(fila_siguiente)
+            np.subtract(costos[fila_siguiente], v_trabajo, out=reducido)
+            reducido += distancia - u[fila_siguiente]
+            np.less(reducido, minimo, out=mejora)
+            np.copyto(minimo, reducido, where=mejora)
+            np.copyto(camino, columna, where=mejora)
+
+        # Actualizar potenciales (solo filas/columnas alcanzadas)
+        columnas_visitadas = np.array(columnas_visitadas)
+        filas_visitadas = np.array(filas_visitadas)
+        u[filas_visitadas[0]] += distancia
+        ajuste = distancia - distancia_final[columnas_visitadas[:-1]]
+        u[filas_visitadas[1:]] += ajuste
+        v[columnas_visitadas[:-1]] -= ajuste
+
+        # Invertir el camino aumentante
+        while True:
+            anterior = camino[columna]
+            if anterior < 0:
+                fila_de_columna[columna] = fila
+                columna_de_fila[fila] = columna
+                break
+            fila_de_columna[columna] = fila_de_columna[anterior]
+            columna_de_fila[fila_de_columna[columna]] = columna
+            columna = anterior
+
+    return columna_de_fila
+
+def estimar_cupos(factible, carga_inicial):
+    """
+    Cuántas instancias necesitaría cada miembro, según un reparto voraz barato: las instancias
+    con menos candidatos primero, cada una al miembro factible menos cargado. Es una asignación
+    completa, así que con al menos estos cupos el problema siempre tiene solución.
+    """
+    carga = np.asarray(carga_inicial, dtype=float).copy()
+    asignadas = np.zeros(factible.shape[1], dtype=np.int64)
+    for fila in np.argsort(factible.sum(axis=1), kind='stable'):
+        miembro = int(np.argmin(np.where(factible[fila], carga, np.inf)))
+        carga[miembro] += 1
+        asignadas[miembro] += 1
+    return asignadas
+
+def asignar_optimo(factible, capacidad, carga_inicial):
+    """
+    Asigna cada instancia a un miembro.
+      factible:      matriz bool (instancias x miembros), True si cumple edad y capacidad.
+      capacidad:     matriz (instancias x miembros) con el score de capacidad (desempate).
+      carga_inicial: vector (miembros) con las instancias pendientes de cada miembro.
+    Devuelve un vector con el índice del miembro elegido por instancia (-1 si no hay ninguno).
+    """
+    factible = np.asarray(factible, dtype=bool)
+    capacidad = np.asarray(capacidad, dtype=float)
+    carga_inicial = np.asarray(carga_inicial, dtype=float)
+    n_instancias, n_miembros = factible.shape
+
+    resultado = np.full(n_instancias, -1, dtype=np.int64)
+    if not n_miembros:
+        return resultado
+
+    # Las instancias con un solo candidato no tienen nada que decidir: se asignan directo y
+    # cuentan como carga (las sin candidatos quedan en -1)
+    candidatos = factible.sum(axis=1)
+    unicas = np.nonzero(candidatos == 1)[0]
+    if len(unicas):
+        resultado[unicas] = factible[unicas].argmax(axis=1)
+        carga_inicial = carga_inicial + np.bincount(resultado[unicas], minlength=n_miembros)
+    filas = np.nonzero(candidatos > 1)[0]
+    if not len(filas):
+        return resultado
+
+    factible = factible[filas]
+    capacidad = capacidad[filas]
+
+    # Cupos por miembro, dimensionados de antemano: lo que le da el reparto voraz más una holgura,
+    # sin pasar de las instancias que puede hacer. Si al resolver un miembro usa TODOS sus cupos
+    # (y podría hacer más), quizás le faltaron: solo entonces se le agregan y se vuelve a resolver.
+    # Si a ninguno le faltan, agregar cupos no cambia el óptimo (el siguiente cupo de un miembro
+    # cuesta más que el que dejó libre).
+    maximo = factible.sum(axis=0)
+    cupos_por_miembro = np.minimum(maximo, estimar_cupos(factible, carga_inicial) + HOLGURA_CUPOS)
+    while True:
+        miembro_de_columna = np.repeat(np.arange(n_miembros), cupos_por_miembro)
+        inicio_de_miembro = np.cumsum(cupos_por_miembro) - cupos_por_miembro
+        cupo_de_columna = np.arange(len(miembro_de_columna)) - inicio_de_miembro[miembro_de_columna]
+
+        costos = np.where(
+            factible[:, miembro_de_columna],
+            carga_inicial[miembro_de_columna] + cupo_de_columna,
+            COSTO_PROHIBIDO,
+        )
+
+        # Desempate: más capacidad (como el reparto voraz)
+        elegidos = miembro_de_columna[hungaro(costos, preferencia=capacidad[:, miembro_de_columna])]
+        usados = np.bincount(elegidos, minlength=n_miembros)
+        cortos = (usados == cupos_por_miembro) & (cupos_por_miembro < maximo)
+        if not cortos.any():
+            break
+        cupos_por_miembro = np.where(cortos, np.minimum(maximo, 2 * cupos_por_miembro), cupos_por_miembro)
+
+    resultado[filas] = elegidos
+    return resultado
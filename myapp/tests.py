@@ -1,3 +1,1240 @@
-from django.test import TestCase
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cargas, lotes, views
+from .cache_fragmentos import estadisticas, reiniciar_estadisticas
+from .condicional import estado_de_familias, estado_de_usuario
+from .management.commands.repartir_familias import agrupar_por_miembros, armar_bloques
+from .membresia import Membresia, MembresiaMiddleware
+from .trabajos import MAXIMO_INTENTOS, encolar_reparto, tomar_siguiente_trabajo
+from .models import DIA_BITS, CargaPendiente, DisponibilidadDiaria, Eliminacion, Familia, Horario, Tarea, TrabajoReparto, mascara_a_dias
+from .reparto import (
+    MODO_OPTIMO, MODO_VORAZ, AgendaDia, ejecutar_reparto, guardar_instancias, planificar_reparto, fecha_de_dia,
+    cargar_carga_pendiente, reasignar_por_cambio_horario,
+)
+from .solver import COSTO_PROHIBIDO, asignar_optimo, hungaro, np, solver_disponible
+
+# Tablas cuyas consultas se revisan con EXPLAIN QUERY PLAN
+TABLAS_VIGILADAS = ('myapp_tarea', 'myapp_horario', 'myapp_disponibilidaddiaria', 'myapp_eliminacion', 'myapp_perfil')
+
+# Un "SCAN <tabla>" en el plan de SQLite es un recorrido completo (con o sin índice cubriente)
+RECORRIDO_COMPLETO = re.compile(r'^SCAN (?!CONSTANT ROW)')
+
+# Las pruebas que vacían la caché usan una propia: cache.clear() sobre la de settings borraría
+# los fragmentos reales de BASE_DIR/.cache/fragmentos
+CACHE_EN_MEMORIA = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas'}}
+
+def cache_en_carpeta(carpeta):
+    # Caché en archivos (compartida entre procesos) dentro de 'carpeta'
+    return {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': carpeta}}
+
+# Programa que corre en un proceso aparte (sin base de datos: solo toca la caché en la carpeta argv[2])
+SUBIR_VERSION_EN_OTRO_PROCESO = (
+    "import sys, django; django.setup(); "
+    "from django.conf import settings; from myapp.tests import cache_en_carpeta; "
+    "settings.CACHES = cache_en_carpeta(sys.argv[2]); "
+    ""
+    "from myapp.cache_fragmentos import invalidar_familias; invalidar_familias([int(sys.argv[1])])"
+)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Los planes de consulta se revisan con SQLite")
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class PlanesDeConsultaTests(TestCase):
+    """Las consultas de las vistas principales deben resolverse con índices, nunca recorriendo la tabla."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.miembro = User.objects.create_user('miembro', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.familia.miembros.add(cls.jefe, cls.miembro)
+
+        for usuario in (cls.jefe, cls.miembro):
+            for dia in ('LUN', 'MIE', 'VIE'):
+                Horario.objects.create(usuario=usuario, dia=dia, hora_inicio=time(8), hora_termino=time(12))
+        for numero in range(3):
+            Tarea.objects.create(
+                nombre=f'Tarea {numero}',
+                familia=cls.familia,
+                dias_recurrencia_csv='LUN,MIE,VIE',
+                tiempo_requerido_minutos=30,
+            )
+        ejecutar_reparto(cls.familia)
+
+    def setUp(self):
+        cache.clear() # Sin fragmentos guardados: cada vista consulta la base de datos
+        self.client.force_login(self.jefe)
+
+    def planes(self, accion):
+        """Ejecuta 'accion' y devuelve [(sql, [detalle del plan])] de las consultas sobre las tablas vigiladas."""
+        with CaptureQueriesContext(connection) as contexto:
+            accion()
+
+        planes = []
+        for consulta in contexto.captured_queries:
+            sql = consulta['sql']
+            if not sql.startswith('SELECT') or not any(f'"{tabla}"' in sql for tabla in TABLAS_VIGILADAS):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                planes.append((sql, [fila[3] for fila in cursor.fetchall()]))
+        return planes
+
+    def assertSinRecorridoCompleto(self, accion):
+        planes = self.planes(accion)
+        self.assertTrue(planes, "La acción no consultó ninguna de las tablas vigiladas.")
+        for sql, detalle in planes:
+            recorridos = [paso for paso in detalle if RECORRIDO_COMPLETO.match(paso)]
+            self.assertFalse(recorridos, f"Recorrido completo en:\n{sql}\nPlan: {detalle}")
+
+    def test_lista_de_tareas(self):
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('tareas')))
+
+    @override_settings(TAREAS_POR_PAGINA=5)
+    def test_lista_de_tareas_paginada_y_filtrada(self):
+        siguiente = self.client.get(reverse('tareas')).context['pagina_siguiente']
+        self.assertIsNotNone(siguiente)
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('tareas') + siguiente))
+        self.assertSinRecorridoCompleto(
+            lambda: self.client.get(reverse('tareas'), {'familia': self.familia.id, 'responsable': self.miembro.id, 'dia': 'MIE'})
+        )
+        self.assertEqual(self.client.get(reverse('tareas'), {'familia': '²', 'responsable': '²'}).status_code, 200) # Se ignoran
+
+    def test_calendario_del_perfil(self):
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('perfil')))
+
+    def test_eventos_del_calendario(self):
+        lunes = fecha_de_dia(date.today(), 'LUN')
+        parametros = {'start': lunes.isoformat(), 'end': (lunes + timedelta(days=42)).isoformat()}
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('eventos_calendario'), parametros))
+
+    def test_reparto(self):
+        self.assertSinRecorridoCompleto(lambda: planificar_reparto(self.familia))
+
+    def test_limpiar_por_dia(self):
+        url = reverse('limpiar_instancias_tareas', args=[self.familia.id])
+        self.assertSinRecorridoCompleto(lambda: self.client.post(url, {'filtro_dia': 'LUN'}))
+
+    def test_limpiar_por_semana(self):
+        url = reverse('limpiar_instancias_tareas', args=[self.familia.id])
+        lunes = fecha_de_dia(date.today(), 'LUN')
+        self.assertSinRecorridoCompleto(
+            lambda: self.client.post(url, {'filtro_dia': 'TODOS', 'filtro_fecha': lunes.isoformat()})
+        )
+
+    def test_api_de_tareas(self):
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('tarea-list')))
+
+    def test_api_paginada_filtrada_y_con_campos(self):
+        siguiente = self.client.get(reverse('tarea-list'), {'tamano': 2, 'estado': 'pendiente'}).json()['next']
+        self.assertIsNotNone(siguiente)
+        self.assertSinRecorridoCompleto(lambda: self.client.get(siguiente))
+        lunes = fecha_de_dia(date.today(), 'LUN')
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('tarea-list'), {
+            'familia': self.familia.id, 'estado': 'pendiente', 'tipo': 'instancia', 'responsable': self.miembro.id,
+            'desde': lunes.isoformat(), 'hasta': (lunes + timedelta(days=6)).isoformat(), 'fields': 'id,nombre',
+        }))
+        respuesta = self.client.get(reverse('tarea-list'), {'fields': 'id,nombre'})
+        self.assertEqual(set(respuesta.json()['results'][0]), {'id', 'nombre'})
+        for parametro in ('familia', 'responsable'):
+            self.assertEqual(self.client.get(reverse('tarea-list'), {parametro: '²'}).status_code, 400)
+
+    def test_sincronizacion_por_cambios(self):
+        cursor = self.client.get(reverse('api_sync')).json()['cursor']
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('api_sync'), {'since': cursor}))
+
+    def test_validadores_del_get_condicional(self):
+        self.assertSinRecorridoCompleto(lambda: estado_de_familias([self.familia.id], con_perfiles=True))
+        self.assertSinRecorridoCompleto(lambda: estado_de_usuario(self.jefe.id))
+
+
+class CacheDeFragmentosTests(TestCase):
+    """Los fragmentos se reusan mientras la familia no cambie y se invalidan con cualquier cambio."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Caché en archivos, como la real, pero en una carpeta temporal (otro proceso también la ve)
+        cls.carpeta_cache = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(CACHES=cache_en_carpeta(cls.carpeta_cache)))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.miembro = User.objects.create_user('miembro', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.familia.miembros.add(cls.jefe, cls.miembro)
+        cls.tarea = Tarea.objects.create(nombre='Barrer', familia=cls.familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=30)
+
+    def setUp(self):
+        cache.clear()
+        reiniciar_estadisticas()
+        self.client.force_login(self.jefe)
+
+    def test_lista_de_tareas_se_reusa_hasta_que_cambia_una_tarea(self):
+        self.client.get(reverse('tareas'))
+        self.client.get(reverse('tareas'))
+        self.assertEqual((estadisticas()['aciertos'], estadisticas()['fallos']), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tarea.nombre = 'Trapear'
+            self.tarea.save()
+        self.assertContains(self.client.get(reverse('tareas')), 'Trapear')
+        self.assertEqual(estadisticas()['fallos'], 2)
+
+    def test_lista_no_se_comparte_entre_usuarios(self):
+        self.client.get(reverse('tareas'))
+        self.client.force_login(self.miembro)
+        respuesta = self.client.get(reverse('tareas'))
+        self.assertNotContains(respuesta, 'Editar') # Los botones de jefe no se filtran al miembro
+        self.assertEqual(estadisticas()['aciertos'], 0)
+
+    def test_horario_invalida_la_disponibilidad_del_perfil(self):
+        self.client.get(reverse('perfil'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Horario.objects.create(usuario=self.jefe, dia='MAR', hora_inicio=time(9), hora_termino=time(10))
+        respuesta = self.client.get(reverse('perfil'))
+        self.assertIn('MAR', respuesta.context['disponibilidad_json'])
+
+    def test_instancia_creada_por_la_api_aparece_en_el_calendario(self):
+        respuesta = self.client.post(reverse('tarea-list'), {
+            'nombre': 'Regar', 'familia': self.familia.id, 'tipo': 'instancia', 'responsable': self.jefe.id,
+            'dias_recurrencia_mask': DIA_BITS['MIE'],
+        }, content_type='application/json')
+        self.assertEqual(respuesta.json()['fecha_programada'], fecha_de_dia(date.today(), 'MIE').isoformat())
+        eventos = self.client.get(reverse('eventos_calendario'), {
+            'start': date.today().isoformat(), 'end': (date.today() + timedelta(days=7)).isoformat(),
+        }).json()
+        self.assertTrue(any(evento['title'].startswith('Regar') for evento in eventos))
+
+    def test_eventos_se_invalidan_al_cambiar_miembros(self):
+        lunes = fecha_de_dia(date.today(), 'LUN')
+        parametros = {'start': lunes.isoformat(), 'end': (lunes + timedelta(days=7)).isoformat()}
+        self.client.get(reverse('eventos_calendario'), parametros)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.familia.miembros.remove(self.miembro)
+        self.client.get(reverse('eventos_calendario'), parametros)
+        self.assertEqual(estadisticas()['aciertos'], 0)
+
+    def test_version_subida_por_otro_proceso(self):
+        # Como el worker de reparto o el pool de repartir_familias: otro proceso sube la versión
+        self.client.get(reverse('tareas'))
+        subprocess.run(
+            [sys.executable, '-c', SUBIR_VERSION_EN_OTRO_PROCESO, str(self.familia.id), self.carpeta_cache],
+            cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'mysite.settings'}, check=True,
+        )
+        self.client.get(reverse('tareas'))
+        self.assertEqual((estadisticas()['aciertos'], estadisticas()['fallos']), (0, 2))
+
+
+class CodigosDeInvitacionTests(TestCase):
+    """Los códigos se asignan sin consultar antes; un choque con la restricción UNIQUE se reintenta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.existente = Familia.objects.create(nombre='Existente', jefe=User.objects.create_user('jefe'))
+
+    def test_crear_familia_no_consulta_el_codigo_antes(self):
+        with CaptureQueriesContext(connection) as contexto:
+            Familia.objects.create(nombre='Nueva', jefe=User.objects.create_user('otro'))
+        self.assertFalse([q for q in contexto.captured_queries if 'codigo_invitacion" =' in q['sql']])
+
+    def test_codigo_repetido_se_reintenta(self):
+        codigos = iter([self.existente.codigo_invitacion, 'NUEVO001'])
+        with mock.patch('myapp.models.nuevo_codigo_invitacion', lambda: next(codigos)):
+            familia = Familia.objects.create(nombre='Nueva', jefe=User.objects.create_user('otro'))
+        self.assertEqual(familia.codigo_invitacion, 'NUEVO001')
+
+    def test_otras_violaciones_no_se_reintentan(self):
+        with self.assertRaises(IntegrityError): # jefe es OneToOne: no es un choque de código
+            Familia.objects.create(nombre='Repetida', jefe=self.existente.jefe)
+
+    def test_crear_en_bloque_reemplaza_solo_los_codigos_ocupados(self):
+        jefes = [User.objects.create_user(f'jefe{numero}') for numero in range(3)]
+        codigos = iter([self.existente.codigo_invitacion, 'BLOQUE01', 'BLOQUE02', 'BLOQUE03'])
+        with mock.patch('myapp.models.nuevo_codigo_invitacion', lambda: next(codigos)):
+            Familia.crear_en_bloque([Familia(nombre=f'F{numero}', jefe=jefe) for numero, jefe in enumerate(jefes)])
+        self.assertEqual(
+            sorted(Familia.objects.filter(jefe__in=jefes).values_list('codigo_invitacion', flat=True)),
+            ['BLOQUE01', 'BLOQUE02', 'BLOQUE03'],
+        )
+
+
+class OperacionesEnLoteTests(TestCase):
+    """Los lotes de la API aplican los elementos válidos en una transacción y reportan cada uno."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.ajena = Familia.objects.create(nombre='Ajena', jefe=User.objects.create_user('otro'))
+
+    def setUp(self):
+        self.client.force_login(self.jefe)
+
+    def post(self, nombre, datos):
+        return self.client.post(reverse(f'tarea-{nombre}'), datos, content_type='application/json').json()
+
+    def test_crear_y_completar_en_lote(self):
+        elementos = [
+            {'nombre': f'Tarea {numero}', 'familia': self.familia.id, 'tipo': 'instancia',
+             'responsable': self.jefe.id, 'tiempo_requerido_minutos': 10}
+            for numero in range(3)
+        ] + [{'nombre': 'Intrusa', 'familia': self.ajena.id}]
+        creadas = self.post('crear-lote', elementos)
+        self.assertEqual((creadas['aplicadas'], creadas['rechazadas']), (3, 1))
+        self.assertIn('familia', creadas['resultados'][3]['errores'])
+        self.assertEqual(cargas.carga_por_usuario([self.jefe]), {self.jefe.id: 3})
+
+        ids = [resultado['id'] for resultado in creadas['resultados'] if resultado['ok']]
+        completadas = self.post('completar-lote', {'ids': ids + [0], 'estado': 'hecha'})
+        self.assertEqual((completadas['aplicadas'], completadas['rechazadas']), (3, 1))
+        self.assertFalse(Tarea.objects.filter(id__in=ids, estado='pendiente').exists())
+        self.assertEqual(cargas.conciliar(), [])
+
+    def test_ids_que_no_son_enteros(self):
+        actualizadas = self.post('actualizar-lote', [{'id': [1], 'nombre': 'x'}, {'id': {'a': 1}}, {'id': 'abc'}])
+        self.assertEqual(actualizadas['rechazadas'], 3)
+        self.assertEqual({resultado['id'] for resultado in actualizadas['resultados']}, {None})
+
+    def test_relacion_con_un_digito_que_no_es_numero(self):
+        creadas = self.post('crear-lote', [{'nombre': 'Rara', 'familia': '²'}])
+        self.assertEqual(creadas['rechazadas'], 1)
+        self.assertIn('familia', creadas['resultados'][0]['errores'])
+
+
+class ExportacionTests(TestCase):
+    """La exportación se envía por partes y trae las columnas de responsable y familia."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        for numero in range(3):
+            Tarea.objects.create(nombre=f'Tarea {numero}', familia=cls.familia, responsable=cls.jefe, tiempo_requerido_minutos=10)
+
+    def setUp(self):
+        self.client.force_login(self.jefe)
+
+    def exportar(self, formato):
+        respuesta = self.client.get(reverse('exportar_tareas', args=[self.familia.id]), {'formato': formato})
+        self.assertTrue(respuesta.streaming)
+        return b''.join(respuesta.streaming_content).decode()
+
+    def test_ndjson_y_csv(self):
+        filas = [json.loads(linea) for linea in self.exportar('ndjson').splitlines()]
+        self.assertEqual([fila['nombre'] for fila in filas], ['Tarea 0', 'Tarea 1', 'Tarea 2'])
+        self.assertEqual({fila['responsable'] for fila in filas}, {'jefe'})
+
+        lineas = list(csv.DictReader(io.StringIO(self.exportar('csv'))))
+        self.assertEqual(len(lineas), 3)
+        self.assertEqual(lineas[0]['familia'], 'Familia')
+
+    def test_csv_no_exporta_formulas(self):
+        for nombre in ('=HYPERLINK("http://x")', '+1', '-1+2', '@SUMA(A1)', 'Barrer = limpiar'):
+            Tarea.objects.create(nombre=nombre, familia=self.familia)
+        nombres = [linea['nombre'] for linea in csv.DictReader(io.StringIO(self.exportar('csv')))][3:]
+        self.assertEqual(nombres, ["'=HYPERLINK(\"http://x\")", "'+1", "'-1+2", "'@SUMA(A1)", 'Barrer = limpiar'])
+        # NDJSON no lo abre una planilla: el texto va sin cambios
+        self.assertEqual(json.loads(self.exportar('ndjson').splitlines()[4])['nombre'], '+1')
+
+    def test_familia_ajena(self):
+        ajena = Familia.objects.create(nombre='Ajena', jefe=User.objects.create_user('otro'))
+        self.assertEqual(self.client.get(reverse('exportar_tareas', args=[ajena.id])).status_code, 404)
+
+
+@override_settings(SYNC_SOLAPE_SEGUNDOS=0)
+class SincronizacionTests(TestCase):
+    """/api/sync/ devuelve solo lo cambiado o borrado desde el cursor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.tareas = [Tarea.objects.create(nombre=f'Tarea {numero}', familia=cls.familia) for numero in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.jefe)
+
+    def sincronizar(self, cursor=None):
+        return self.client.get(reverse('api_sync'), {'since': cursor} if cursor else {}).json()
+
+    def test_cambios_y_eliminaciones_desde_el_cursor(self):
+        completa = self.sincronizar()
+        self.assertTrue(completa['completa'])
+        self.assertEqual(len(completa['tareas']), 3)
+
+        sin_cambios = self.sincronizar(completa['cursor'])
+        self.assertEqual((sin_cambios['tareas'], sin_cambios['eliminadas']['tareas']), ([], []))
+
+        modificada, borrada = self.tareas[0], self.tareas[1]
+        borrada_id = borrada.id
+        modificada.nombre = 'Cambiada'
+        modificada.save()
+        borrada.delete()
+        cambios = self.sincronizar(sin_cambios['cursor'])
+        self.assertFalse(cambios['completa'])
+        self.assertEqual([tarea['nombre'] for tarea in cambios['tareas']], ['Cambiada'])
+        self.assertEqual(cambios['eliminadas']['tareas'], [borrada_id])
+
+
+    def test_tarea_movida_a_otra_familia(self):
+        ajena = Familia.objects.create(nombre='Ajena', jefe=User.objects.create_user('otro'))
+        propia = Familia.objects.create(nombre='Segunda', jefe=User.objects.create_user('tercero'))
+        propia.miembros.add(self.jefe)
+        cursor = self.sincronizar()['cursor']
+
+        a_la_propia, a_la_ajena = Tarea.objects.get(id=self.tareas[0].id), Tarea.objects.get(id=self.tareas[1].id)
+        a_la_propia.familia = propia
+        a_la_propia.save()
+        a_la_ajena.familia = ajena
+        a_la_ajena.save()
+        cambios = self.sincronizar(cursor)
+        self.assertEqual(cambios['eliminadas']['tareas'], [a_la_ajena.id]) # La ajena ya no la ve
+        self.assertIn(a_la_propia.id, [tarea['id'] for tarea in cambios['tareas']])
+
+        # Por el lote de la API también
+        respuesta = self.client.post(
+            reverse('tarea-actualizar-lote'), [{'id': self.tareas[2].id, 'familia': propia.id}], content_type='application/json'
+        )
+        self.assertEqual(respuesta.json()['aplicadas'], 1)
+        self.assertTrue(Eliminacion.objects.filter(objeto_id=self.tareas[2].id, familia_id=self.familia.id).exists())
+
+    def test_reparto_largo_pone_modificado_al_confirmar(self):
+        # Un guardado que tarda más que el solape: cada lote se inserta 10 s después del anterior
+        base = timezone.now()
+        reloj = itertools.count()
+        instancias = [Tarea(nombre=f'Instancia {numero}', familia=self.familia, tipo=Tarea.INSTANCIA) for numero in range(3)]
+        with mock.patch('django.utils.timezone.now', side_effect=lambda: base + timedelta(seconds=10 * next(reloj))):
+            guardar_instancias(instancias, tamano_lote=1)
+        fechas = set(Tarea.objects.filter(id__in=[instancia.id for instancia in instancias]).values_list('modificado', flat=True))
+        self.assertEqual(len(fechas), 1)
+        self.assertGreater(fechas.pop(), base + timedelta(seconds=30)) # Después del último lote
+
+class GetCondicionalTests(TestCase):
+    """Con un ETag vigente las páginas responden 304 sin consultar las tareas; cualquier cambio lo invalida."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.tarea = Tarea.objects.create(nombre='Barrer', familia=cls.familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=30)
+        Horario.objects.create(usuario=cls.jefe, dia='MAR', hora_inicio=time(8), hora_termino=time(12))
+
+    def setUp(self):
+        self.client.force_login(self.jefe)
+
+    def get_condicional(self, nombre):
+        respuesta = self.client.get(reverse(nombre))
+        self.assertEqual(respuesta.status_code, 200)
+        with CaptureQueriesContext(connection) as contexto:
+            no_modificada = self.client.get(reverse(nombre), HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        return respuesta, no_modificada, contexto.captured_queries
+
+    def test_304_antes_de_consultar_las_tareas(self):
+        for nombre in ('tareas', 'perfil', 'ver_horario', 'tarea-list'):
+            with self.subTest(nombre):
+                respuesta, no_modificada, consultas = self.get_condicional(nombre)
+                self.assertEqual(no_modificada.status_code, 304)
+                self.assertEqual(no_modificada['ETag'], respuesta['ETag'])
+                self.assertTrue(respuesta.has_header('Last-Modified'))
+                self.assertFalse([consulta for consulta in consultas if consulta['sql'].startswith('SELECT "myapp_tarea"')])
+
+    def test_un_cambio_cambia_el_etag(self):
+        respuesta, _, _ = self.get_condicional('tarea-list')
+        self.tarea.nombre = 'Trapear'
+        self.tarea.save()
+        self.assertEqual(self.client.get(reverse('tarea-list'), HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+        respuesta, _, _ = self.get_condicional('ver_horario')
+        Horario.objects.create(usuario=self.jefe, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+        self.assertEqual(self.client.get(reverse('ver_horario'), HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+    def test_tarea_movida_cambia_el_etag_de_la_familia_anterior(self):
+        otra = Familia.objects.create(nombre='Otra', jefe=User.objects.create_user('otro'))
+        respuesta, _, _ = self.get_condicional('tarea-list')
+        tarea = Tarea.objects.get(id=self.tarea.id)
+        tarea.familia = otra
+        tarea.save()
+        self.assertEqual(self.client.get(reverse('tarea-list'), HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+    def test_mensajes_pendientes_no_se_responden_con_304(self):
+        respuesta, _, _ = self.get_condicional('perfil')
+        self.client.post(reverse('crear_familia'), {'nombre': 'Otra'}) # Ya es jefe: aviso y vuelta al perfil
+        self.assertContains(self.client.get(reverse('perfil'), HTTP_IF_NONE_MATCH=respuesta['ETag']), 'Ya eres jefe')
+
+
+class AgendaDiaTests(SimpleTestCase):
+    """Huecos libres de un día: fusión de bloques, best-fit y franjas ya comprometidas."""
+
+    def huecos(self, agenda):
+        return sorted((inicio, inicio + largo) for largo, inicio in agenda._por_largo)
+
+    def test_bloques_traslapados_se_fusionan(self):
+        agenda = AgendaDia([(480, 600), (540, 660), (700, 720)])
+        self.assertEqual(self.huecos(agenda), [(480, 660), (700, 720)])
+        self.assertEqual(agenda.libre, 200)
+
+    def test_reservar_usa_el_hueco_mas_ajustado(self):
+        agenda = AgendaDia([(0, 120), (200, 230), (300, 345)])
+        self.assertEqual(agenda.reservar(30), (200, 230))
+        self.assertEqual(agenda.reservar(40), (300, 340))
+        self.assertIsNone(agenda.reservar(121))
+        self.assertEqual(self.huecos(agenda), [(0, 120), (340, 345)])
+        self.assertEqual(agenda.libre, 125)
+
+    def test_ocupar_una_franja_que_cruza_varios_huecos(self):
+        agenda = AgendaDia([(0, 100), (110, 150), (160, 170), (200, 260)])
+        agenda.ocupar(50, 250)
+        self.assertEqual(self.huecos(agenda), [(0, 50), (250, 260)])
+        self.assertEqual(agenda.libre, 60)
+
+    def test_ocupar_dentro_de_un_hueco_lo_parte_en_dos(self):
+        agenda = AgendaDia([(480, 720)])
+        agenda.ocupar(540, 600)
+        self.assertEqual(self.huecos(agenda), [(480, 540), (600, 720)])
+        self.assertTrue(agenda.contiene(600, 720))
+        self.assertFalse(agenda.contiene(530, 550))
+        self.assertTrue(agenda.cabe(120))
+        self.assertFalse(agenda.cabe(121))
+
+
+class DiasDeRecurrenciaTests(TestCase):
+    """La máscara y su copia CSV quedan sincronizadas, gane el campo que cambió quien escribe."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+
+    def setUp(self):
+        self.client.force_login(self.jefe)
+        self.plantilla = Tarea.objects.create(nombre='Barrer', familia=self.familia, dias_recurrencia_csv='LUN')
+
+    def dias(self):
+        self.plantilla.refresh_from_db()
+        return self.plantilla.dias_recurrencia_mask, self.plantilla.dias_recurrencia_csv
+
+    def test_patch_de_la_mascara(self):
+        respuesta = self.client.patch(
+            reverse('tarea-detail', args=[self.plantilla.id]), {'dias_recurrencia_mask': 5}, content_type='application/json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.dias(), (5, 'LUN,MIE'))
+
+    def test_patch_del_csv(self):
+        self.client.patch(
+            reverse('tarea-detail', args=[self.plantilla.id]), {'dias_recurrencia_csv': 'MAR,DOM'}, content_type='application/json'
+        )
+        self.assertEqual(self.dias(), (66, 'MAR,DOM'))
+
+    def test_actualizar_lote_con_la_mascara(self):
+        self.client.post(
+            reverse('tarea-actualizar-lote'), [{'id': self.plantilla.id, 'dias_recurrencia_mask': 64}], content_type='application/json'
+        )
+        self.assertEqual(self.dias(), (64, 'DOM'))
+
+
+class TrabajosDeRepartoTests(TestCase):
+    """Cola de repartos: avance visible fuera de la transacción y trabajos de workers muertos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.familia.miembros.add(cls.jefe)
+        Horario.objects.create(usuario=cls.jefe, dia='LUN', hora_inicio=time(8), hora_termino=time(12))
+        Tarea.objects.create(nombre='Barrer', familia=cls.familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=30)
+
+    def test_el_avance_no_se_escribe_dentro_de_la_transaccion(self):
+        profundidad = len(connection.atomic_blocks) # TestCase ya abre transacciones propias
+        avisos = []
+        ejecutar_reparto(self.familia, progreso=lambda porcentaje, etapa: avisos.append((porcentaje, len(connection.atomic_blocks))))
+        self.assertEqual([porcentaje for porcentaje, _ in avisos], [0, 60, 95])
+        self.assertEqual({bloques for _, bloques in avisos}, {profundidad})
+
+    def test_el_worker_guarda_y_muestra_los_lotes(self):
+        encolado = encolar_reparto(self.familia, self.jefe, 'voraz')
+        salida = io.StringIO()
+        call_command('procesar_trabajos_reparto', '--una-vez', stdout=salida)
+
+        encolado.refresh_from_db()
+        self.assertEqual((encolado.estado, encolado.asignaciones, encolado.lotes), ('completado', 1, [1]))
+        self.assertIn('1 instancias en 1 lote(s) [1]', salida.getvalue())
+        self.client.force_login(self.jefe)
+        estado = self.client.get(reverse('estado_reparto_json', args=[encolado.id])).json()
+        self.assertEqual(estado['lotes'], [1])
+
+    def colgar(self, trabajo):
+        TrabajoReparto.objects.filter(id=trabajo.id).update(latido=trabajo.latido - timedelta(hours=1))
+
+    @override_settings(REPARTO_TIEMPO_MAXIMO=60)
+    def test_trabajo_colgado_vuelve_a_la_cola_y_luego_falla(self):
+        encolado = encolar_reparto(self.familia, self.jefe, 'voraz')
+        for intento in range(1, MAXIMO_INTENTOS + 1):
+            trabajo = tomar_siguiente_trabajo()
+            self.assertEqual(trabajo.id, encolado.id)
+            trabajo.refresh_from_db()
+            self.assertEqual((trabajo.estado, trabajo.intentos), ('en_curso', intento))
+            self.colgar(trabajo)
+
+        self.assertIsNone(tomar_siguiente_trabajo())
+        encolado.refresh_from_db()
+        self.assertEqual(encolado.estado, 'fallido')
+        self.assertIn('dejó de responder', encolado.error)
+
+
+class RepartoTests(TestCase):
+    """Motor de reparto: a quién se asigna cada (plantilla, día) y en qué franja."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.familia.miembros.add(cls.jefe)
+        Horario.objects.create(usuario=cls.jefe, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+
+    def instancia_asignada(self, fecha):
+        return Tarea.objects.create(
+            nombre='Anterior', familia=self.familia, tipo=Tarea.INSTANCIA, responsable=self.jefe,
+            dias_recurrencia_mask=DIA_BITS['LUN'], hora_inicio=time(8), hora_termino=time(9), fecha_programada=fecha,
+        )
+
+    def test_solo_ocupan_la_semana_las_instancias_de_esa_semana(self):
+        Tarea.objects.create(nombre='Barrer', familia=self.familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=60)
+        lunes = fecha_de_dia(date.today(), 'LUN')
+
+        self.instancia_asignada(lunes - timedelta(days=7)) # De la semana pasada: no cuenta
+        self.assertEqual(len(planificar_reparto(self.familia)['instancias']), 1)
+
+        self.instancia_asignada(lunes) # De la semana que se reparte: ocupa la única hora libre
+        self.assertEqual(planificar_reparto(self.familia)['instancias'], [])
+
+    def test_instancias_con_fecha_y_plantilla(self):
+        plantilla = Tarea.objects.create(nombre='Barrer', familia=self.familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=30)
+        ejecutar_reparto(self.familia)
+        instancia = Tarea.objects.instancias().get(familia=self.familia)
+        self.assertEqual(
+            (instancia.plantilla_id, instancia.fecha_programada, instancia.hora_inicio),
+            (plantilla.id, fecha_de_dia(timezone.now().date(), 'LUN'), time(8)),
+        )
+        self.assertEqual(list(plantilla.instancias.filter(fecha_programada=instancia.fecha_programada)), [instancia])
+
+    def test_lotes_mas_chicos_que_las_instancias(self):
+        plantillas = [
+            Tarea.objects.create(nombre=f'Tarea {numero}', familia=self.familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=10)
+            for numero in range(5)
+        ]
+        resultado = ejecutar_reparto(self.familia, tamano_lote=2)
+        self.assertEqual(resultado['lotes'], [2, 2, 1])
+        self.assertEqual(resultado['asignaciones'], 5)
+        guardadas = Tarea.objects.instancias().filter(familia=self.familia)
+        self.assertEqual(sorted(guardadas.values_list('plantilla_id', flat=True)), [plantilla.id for plantilla in plantillas])
+        self.assertEqual(set(guardadas.values_list('responsable_id', 'fecha_programada')), {(self.jefe.id, fecha_de_dia(date.today(), 'LUN'))})
+
+
+class PlanDeRepartoTests(TestCase):
+    """Vista previa del reparto (vista JSON y comando): muestra el plan sin escribir nada."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.ana = User.objects.create_user('ana')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.familia.miembros.add(cls.jefe, cls.ana)
+        Horario.objects.create(usuario=cls.jefe, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+        Horario.objects.create(usuario=cls.ana, dia='MIE', hora_inicio=time(10), hora_termino=time(11))
+        cls.barrer = Tarea.objects.create(nombre='Barrer', familia=cls.familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=60)
+        cls.cocinar = Tarea.objects.create(nombre='Cocinar', familia=cls.familia, dias_recurrencia_csv='MIE', tiempo_requerido_minutos=30)
+        cls.regar = Tarea.objects.create(nombre='Regar', familia=cls.familia, dias_recurrencia_csv='MAR', tiempo_requerido_minutos=15)
+        CargaPendiente.objects.create(familia=cls.familia, usuario=cls.jefe, pendientes=2, minutos_pendientes=45)
+
+    def modos(self):
+        return (MODO_VORAZ, MODO_OPTIMO) if solver_disponible() else (MODO_VORAZ,)
+
+    def estado_de_la_db(self):
+        return Tarea.objects.count(), list(CargaPendiente.objects.values_list('usuario_id', 'pendientes', 'minutos_pendientes'))
+
+    def assertPlanEsperado(self, plan):
+        hoy = timezone.now().date()
+        self.assertEqual(
+            sorted((a['plantilla_id'], a['responsable'], a['hora_inicio'], a['hora_termino'], a['fecha_programada']) for a in plan['asignaciones']),
+            [
+                (self.barrer.id, 'jefe', '08:00:00', '09:00:00', fecha_de_dia(hoy, 'LUN').isoformat()),
+                (self.cocinar.id, 'ana', '10:00:00', '10:30:00', fecha_de_dia(hoy, 'MIE').isoformat()),
+            ],
+        )
+        self.assertEqual(plan['no_asignables'], [{'tarea_id': self.regar.id, 'tarea': 'Regar', 'dia': 'MAR'}])
+        self.assertEqual((plan['miembros'], plan['plantillas']), (2, 3))
+
+    def test_vista_plan_reparto(self):
+        antes = self.estado_de_la_db()
+        self.client.force_login(self.jefe)
+        for modo in self.modos():
+            with self.subTest(modo=modo):
+                respuesta = self.client.get(reverse('plan_reparto', args=[self.familia.id]), {'modo': modo})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.json()['modo'], modo)
+                self.assertPlanEsperado(respuesta.json())
+        self.assertEqual(self.estado_de_la_db(), antes)
+
+    def test_vista_plan_reparto_rechaza_modo_y_familia_ajena(self):
+        self.client.force_login(self.jefe)
+        url = reverse('plan_reparto', args=[self.familia.id])
+        self.assertEqual(self.client.get(url, {'modo': 'otro'}).status_code, 400)
+        self.client.force_login(self.ana) # Es miembro, no jefe
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_comando_planificar_reparto(self):
+        antes = self.estado_de_la_db()
+        for modo in self.modos():
+            with self.subTest(modo=modo):
+                salida = io.StringIO()
+                call_command('planificar_reparto', self.familia.id, '--modo', modo, '--json', stdout=salida)
+                self.assertPlanEsperado(json.loads(salida.getvalue()))
+
+                salida = io.StringIO()
+                call_command('planificar_reparto', self.familia.id, '--modo', modo, stdout=salida)
+                texto = salida.getvalue()
+                self.assertIn("2 miembros, 3 plantillas, 2 instancias propuestas", texto)
+                self.assertIn("Barrer (LUN) -> jefe", texto)
+                self.assertIn("Cocinar (MIE) -> ana", texto)
+                self.assertIn("Sin miembro disponible: Regar (MAR)", texto)
+        self.assertEqual(self.estado_de_la_db(), antes)
+
+        with self.assertRaises(CommandError):
+            call_command('planificar_reparto', 0, stdout=io.StringIO())
+
+
+class DisponibilidadDiariaTests(TestCase):
+    """El resumen por día sigue a cada alta, edición y baja de Horario (señales)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('ana', password='clave')
+
+    def resumen(self):
+        return {
+            fila.dia: (fila.minutos_totales, fila.intervalos)
+            for fila in DisponibilidadDiaria.objects.filter(usuario=self.usuario)
+        }
+
+    def test_alta_fusiona_bloques_traslapados(self):
+        Horario.objects.create(usuario=self.usuario, dia='LUN', hora_inicio=time(8), hora_termino=time(10))
+        Horario.objects.create(usuario=self.usuario, dia='LUN', hora_inicio=time(9), hora_termino=time(11))
+        Horario.objects.create(usuario=self.usuario, dia='LUN', hora_inicio=time(14), hora_termino=time(15), disponible=False)
+        self.assertEqual(self.resumen(), {'LUN': (180, [[480, 660]])})
+
+    def test_editar_el_dia_recalcula_ambos_dias(self):
+        horario = Horario.objects.create(usuario=self.usuario, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+        horario.dia = 'MAR'
+        horario.hora_termino = time(9, 30)
+        horario.save()
+        self.assertEqual(self.resumen(), {'MAR': (90, [[480, 570]])})
+
+    def test_baja_borra_el_dia_sin_bloques(self):
+        horario = Horario.objects.create(usuario=self.usuario, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+        Horario.objects.create(usuario=self.usuario, dia='MIE', hora_inicio=time(18), hora_termino=time(20))
+        horario.delete()
+        self.assertEqual(self.resumen(), {'MIE': (120, [[1080, 1200]])})
+        self.assertEqual(self.usuario.perfil.minutos_disponibles(), 120)
+
+
+@unittest.skipUnless(solver_disponible(), "El modo óptimo requiere NumPy")
+class RepartoOptimoTests(TestCase):
+    """Modo 'optimo': asignación de costo mínimo, más pareja que la del reparto voraz."""
+
+    def test_hungaro_encuentra_el_costo_minimo(self):
+        generador = np.random.default_rng(7)
+        for filas, columnas in ((4, 4), (3, 5), (5, 6)):
+            costos = generador.integers(0, 20, size=(filas, columnas)).astype(float)
+            elegidas = hungaro(costos)
+            self.assertEqual(len(set(elegidas.tolist())), filas) # Una columna distinta por fila
+            minimo = min(
+                sum(costos[fila, columna] for fila, columna in enumerate(permutacion))
+                for permutacion in itertools.permutations(range(columnas), filas)
+            )
+            self.assertEqual(costos[np.arange(filas), elegidas].sum(), minimo)
+
+    def test_cupos_dimensionados_no_cambian_el_optimo(self):
+        # Contra el mismo problema con todos los cupos posibles (cada miembro puede llevarse todo)
+        generador = np.random.default_rng(3)
+        for _ in range(100):
+            filas, miembros = generador.integers(2, 20), generador.integers(1, 6)
+            factible = generador.random((filas, miembros)) < generador.random()
+            carga = generador.integers(0, 4, miembros).astype(float)
+            elegidos = asignar_optimo(factible, generador.random((filas, miembros)), carga)
+
+            con_candidatos = factible.any(axis=1)
+            self.assertTrue(((elegidos >= 0) == con_candidatos).all())
+            self.assertTrue(factible[con_candidatos, elegidos[con_candidatos]].all())
+            if not con_candidatos.any():
+                continue
+            columnas = np.repeat(np.arange(miembros), filas)
+            costos = np.where(
+                factible[con_candidatos][:, columnas], carga[columnas] + np.tile(np.arange(filas), miembros), COSTO_PROHIBIDO
+            )
+            optimo = costos[np.arange(len(costos)), hungaro(costos)].sum()
+            cuentas = np.bincount(elegidos[con_candidatos], minlength=miembros)
+            self.assertEqual(sum(carga[m] * cuentas[m] + cuentas[m] * (cuentas[m] - 1) / 2 for m in range(miembros)), optimo)
+
+    def test_factibilidad_sesgada_a_escala(self):
+        generador = np.random.default_rng(5)
+        uno_solo = np.zeros((700, 20), dtype=bool)
+        uno_solo[:, 0] = True
+        mitad_para_uno = np.zeros((700, 100), dtype=bool)
+        mitad_para_uno[:350, 0] = True
+        mitad_para_uno[350:] = True
+        al_azar = generador.random((2100, 300)) < 0.3
+        # Capacidad por (día, miembro), como en el reparto: muchos empates exactos
+        capacidad_al_azar = np.repeat(generador.integers(60, 600, (7, 300)), 300, axis=0)
+
+        for factible, capacidad in (
+            (uno_solo, np.ones(uno_solo.shape)),
+            (mitad_para_uno, generador.random(mitad_para_uno.shape)),
+            (al_azar, capacidad_al_azar),
+        ):
+            inicio = perf_counter()
+            elegidos = asignar_optimo(factible, capacidad, np.zeros(factible.shape[1]))
+            self.assertLess(perf_counter() - inicio, 3)
+            self.assertTrue(factible[np.arange(len(elegidos)), elegidos].all())
+            # Lo que no está forzado queda parejo: nadie con dos instancias más que otro candidato
+            cuentas = np.bincount(elegidos, minlength=factible.shape[1])
+            libres = factible.sum(axis=1) > 1
+            for fila in np.flatnonzero(libres)[:200]:
+                self.assertLessEqual(cuentas[elegidos[fila]], cuentas[factible[fila]].min() + 1)
+
+    def test_optimo_reparte_mas_parejo_que_el_voraz(self):
+        # Barrer (LUN) lo pueden hacer los dos, Cocinar (MAR) solo ana. El voraz le da Barrer
+        # a ana (tiene más minutos libres el lunes) y luego también Cocinar; el óptimo no.
+        ana = User.objects.create_user('ana', password='clave')
+        beto = User.objects.create_user('beto', password='clave')
+        familia = Familia.objects.create(nombre='Familia', jefe=ana)
+        familia.miembros.add(ana, beto)
+        Horario.objects.create(usuario=ana, dia='LUN', hora_inicio=time(8), hora_termino=time(12))
+        Horario.objects.create(usuario=ana, dia='MAR', hora_inicio=time(8), hora_termino=time(12))
+        Horario.objects.create(usuario=beto, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+        Tarea.objects.create(nombre='Barrer', familia=familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=30)
+        Tarea.objects.create(nombre='Cocinar', familia=familia, dias_recurrencia_csv='MAR', tiempo_requerido_minutos=30)
+
+        def responsables(modo):
+            plan = planificar_reparto(familia, modo=modo)
+            self.assertEqual(plan['modo'], modo)
+            return {instancia.nombre: instancia.responsable.username for instancia in plan['instancias']}
+
+        self.assertEqual(responsables(MODO_VORAZ), {'Barrer (LUN)': 'ana', 'Cocinar (MAR)': 'ana'})
+        self.assertEqual(responsables(MODO_OPTIMO), {'Barrer (LUN)': 'beto', 'Cocinar (MAR)': 'ana'})
+
+
+class ReasignacionPorHorarioTests(TestCase):
+    """Editar o eliminar un Horario solo mueve las instancias de ese día que ya no caben."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='clave')
+        cls.beto = User.objects.create_user('beto', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.ana)
+        cls.familia.miembros.add(cls.ana, cls.beto)
+        Horario.objects.create(usuario=cls.beto, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+
+    def setUp(self):
+        self.client.force_login(self.ana)
+        self.horario = Horario.objects.create(usuario=self.ana, dia='LUN', hora_inicio=time(8), hora_termino=time(12))
+        Horario.objects.create(usuario=self.ana, dia='MIE', hora_inicio=time(8), hora_termino=time(12))
+
+    def instancia(self, nombre, dia, inicio, fin, fecha=None, responsable=None):
+        return Tarea.objects.create(
+            nombre=nombre, familia=self.familia, tipo=Tarea.INSTANCIA, responsable=responsable or self.ana,
+            dias_recurrencia_mask=DIA_BITS[dia], hora_inicio=inicio, hora_termino=fin, fecha_programada=fecha,
+            tiempo_requerido_minutos=(fin.hour * 60 + fin.minute) - (inicio.hour * 60 + inicio.minute),
+        )
+
+    def estado(self, *instancias):
+        filas = Tarea.objects.filter(id__in=[instancia.id for instancia in instancias]).select_related('responsable')
+        return {
+            fila.nombre: (fila.responsable.username if fila.responsable else None, fila.hora_inicio, fila.hora_termino)
+            for fila in filas
+        }
+
+    def test_editar_conserva_las_que_caben_y_reasigna_las_demas(self):
+        temprano = self.instancia('Barrer (LUN)', 'LUN', time(8), time(9))
+        media = self.instancia('Regar (LUN)', 'LUN', time(9), time(9, 30))
+        tarde = self.instancia('Cocinar (LUN)', 'LUN', time(11), time(12))
+        miercoles = self.instancia('Lavar (MIE)', 'MIE', time(11), time(12))
+        modificado = Tarea.objects.get(id=miercoles.id).modificado
+
+        self.client.post(
+            reverse('editar_horario', args=[self.horario.id]), {'dia': 'LUN', 'hora_inicio': '08:00', 'hora_termino': '09:30'}
+        )
+        self.assertEqual(self.estado(temprano, media, tarde, miercoles), {
+            'Barrer (LUN)': ('ana', time(8), time(9)),
+            'Regar (LUN)': ('ana', time(9), time(9, 30)),
+            'Cocinar (LUN)': ('beto', time(8), time(9)),
+            'Lavar (MIE)': ('ana', time(11), time(12)),
+        })
+        self.assertEqual(Tarea.objects.get(id=miercoles.id).modificado, modificado) # Otro día: no se toca
+
+    def test_editar_reubica_dentro_del_mismo_dia(self):
+        tarde = self.instancia('Cocinar (LUN)', 'LUN', time(11), time(12))
+        self.client.post(
+            reverse('editar_horario', args=[self.horario.id]), {'dia': 'LUN', 'hora_inicio': '09:00', 'hora_termino': '10:00'}
+        )
+        self.assertEqual(self.estado(tarde), {'Cocinar (LUN)': ('ana', time(9), time(10))})
+
+    def test_eliminar_reasigna_y_deja_sin_responsable_las_que_no_tienen_candidato(self):
+        temprano = self.instancia('Barrer (LUN)', 'LUN', time(8), time(9))
+        tarde = self.instancia('Cocinar (LUN)', 'LUN', time(11), time(12))
+
+        self.client.post(reverse('eliminar_horario', args=[self.horario.id]))
+        self.assertEqual(self.estado(temprano, tarde), {
+            'Barrer (LUN)': ('beto', time(8), time(9)),
+            'Cocinar (LUN)': (None, None, None), # beto ya no tiene otra hora libre el lunes
+        })
+        self.assertEqual(cargas.carga_por_usuario([self.ana, self.beto]), {self.ana.id: 0, self.beto.id: 1})
+
+    def test_cada_semana_tiene_su_propia_agenda(self):
+        lunes = fecha_de_dia(date.today(), 'LUN')
+        self.horario.hora_termino = time(10)
+        self.horario.save() # ana: LUN 08:00-10:00, no caben dos franjas de 90 minutos el mismo día
+        esta = self.instancia('Barrer (LUN)', 'LUN', time(8), time(9, 30), fecha=lunes)
+        siguiente = self.instancia('Cocinar (LUN)', 'LUN', time(8), time(9, 30), fecha=lunes + timedelta(days=7))
+
+        # Sin cambios en el horario: cada instancia cabe en el lunes de su semana
+        resumen = reasignar_por_cambio_horario(self.ana, 'LUN')
+        self.assertEqual((resumen['revisadas'], resumen['reasignadas']), (2, 0))
+        self.assertEqual(set(self.estado(esta, siguiente).values()), {('ana', time(8), time(9, 30))})
+
+    def test_candidato_ocupado_en_la_semana_de_la_instancia(self):
+        siguiente = fecha_de_dia(date.today(), 'LUN') + timedelta(days=7)
+        cocinar = self.instancia('Cocinar (LUN)', 'LUN', time(8), time(9), fecha=siguiente)
+        regar = self.instancia('Regar (LUN)', 'LUN', time(8), time(9), fecha=siguiente, responsable=self.beto)
+
+        self.client.post(reverse('eliminar_horario', args=[self.horario.id]))
+        self.assertEqual(self.estado(cocinar, regar), {
+            'Cocinar (LUN)': (None, None, None), # Sin doble reserva sobre 'Regar'
+            'Regar (LUN)': ('beto', time(8), time(9)),
+        })
+
+    def test_candidato_ocupado_en_otra_semana(self):
+        lunes = fecha_de_dia(date.today(), 'LUN')
+        cocinar = self.instancia('Cocinar (LUN)', 'LUN', time(8), time(9), fecha=lunes + timedelta(days=7))
+        self.instancia('Regar (LUN)', 'LUN', time(8), time(9), fecha=lunes, responsable=self.beto)
+
+        self.client.post(reverse('eliminar_horario', args=[self.horario.id]))
+        self.assertEqual(self.estado(cocinar), {'Cocinar (LUN)': ('beto', time(8), time(9))})
+
+
+class MigracionesDeDatosTests(TransactionTestCase):
+    """Migraciones que rellenan columnas nuevas: se aplican sobre filas creadas con el esquema anterior."""
+
+    def migrar(self, destino):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.loader.build_graph() # El grafo cambia de estado aplicado en cada llamada
+        ejecutor.migrate([('myapp', destino)])
+        return ejecutor.loader.project_state([('myapp', destino)]).apps
+
+    def tearDown(self):
+        self.migrar(MigrationExecutor(connection).loader.graph.leaf_nodes('myapp')[0][1])
+
+    def test_0017_csv_a_mascara_y_vuelta(self):
+        apps = self.migrar('0016_tarea_franja_horaria')
+        Usuario = apps.get_model('auth', 'User')
+        Familia = apps.get_model('myapp', 'Familia')
+        TareaAntigua = apps.get_model('myapp', 'Tarea')
+        jefe = Usuario.objects.create(username='jefe')
+        familia = Familia.objects.create(nombre='Familia', jefe=jefe, codigo_invitacion='ABCDEFGH')
+        filas = {
+            'sin_dias': TareaAntigua.objects.create(nombre='Ordenar', familia=familia, dias_recurrencia_csv=''),
+            'instancia': TareaAntigua.objects.create(nombre='Barrer (MAR)', familia=familia, dias_recurrencia_csv=None),
+            'sin_sufijo': TareaAntigua.objects.create(nombre='Suelta', familia=familia, dias_recurrencia_csv=None),
+        }
+        # Una plantilla por cada combinación de días, con el CSV escrito a mano (minúsculas y espacios)
+        plantillas = {
+            mascara: TareaAntigua.objects.create(
+                nombre=f'Plantilla {mascara}', familia=familia,
+                dias_recurrencia_csv=', '.join(dia.lower() for dia in mascara_a_dias(mascara)),
+            ).id
+            for mascara in range(1, 128)
+        }
+
+        TareaNueva = self.migrar('0017_tarea_tipo_dias_recurrencia_mask').get_model('myapp', 'Tarea')
+        self.assertEqual(
+            {clave: TareaNueva.objects.values_list('tipo', 'dias_recurrencia_mask').get(id=fila.id) for clave, fila in filas.items()},
+            {'sin_dias': ('plantilla', 0), 'instancia': ('instancia', 2), 'sin_sufijo': ('instancia', 0)},
+        )
+        # CSV -> máscara (migración) -> CSV (modelo): vuelve el mismo CSV, normalizado
+        migradas = dict(TareaNueva.objects.filter(id__in=plantillas.values()).values_list('id', 'dias_recurrencia_mask'))
+        for mascara, tarea_id in plantillas.items():
+            self.assertEqual(migradas[tarea_id], mascara)
+            self.assertEqual(
+                ','.join(mascara_a_dias(migradas[tarea_id])),
+                TareaNueva.objects.get(id=tarea_id).dias_recurrencia_csv.upper().replace(' ', ''),
+            )
+
+    def test_0018_fecha_y_plantilla_de_las_instancias(self):
+        apps = self.migrar('0017_tarea_tipo_dias_recurrencia_mask')
+        jefe = apps.get_model('auth', 'User').objects.create(username='jefe')
+        familia = apps.get_model('myapp', 'Familia').objects.create(nombre='Familia', jefe=jefe, codigo_invitacion='ABCDEFGH')
+        TareaAntigua = apps.get_model('myapp', 'Tarea')
+        antigua = TareaAntigua.objects.create(nombre='Barrer', familia=familia, dias_recurrencia_csv='LUN,MAR,MIE', dias_recurrencia_mask=7)
+        TareaAntigua.objects.create(nombre='Barrer', familia=familia, dias_recurrencia_csv='LUN', dias_recurrencia_mask=1)
+        instancias = {
+            dia: TareaAntigua.objects.create(
+                nombre=f'Barrer ({dia})', familia=familia, tipo='instancia', dias_recurrencia_mask=DIA_BITS[dia],
+            ).id
+            for dia in ('LUN', 'MAR', 'MIE')
+        }
+        huerfana = TareaAntigua.objects.create(nombre='Cocinar (MAR)', familia=familia, tipo='instancia', dias_recurrencia_mask=2)
+        martes = timezone.make_aware(datetime(2026, 10, 13, 12))
+        TareaAntigua.objects.filter(tipo='instancia').update(fecha_creacion=martes)
+        TareaAntigua.objects.filter(id=antigua.id).update(fecha_creacion=martes - timedelta(days=30))
+
+        TareaNueva = self.migrar('0018_tarea_plantilla_fecha_programada').get_model('myapp', 'Tarea')
+        self.assertEqual(
+            {dia: TareaNueva.objects.values_list('fecha_programada', 'plantilla_id').get(id=tarea_id) for dia, tarea_id in instancias.items()},
+            {
+                'LUN': (date(2026, 10, 19), antigua.id), # El próximo lunes
+                'MAR': (date(2026, 10, 13), antigua.id), # El mismo día de su creación
+                'MIE': (date(2026, 10, 14), antigua.id),
+            },
+        )
+        self.assertEqual(TareaNueva.objects.values_list('fecha_programada', 'plantilla_id').get(id=huerfana.id), (date(2026, 10, 13), None))
+
+
+class CargasTests(TestCase):
+    """Los contadores de carga pendiente coinciden con Tarea (conciliar) tras cada escritura."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jefe = User.objects.create_user('jefe', password='clave')
+        cls.familia = Familia.objects.create(nombre='Familia', jefe=cls.jefe)
+        cls.familia.miembros.add(cls.jefe)
+
+    def setUp(self):
+        self.client.force_login(self.jefe)
+        self.instancia = Tarea.objects.create(
+            nombre='Barrer (LUN)', familia=self.familia, tipo=Tarea.INSTANCIA, responsable=self.jefe,
+            dias_recurrencia_mask=DIA_BITS['LUN'], tiempo_requerido_minutos=30,
+        )
+        cargas.sumar([self.instancia])
+
+    def contador(self):
+        return CargaPendiente.objects.filter(familia=self.familia, usuario=self.jefe).values_list(
+            'pendientes', 'minutos_pendientes'
+        ).first()
+
+    def test_completar_editar_y_eliminar(self):
+        self.client.post(reverse('completar_tarea', args=[self.instancia.id]))
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (0, 0)))
+        self.client.post(reverse('completar_tarea', args=[self.instancia.id])) # Vuelve a pendiente
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (1, 30)))
+
+        self.client.post(reverse('editar_tarea', args=[self.instancia.id]), {
+            'nombre': 'Barrer (LUN)', 'familia': self.familia.id, 'estado': 'pendiente', 'tiempo_requerido_minutos': 45,
+        })
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (1, 45)))
+
+        self.client.post(reverse('eliminar_tarea', args=[self.instancia.id]))
+        self.assertFalse(Tarea.objects.filter(id=self.instancia.id).exists())
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (0, 0)))
+
+    def test_api_y_lotes(self):
+        url = reverse('tarea-detail', args=[self.instancia.id])
+        self.client.patch(url, {'tiempo_requerido_minutos': 20}, content_type='application/json')
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (1, 20)))
+        self.client.post(reverse('tarea-completar-lote'), {'ids': [self.instancia.id]}, content_type='application/json')
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (0, 0)))
+        self.client.post(
+            reverse('tarea-completar-lote'), {'ids': [self.instancia.id], 'estado': 'pendiente'}, content_type='application/json'
+        )
+        self.client.delete(url)
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (0, 0)))
+
+    def test_el_aporte_anterior_sale_de_la_fila_actual(self):
+        # Otra petición completa la tarea después de que la vista la leyó y antes de que escriba:
+        # con el aporte de la lectura vieja se descontaría dos veces (y se perdería al deshacerlo)
+        leer = views.get_object_or_404
+
+        def leer_y_completar_en_otra_peticion(*args, **kwargs):
+            tarea = leer(*args, **kwargs)
+            lotes.completar([tarea.id], 'hecha', Membresia(self.jefe))
+            return tarea
+
+        with mock.patch.object(views, 'get_object_or_404', leer_y_completar_en_otra_peticion):
+            self.client.post(reverse('completar_tarea', args=[self.instancia.id]))
+        self.instancia.refresh_from_db()
+        self.assertEqual(self.instancia.estado, 'pendiente') # Se deshizo lo que hizo la otra petición
+        self.assertEqual((cargas.conciliar(), self.contador()), ([], (1, 30)))
+
+
+class RepartirFamiliasTests(TestCase):
+    """'manage.py repartir_familias': las familias con miembros en común no se reparten en paralelo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='clave')
+        cls.carla = User.objects.create_user('carla', password='clave')
+        cls.casa = Familia.objects.create(nombre='Casa', jefe=cls.ana)
+        cls.playa = Familia.objects.create(nombre='Playa', jefe=User.objects.create_user('beto'))
+        cls.otra = Familia.objects.create(nombre='Otra', jefe=cls.carla)
+        cls.casa.miembros.add(cls.ana)
+        cls.playa.miembros.add(cls.ana) # ana está en dos familias
+        cls.otra.miembros.add(cls.carla)
+        for usuario in (cls.ana, cls.carla):
+            Horario.objects.create(usuario=usuario, dia='LUN', hora_inicio=time(8), hora_termino=time(9))
+        for familia in (cls.casa, cls.playa, cls.otra):
+            Tarea.objects.create(nombre='Barrer', familia=familia, dias_recurrencia_csv='LUN', tiempo_requerido_minutos=60)
+
+    def test_un_proceso(self):
+        salida = io.StringIO()
+        call_command('repartir_familias', '--procesos', '1', stdout=salida)
+        self.assertIn('3 familias repartidas, 0 con error, 2 instancias creadas, 1 (tarea, día) sin miembro', salida.getvalue())
+        # La única hora de ana se ocupa una sola vez, en una de sus dos familias
+        self.assertEqual(Tarea.objects.instancias().filter(responsable=self.ana).count(), 1)
+        self.assertEqual(Tarea.objects.instancias().filter(responsable=self.carla).count(), 1)
+        self.assertEqual(cargas.conciliar(), [])
+
+    def test_familias_con_miembros_comunes_van_en_el_mismo_bloque(self):
+        grupos = agrupar_por_miembros([self.casa.id, self.playa.id, self.otra.id])
+        self.assertEqual(grupos, [[self.casa.id, self.playa.id], [self.otra.id]])
+        self.assertEqual(armar_bloques(grupos, 1), [[self.casa.id, self.playa.id], [self.otra.id]])
+        self.assertEqual(armar_bloques(grupos, 5), [[self.casa.id, self.playa.id, self.otra.id]])
+
+
+class MembresiaTests(TestCase):
+    def setUp(self):
+        self.jefe = User.objects.create_user('jefe')
+        self.casa = Familia.objects.create(nombre='Casa', jefe=self.jefe)
+        self.casa.miembros.add(self.jefe)
+        self.playa = Familia.objects.create(nombre='Playa', jefe=User.objects.create_user('otro'))
+
+    def peticion(self):
+        request = RequestFactory().get('/')
+        request.user = self.jefe
+        MembresiaMiddleware(lambda request: None)(request)
+        return request
+
+    def test_una_consulta_por_peticion(self):
+        request = self.peticion()
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertEqual(request.membresia.familias, [self.casa])
+                self.assertEqual(request.membresia.ids, [self.casa.id])
+                self.assertTrue(request.membresia.es_jefe)
+                self.assertEqual(request.membresia.familia, self.casa)
+                self.assertFalse(request.membresia.pertenece_a(self.playa.id))
+
+    def test_olvidar_tras_unirse(self):
+        request = self.peticion()
+        self.assertEqual(request.membresia.familias, [self.casa])
+        self.playa.miembros.add(self.jefe)
+        request.membresia.olvidar()
+        with self.assertNumQueries(1):
+            self.assertEqual(request.membresia.familias_miembro, [self.playa])
+            self.assertTrue(request.membresia.pertenece_a(self.playa.id))
+
+    def test_unirse_familia_olvida_la_membresia(self):
+        self.client.force_login(self.jefe)
+        with mock.patch.object(Membresia, 'olvidar', autospec=True, side_effect=Membresia.olvidar) as olvidar:
+            self.client.post(reverse('unirse_familia'), {'codigo': self.playa.codigo_invitacion})
+        self.assertTrue(self.playa.miembros.filter(id=self.jefe.id).exists())
+        olvidar.assert_called_once()
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class ConteoDeConsultasTests(TestCase):
+    """La cantidad de consultas no crece con los miembros ni con las tareas."""
+
+    def familia_con(self, nombre, miembros, plantillas):
+        usuarios = [User.objects.create_user(f'{nombre}{numero}') for numero in range(miembros)]
+        familia = Familia.objects.create(nombre=nombre, jefe=usuarios[0])
+        familia.miembros.add(*usuarios)
+        for usuario in usuarios:
+            for dia in ('LUN', 'MIE'):
+                Horario.objects.create(usuario=usuario, dia=dia, hora_inicio=time(8), hora_termino=time(12))
+        for numero in range(plantillas):
+            Tarea.objects.create(
+                nombre=f'Tarea {numero}', familia=familia, dias_recurrencia_csv='LUN,MIE', tiempo_requerido_minutos=30,
+            )
+        return familia
+
+    def consultas(self, accion):
+        with CaptureQueriesContext(connection) as contexto:
+            accion()
+        return len(contexto)
+
+    def test_planificar_reparto(self):
+        chica = self.familia_con('chica', miembros=1, plantillas=1)
+        grande = self.familia_con('grande', miembros=8, plantillas=12)
+        for modo in (MODO_VORAZ, MODO_OPTIMO):
+            with self.subTest(modo=modo):
+                with self.assertNumQueries(self.consultas(lambda: planificar_reparto(chica, modo))):
+                    plan = planificar_reparto(grande, modo)
+                self.assertEqual(len(plan['instancias']), 24)
+
+    def test_registro_de_carga(self):
+        chica = self.familia_con('chica', miembros=1, plantillas=1)
+        grande = self.familia_con('grande', miembros=8, plantillas=12)
+        ejecutar_reparto(chica)
+        ejecutar_reparto(grande) # Cada miembro ya tiene instancias pendientes
+        miembros = list(grande.miembros.all())
+        with self.assertNumQueries(1):
+            carga = cargar_carga_pendiente(miembros)
+        self.assertEqual(sum(carga.values()), 24)
+        with self.assertNumQueries(self.consultas(lambda: planificar_reparto(chica))):
+            plan = planificar_reparto(grande)
+        # Lo asignado en la misma corrida también cuenta: el reparto sigue parejo (3 cada uno)
+        self.assertEqual(set(Counter(instancia.responsable_id for instancia in plan['instancias']).values()), {3})
+
+    @override_settings(TAREAS_POR_PAGINA=5)
+    def test_paginas_de_tareas_y_perfil(self):
+        chica = self.familia_con('chica', miembros=1, plantillas=1)
+        grande = self.familia_con('grande', miembros=8, plantillas=12)
+        ejecutar_reparto(chica)
+        ejecutar_reparto(grande) # 12 plantillas y 24 instancias con responsable
+
+        def pagina(jefe, nombre, parametros=''):
+            cliente = Client()
+            cliente.force_login(jefe) # La sesión se crea fuera de la cuenta
+            def pedir():
+                cache.clear() # Sin fragmentos guardados: se arma toda la página
+                self.assertEqual(cliente.get(reverse(nombre) + parametros).status_code, 200)
+            return pedir
+
+        for nombre in ('tareas', 'perfil'):
+            with self.subTest(pagina=nombre):
+                esperadas = self.consultas(pagina(chica.jefe, nombre))
+                pedir = pagina(grande.jefe, nombre)
+                with self.assertNumQueries(esperadas):
+                    pedir()
+
+        self.client.force_login(grande.jefe)
+        siguiente = self.client.get(reverse('tareas')).context['pagina_siguiente']
+        self.assertIsNotNone(siguiente)
+        pedir = pagina(grande.jefe, 'tareas', siguiente)
+        with self.assertNumQueries(self.consultas(pagina(grande.jefe, 'tareas'))):
+            pedir()
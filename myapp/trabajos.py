@@ -0,0 +1,121 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import TrabajoReparto
+from .reparto import ejecutar_reparto
+
+#🚨 COLA DE TRABAJOS DE REPARTO (en la DB, sin broker externo) 🚨
+# La vista solo encola; el worker 'manage.py procesar_trabajos_reparto' los ejecuta.
+# El worker marca un 'latido' al reclamar el trabajo y en cada etapa. Si un worker muere, su
+# trabajo queda 'en_curso' sin latidos: pasado TIEMPO_MAXIMO vuelve a la cola (la transacción
+# del reparto se deshizo con la conexión, no quedan instancias a medias) o, tras MAXIMO_INTENTOS,
+# se da por fallido. TIEMPO_MAXIMO debe ser mayor que el reparto más largo: durante el cálculo
+# y el guardado (una transacción) no hay latidos.
+
+TIEMPO_MAXIMO_POR_DEFECTO = 900 # Segundos sin latido para considerar muerto al worker
+MAXIMO_INTENTOS = 3
+
+def encolar_reparto(familia, usuario, modo):
+    """Crea un trabajo de reparto 'en_cola' y lo devuelve (no ejecuta nada)."""
+    return TrabajoReparto.objects.create(familia=familia, solicitado_por=usuario, modo=modo)
+
+def liberar_trabajos_colgados():
+    """Devuelve a la cola los trabajos 'en_curso' sin latido reciente (o los da por fallidos). Devuelve cuántos."""
+    ahora = timezone.now()
+    limite = ahora - timedelta(seconds=getattr(settings, 'REPARTO_TIEMPO_MAXIMO', TIEMPO_MAXIMO_POR_DEFECTO))
+    # Los trabajos anteriores al latido no tienen uno: cuenta la fecha de inicio
+    colgados = TrabajoReparto.objects.filter(
+        Q(latido__lt=limite) | Q(latido__isnull=True, fecha_inicio__lt=limite), estado='en_curso'
+    )
+    fallidos = colgados.filter(intentos__gte=MAXIMO_INTENTOS).update(
+        estado='fallido',
+        error=f"El worker dejó de responder {MAXIMO_INTENTOS} veces: el trabajo no se reintentará.",
+        fecha_termino=ahora,
+    )
+    reencolados = colgados.update(estado='en_cola', progreso=0, etapa='Reintento (el worker anterior dejó de responder)')
+    return fallidos + reencolados
+
+def tomar_siguiente_trabajo():
+    """
+    Reclama el trabajo en cola más antiguo (antes libera los colgados). El UPDATE condicionado
+    a estado='en_cola' evita que dos workers tomen el mismo trabajo. Devuelve None si la cola está vacía.
+    """
+    liberar_trabajos_colgados()
+    while True:
+        trabajo = TrabajoReparto.objects.filter(estado='en_cola').order_by('fecha_creacion', 'id').first()
+        if trabajo is None:
+            return None
+
+        ahora = timezone.now()
+        reclamado = TrabajoReparto.objects.filter(id=trabajo.id, estado='en_cola').update(
+            estado='en_curso',
+            fecha_inicio=ahora,
+            etapa='Iniciando',
+            latido=ahora,
+            intentos=F('intentos') + 1,
+        )
+        if reclamado:
+            trabajo.estado = 'en_curso'
+            trabajo.fecha_inicio = ahora
+            return trabajo
+        # Otro worker lo tomó primero: probamos con el siguiente
+
+def procesar_trabajo(trabajo):
+    """Ejecuta un trabajo ya reclamado y guarda su resultado (o el error)."""
+
+    def actualizar_progreso(porcentaje, etapa):
+        # Cada etapa también es un latido (se escribe fuera de la transacción del guardado)
+        TrabajoReparto.objects.filter(id=trabajo.id).update(progreso=porcentaje, etapa=etapa, latido=timezone.now())
+
+    try:
+        resultado = ejecutar_reparto(trabajo.familia, modo=trabajo.modo, progreso=actualizar_progreso)
+    except Exception as error:
+        trabajo.estado = 'fallido'
+        trabajo.error = str(error)
+        trabajo.fecha_termino = timezone.now()
+        trabajo.save(update_fields=['estado', 'error', 'fecha_termino'])
+        raise
+
+    fallos = list(resultado['fallos'])
+    if not resultado['miembros']:
+        fallos.append("No hay miembros en esta familia para asignar tareas.")
+    elif not resultado['plantillas']:
+        fallos.append("No hay tareas recurrentes pendientes que repartir.")
+
+    trabajo.estado = 'completado'
+    trabajo.progreso = 100
+    trabajo.etapa = 'Terminado'
+    trabajo.modo = resultado['modo']
+    trabajo.asignaciones = resultado['asignaciones']
+    trabajo.lotes = resultado['lotes']
+    trabajo.fallos = fallos
+    trabajo.fecha_termino = timezone.now()
+    trabajo.save(update_fields=['estado', 'progreso', 'etapa', 'modo', 'asignaciones', 'lotes', 'fallos', 'fecha_termino'])
+    return trabajo
+
+def estado_trabajo(trabajo):
+    """Resumen serializable del trabajo (progreso y tiempos) para el endpoint de estado."""
+    ahora = timezone.now()
+    espera = ((trabajo.fecha_inicio or ahora) - trabajo.fecha_creacion).total_seconds()
+    duracion = None
+    if trabajo.fecha_inicio:
+        duracion = ((trabajo.fecha_termino or ahora) - trabajo.fecha_inicio).total_seconds()
+
+    return {
+        'id': trabajo.id,
+        'familia': trabajo.familia_id,
+        'modo': trabajo.modo,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'etapa': trabajo.etapa,
+        'asignaciones': trabajo.asignaciones,
+        'lotes': trabajo.lotes,
+        'fallos': trabajo.fallos,
+        'error': trabajo.error,
+        'fecha_creacion': trabajo.fecha_creacion.isoformat(),
+        'fecha_inicio': trabajo.fecha_inicio.isoformat() if trabajo.fecha_inicio else None,
+        'fecha_termino': trabajo.fecha_termino.isoformat() if trabajo.fecha_termino else None,
+        'segundos_en_cola': round(espera, 3),
+        'segundos_ejecucion': round(duracion, 3) if duracion is not None else None,
+    }
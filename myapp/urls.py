@@ -9,6 +9,7 @@ router.register(r'tareas', views.TareaViewSet, basename='tarea')
 urlpatterns = [
     path('', views.inicio, name='inicio'),
     path('perfil/', views.perfil, name='perfil'),
+    path('perfil/eventos/', views.eventos_calendario, name='eventos_calendario'),
     path('tareas/', views.tareas, name='tareas'),
     path('tareas/<int:id>/completar/', views.completar_tarea, name='completar_tarea'),
     path('tareas/editar/<int:tarea_id>/', views.editar_tarea, name='editar_tarea'),
@@ -16,6 +17,7 @@ urlpatterns = [
     path('familia/crear/', views.crear_familia, name='crear_familia'),
     path('familia/invitar/', views.invitar_miembro, name='invitar_miembro'),
     path('familia/unirse/', views.unirse_familia, name='unirse_familia'),
+    path('api/sync/', views.sincronizar, name='api_sync'),
     path('api/', include(router.urls)),
     path('registro/', views.registro, name='registro'),
     path('login/', views.login_view, name='login'),
@@ -29,5 +31,9 @@ urlpatterns = [
     path('horario/editar/<int:horario_id>/', views.editar_horario, name='editar_horario'),
     path('horario/eliminar/<int:horario_id>/', views.eliminar_horario, name='eliminar_horario'),
     path('tareas/repartir/<int:familia_id>/', views.repartir_tareas, name='repartir_tareas'),
+    path('tareas/repartir/<int:familia_id>/plan/', views.plan_reparto, name='plan_reparto'),
+    path('tareas/repartir/trabajo/<int:trabajo_id>/', views.estado_reparto, name='estado_reparto'),
+    path('tareas/repartir/trabajo/<int:trabajo_id>/estado/', views.estado_reparto_json, name='estado_reparto_json'),
     path('familia/limpiar-tareas/<int:familia_id>/', views.limpiar_instancias_tareas, name='limpiar_instancias_tareas'),
+    path('familia/<int:familia_id>/exportar/', views.exportar_tareas, name='exportar_tareas'),
 ]
@@ -1,14 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from urllib.parse import urlencode
+from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout
 from rest_framework import viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 import json # Necesario para serializar datos a JavaScript
-from .models import Tarea, Familia, Horario, Perfil
+from .models import Tarea, Familia, Horario, Perfil, TrabajoReparto, DisponibilidadDiaria, DIA_BITS, DIAS_SEMANA_CHOICES
 from .forms import HorarioForm, RegistroForm, PerfilForm, UserEditForm, TareaForm
 from .serializers import TareaSerializer
+from .reparto import planificar_reparto, reasignar_por_cambio_horario, plan_a_dict, MODO_VORAZ, MODOS_REPARTO
+from .trabajos import encolar_reparto, estado_trabajo
+from . import cargas, lotes, exportacion, sincronizacion
+from .membresia import membresia_de
+from .paginacion import pagina_por_clave, decodificar_cursor, TAREAS_POR_PAGINA_POR_DEFECTO, TareasCursorPagination
+from .cache_fragmentos import clave_fragmento, obtener_o_construir, secreto_csrf, invalidar_familias
+from .condicional import condicional, responder, validadores_tareas, validadores_perfil, validadores_ver_horario, validadores_api_tareas
 from itertools import chain, cycle 
 from django.db import transaction 
 from django.db.models import Sum, Count, Q, F, ExpressionWrapper, fields 
@@ -19,103 +36,104 @@ from datetime import timedelta, date, datetime
 
 def inicio(request):
     #Vista de inicio: muestra la familia del usuario si existe.
-    familia = None
-    if request.user.is_authenticated:
-        familia = (Familia.objects.filter(jefe=request.user).first() or 
-                   Familia.objects.filter(miembros=request.user).first())
+    familia = request.membresia.familia # None si no tiene familia (o no inició sesión)
     return render(request, 'inicio.html', {'familia': familia})
 
 #perfil y familias
 
-    # Mapeo de códigos de día a números de weekday de Python (Lunes=0, Domingo=6)
-DAY_MAPPING = {
-    'LU': 0, 'MA': 1, 'MI': 2, 'JU': 3, 'VI': 4, 'SA': 5, 'DO': 6, 
-    'LUN': 0, 'MAR': 1, 'MIE': 2, 'JUE': 3, 'VIE': 4, 'SAB': 5, 'DOM': 6
-}
-DAY_CODES = list(DAY_MAPPING.keys())
+# Rango máximo (en días) que acepta eventos_calendario: la vista de mes de FullCalendar pide 6 semanas
+VENTANA_MAXIMA_DIAS = 93
+
+def evento_de_tarea(t):
+    # Instancia -> evento de FullCalendar (title, start/end). Sin franja, es un evento de día completo.
+    titulo_con_responsable = f"{t.nombre} — Resp: {t.responsable.username}" if t.responsable else f"{t.nombre} (Sin Asignar)"
+    evento = {
+        'id': t.id,
+        'title': titulo_con_responsable,
+        'start': t.fecha_programada.isoformat(),
+        'responsable': t.responsable.username if t.responsable else 'Sin asignar',
+        'tiempo_requerido_minutos': t.tiempo_requerido_minutos,
+        'allDay': True,
+    }
+    # Si el reparto le asignó una franja, el evento se muestra en ese horario
+    if t.hora_inicio and t.hora_termino:
+        evento['start'] = f"{t.fecha_programada.isoformat()}T{t.hora_inicio.isoformat()}"
+        evento['end'] = f"{t.fecha_programada.isoformat()}T{t.hora_termino.isoformat()}"
+        evento['allDay'] = False
+    return evento
+
+@login_required
+def eventos_calendario(request):
+    """
+    Fuente de eventos del calendario del perfil. FullCalendar envía el rango visible en
+    ?start=...&end=... (ISO 8601) y solo se devuelven las instancias pendientes con
+    fecha_programada en [start, end) de las familias del usuario (consulta por índice).
+    """
+    try:
+        inicio = date.fromisoformat(request.GET['start'][:10])
+        fin = date.fromisoformat(request.GET['end'][:10])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Parámetros 'start' y 'end' requeridos en formato AAAA-MM-DD."}, status=400)
+    if fin <= inicio or (fin - inicio).days > VENTANA_MAXIMA_DIAS:
+        return JsonResponse({'error': f"El rango debe ser positivo y de hasta {VENTANA_MAXIMA_DIAS} días."}, status=400)
+
+    familia_ids = request.membresia.ids
+
+    def construir_eventos():
+        tareas_qs = Tarea.objects.instancias().filter( # 🛡️ Debe ser instancia (no plantilla)
+            familia_id__in=familia_ids,
+            estado='pendiente',
+            responsable__isnull=False, # 🛡️ Debe tener responsable (solo asignaciones)
+            fecha_programada__gte=inicio,
+            fecha_programada__lt=fin,
+        ).select_related('responsable').order_by('fecha_programada', 'hora_inicio', 'id')
+        return [evento_de_tarea(t) for t in tareas_qs]
+
+    # Los eventos solo dependen de las familias y del rango: los miembros de una familia comparten el fragmento
+    eventos = obtener_o_construir(clave_fragmento('eventos_calendario', familia_ids, inicio, fin), construir_eventos)
+    return JsonResponse(eventos, safe=False)
 
 @login_required
+@condicional(validadores_perfil) # 304 si nada de lo que muestra cambió (ver condicional.py)
 def perfil(request):
     #muestra la información del usuario, su familia, horarios y tareas.
     usuario = request.user
 
-    # Obtener todas las familias a las que el usuario pertenece
-    familias_jefe = Familia.objects.filter(jefe=usuario)
-    familias_miembro = Familia.objects.filter(miembros=usuario).exclude(jefe=usuario)
-    familias_a_consultar = list(chain(familias_jefe, familias_miembro))
+    # Obtener todas las familias a las que el usuario pertenece (resueltas una vez por petición)
+    membresia = request.membresia
+    familias_a_consultar = membresia.familias
 
     #si el usuario no tiene familia, lo redirige a crear una
     if not familias_a_consultar:
         return redirect('crear_familia')
     
     # Establecer el contexto principal (para la cabecera, formularios)
-    familia = familias_jefe.first() if familias_jefe.exists() else familias_miembro.first()
-    es_jefe = familias_jefe.exists()
+    familia = membresia.familia
+    es_jefe = membresia.es_jefe
 
-    #obtener horarios disponibles del usuario
+    #obtener horarios disponibles del usuario (la tabla de bloques editables)
     horarios_disponibles = Horario.objects.filter(usuario=usuario, disponible=True)
-    disponibilidad_data = {}
-
-    for h in horarios_disponibles:
-        dia_semana = h.dia
-        if dia_semana not in disponibilidad_data:
-            disponibilidad_data[dia_semana] = []
-        disponibilidad_data[dia_semana].append({
-            'inicio': str(h.hora_inicio),
-            'termino': str(h.hora_termino),
-        })
 
-    # TAREAS PENDIENTES PARA EL CALENDARIO (¡CORREGIDO!)
-    tareas_pendientes_data = []
-    
-    # 🚨 FILTRO CORREGIDO: Muestra solo las instancias generadas y asignadas al usuario.
-    tareas_qs = Tarea.objects.filter(
-        familia__in=familias_a_consultar,
-        estado='pendiente',
-        responsable__isnull=False, # 🛡️ Debe tener responsable (solo asignaciones)
-    ).filter(
-        # 🛡️ Debe ser instancia (sin recurrencia)
-        Q(dias_recurrencia_csv__isnull=True) | Q(dias_recurrencia_csv__exact='') 
-    ).select_related('responsable')
-    
-    # Adaptamos la data al formato de calendario (title, start)
-    for t in tareas_qs:
-        
-        # 1. Buscar el día de la semana en el nombre de la tarea (ej. "LU")
-        dia_encontrado = None
-        for code in DAY_CODES:
-            if f"({code})" in t.nombre.upper() or t.nombre.upper().endswith(f"({code})"):
-                dia_encontrado = code
-                break
-                
-        
-        # 2. Inicializar la fecha de inicio del evento
-        fecha_inicio_evento = t.fecha_creacion.date()
-        
-        if dia_encontrado:
-            # 3. Calcular la fecha correcta: Próximo día de la semana, a partir de la fecha de creación
-            target_weekday = DAY_MAPPING[dia_encontrado]
-            current_weekday = t.fecha_creacion.date().weekday() # Lunes=0, Domingo=6
-            
-            # Calcular cuántos días hay que avanzar
-            days_to_advance = (target_weekday - current_weekday + 7) % 7
-            
-            fecha_inicio_evento = t.fecha_creacion.date() + timedelta(days=days_to_advance)
-        #Crear el objeto de datos con la fecha calculada y el responsable
-        titulo_con_responsable = f"{t.nombre} — Resp: {t.responsable.username}" if t.responsable else f"{t.nombre} (Sin Asignar)"
-
-        # 4. Crear el objeto de datos con la fecha calculada
-        tareas_pendientes_data.append({
-            'id': t.id,
-            'title': titulo_con_responsable, 
-            'start': fecha_inicio_evento.isoformat(), # 🚨 Usa la fecha CALCULADA
-            'responsable': t.responsable.username if t.responsable else 'Sin asignar', 
-            'tiempo_requerido_minutos': t.tiempo_requerido_minutos,
-            'allDay': True,
-        })
-        
-    #si pertenece a una familia, obtener sus miembros (sin el usuario actual)
-    miembros = familia.miembros.exclude(id=usuario.id) if familia else None
+    #disponibilidad para el calendario: resumen precalculado (una fila por día, bloques ya fusionados)
+    def construir_disponibilidad():
+        disponibilidad_data = {}
+
+        for resumen in DisponibilidadDiaria.objects.filter(usuario=usuario):
+            disponibilidad_data[resumen.dia] = [
+                {'inicio': str(inicio), 'termino': str(termino)}
+                for inicio, termino in resumen.franjas()
+            ]
+        return disponibilidad_data
+
+    # Un cambio de horario sube la versión de todas las familias del usuario
+    disponibilidad_data = obtener_o_construir(
+        clave_fragmento('disponibilidad', membresia.ids, usuario.id), construir_disponibilidad
+    )
+
+    # Las TAREAS del calendario ya no van en la página: el calendario las pide por rango a eventos_calendario
+
+    #si pertenece a una familia, obtener sus miembros (sin el usuario actual), con su perfil (edad) en el mismo JOIN
+    miembros = familia.miembros.exclude(id=usuario.id).select_related('perfil') if familia else None
 
     #manejo del perfil con fecha de nacimiento
     perfil, creado = Perfil.objects.get_or_create(usuario=usuario)
@@ -136,7 +154,6 @@ def perfil(request):
         'miembros': miembros,
         'horarios_disponibles': horarios_disponibles,
         'disponibilidad_json': json.dumps(disponibilidad_data),
-        'tareas_json': json.dumps(tareas_pendientes_data), 
         'form': form,
         'perfil': perfil,
     }
@@ -145,39 +162,83 @@ def perfil(request):
 
 #gestión de tareas
 @login_required
+@condicional(validadores_tareas)
 def tareas(request):
     usuario = request.user
     
+    membresia = request.membresia
+
     # 1. Obtiene TODAS las familias donde el usuario es jefe
-    familias_jefe = Familia.objects.filter(jefe=usuario)
-    es_jefe = familias_jefe.exists()
+    familias_jefe = membresia.familias_jefe
+    es_jefe = membresia.es_jefe
     
     # 2. Obtiene TODAS las familias donde el usuario es miembro (excluyendo donde ya es jefe)
-    familias_miembro = Familia.objects.filter(miembros=usuario).exclude(jefe=usuario)
+    familias_miembro = membresia.familias_miembro
     
     # 3. Determinar el QuerySet de Tareas
-    familias_a_consultar = list(chain(familias_jefe, familias_miembro))
+    familias_a_consultar = membresia.familias
     
     if not familias_a_consultar:
         return render(request, 'tareas.html', {
-            'tareas': [],
+            'lista_tareas': render_to_string('tareas_lista.html', {'tareas': []}, request=request),
             'mensaje': "No perteneces a ninguna familia. Crea o únete a una para ver tareas.",
             'form': TareaForm() 
         })
 
-    # Consulta unificada: TAREAS ORIGINALES (PLANTILLAS) para la LISTA
-    # 🚨 FILTRO CORREGIDO: Solo muestra las plantillas base (con recurrencia definida)
-    tareas = Tarea.objects.filter(
+    # Consulta unificada: tareas pendientes de sus familias, con responsable y familia en el mismo JOIN
+    tareas_qs = Tarea.objects.filter(
         familia__in=familias_a_consultar,
         estado='pendiente' # Solo queremos ver las tareas que requieren acción
-    ).order_by('-fecha_creacion')
+    ).select_related('responsable', 'familia')
+
+    # Filtros opcionales (?familia=ID&responsable=ID&dia=LUN)
+    filtros = {}
+    familia_filtro = request.GET.get('familia', '')
+    if familia_filtro.isdecimal() and membresia.pertenece_a(int(familia_filtro)):
+        tareas_qs = tareas_qs.filter(familia_id=int(familia_filtro))
+        filtros['familia'] = familia_filtro
+    responsable_filtro = request.GET.get('responsable', '')
+    if responsable_filtro.isdecimal():
+        tareas_qs = tareas_qs.filter(responsable_id=int(responsable_filtro))
+        filtros['responsable'] = responsable_filtro
+    dia_filtro = request.GET.get('dia', '').upper()
+    if dia_filtro in DIA_BITS:
+        tareas_qs = tareas_qs.del_dia(dia_filtro)
+        filtros['dia'] = dia_filtro
+
+    # Página por clave (fecha_creacion, id): número fijo de consultas sin importar cuántas tareas haya
+    cursor = decodificar_cursor(request.GET.get('despues'))
+    tamano = getattr(settings, 'TAREAS_POR_PAGINA', TAREAS_POR_PAGINA_POR_DEFECTO)
+
+    def construir_lista():
+        # Solo se ejecuta si el fragmento no está en la caché
+        tareas, siguiente = pagina_por_clave(tareas_qs, cursor, tamano)
+        return render_to_string('tareas_lista.html', {
+            'tareas': tareas,
+            'es_jefe': es_jefe,
+            'pagina_siguiente': '?' + urlencode({**filtros, 'despues': siguiente}) if siguiente else None,
+            'primera_pagina': '?' + urlencode(filtros) if cursor else None,
+        }, request=request)
+
+    # El fragmento depende de las familias (versión), de la página y filtros, de si es jefe (botones)
+    # y del secreto CSRF del usuario (cada fila lleva un formulario con {% csrf_token %})
+    clave_lista = clave_fragmento(
+        'tareas_lista', membresia.ids,
+        usuario.id, es_jefe, secreto_csrf(request), sorted(filtros.items()), cursor, tamano,
+    )
 
     # 4. Preparar contexto para la plantilla
     contexto = {
-        'tareas': tareas,
+        'filtros': filtros,
+        'familias_usuario': familias_a_consultar,
+        'responsables': User.objects.filter( # Miembros y jefes de sus familias (para el filtro)
+            Q(id__in=Familia.miembros.through.objects.filter(familia__in=familias_a_consultar).values('user_id'))
+            | Q(id__in=[familia.jefe_id for familia in familias_a_consultar])
+        ).order_by('username'),
+        'dias_semana': DIAS_SEMANA_CHOICES,
         'es_jefe': es_jefe, # Es jefe en al menos una familia
         'familias_jefe': familias_jefe,
-        'es_jefe_multi': familias_jefe.count() > 1,
+        'es_jefe_multi': len(familias_jefe) > 1,
         'form': TareaForm(user=usuario) if es_jefe else TareaForm(), 
         'miembros_por_familia': {}, 
     }
@@ -191,7 +252,7 @@ def tareas(request):
         if request.method == 'POST':
             
             # Simplificación: La familia se asigna automáticamente (no se pide en POST)
-            familia_seleccionada = familias_jefe.first() 
+            familia_seleccionada = familias_jefe[0] 
             
             form = TareaForm(request.POST, user=usuario) 
             
@@ -205,10 +266,11 @@ def tareas(request):
                 messages.error(request, "Error al crear la tarea. Revisa los campos marcados.")
                 contexto['form'] = form 
     
-    elif not es_jefe and familias_miembro.exists():
+    elif not es_jefe and familias_miembro:
         # Si es SOLO miembro, solo necesita ver las tareas, no crear/editar.
-        contexto['familia_miembro'] = familias_miembro.first()
+        contexto['familia_miembro'] = familias_miembro[0]
 
+    contexto['lista_tareas'] = mark_safe(obtener_o_construir(clave_lista, construir_lista))
     return render(request, 'tareas.html', contexto)
 
 @login_required
@@ -216,8 +278,13 @@ def completar_tarea(request, id):
     #cambia el estado de una tarea (pendiente/hecha)
     tarea = get_object_or_404(Tarea, id=id)
     if request.method == "POST":
-        tarea.estado = "hecha" if tarea.estado == "pendiente" else "pendiente"
-        tarea.save()
+        with transaction.atomic():
+            # Se relee bloqueada: el aporte anterior tiene que ser el de la fila que se cambia
+            tarea = Tarea.objects.select_for_update().get(id=tarea.id)
+            aporte_anterior = cargas.aporte(tarea)
+            tarea.estado = "hecha" if tarea.estado == "pendiente" else "pendiente"
+            tarea.save()
+            cargas.registrar_cambios([(aporte_anterior, tarea)])
     return redirect('tareas')
 
 @login_required
@@ -226,15 +293,21 @@ def editar_tarea(request, tarea_id):
     tarea = get_object_or_404(Tarea, id=tarea_id)
 
     # Verificar si el usuario es jefe de la familia de la tarea
-    if not Familia.objects.filter(jefe=request.user, id=tarea.familia.id).exists():
+    if not request.membresia.es_jefe_de(tarea.familia_id):
         messages.error(request, "❌ No tienes permiso para editar esta tarea.")
         return redirect('tareas')
 
     #Manejo del formulario
     if request.method == 'POST':
-        form = TareaForm(request.POST, instance=tarea, user=request.user) 
-        if form.is_valid():
-            form.save()
+        with transaction.atomic():
+            tarea = Tarea.objects.select_for_update().get(id=tarea.id) # Bloqueada hasta registrar el cambio
+            aporte_anterior = cargas.aporte(tarea) # El form modifica 'tarea' al validar
+            form = TareaForm(request.POST, instance=tarea, user=request.user) 
+            guardada = form.is_valid()
+            if guardada:
+                form.save()
+                cargas.registrar_cambios([(aporte_anterior, tarea)])
+        if guardada:
             messages.success(request, f"Tarea '{tarea.nombre}' actualizada correctamente. ✅")
             return redirect('tareas')
         else:
@@ -256,14 +329,17 @@ def eliminar_tarea(request, tarea_id):
     tarea = get_object_or_404(Tarea, id=tarea_id)
 
     # Verificar si el usuario es jefe de la familia de la tarea
-    if not Familia.objects.filter(jefe=request.user, id=tarea.familia.id).exists():
+    if not request.membresia.es_jefe_de(tarea.familia_id):
         messages.error(request, "❌ No tienes permiso para eliminar esta tarea.")
         return redirect('tareas')
 
     # Lógica de eliminación
     if request.method == 'POST':
         nombre_tarea = tarea.nombre
-        tarea.delete()
+        with transaction.atomic():
+            tarea = Tarea.objects.select_for_update().get(id=tarea.id) # Su aporte actual, no el leído antes
+            cargas.restar([tarea])
+            tarea.delete()
         messages.success(request, f"Tarea '{nombre_tarea}' eliminada correctamente. 🗑️")
         return redirect('tareas')
 
@@ -284,7 +360,7 @@ def crear_familia(request):
             return render(request, "crear_familia.html") 
 
         # Restricción principal: Si ya es jefe de una familia, lo detenemos.
-        if Familia.objects.filter(jefe=request.user).exists():
+        if request.membresia.es_jefe:
             messages.warning(request, "Ya eres jefe de una familia y no puedes crear otra.")
             return redirect("perfil")
 
@@ -292,6 +368,7 @@ def crear_familia(request):
         nueva_familia = Familia.objects.create(nombre=nombre, jefe=request.user)
         # Añadir al usuario como miembro de su nueva familia
         nueva_familia.miembros.add(request.user) 
+        request.membresia.olvidar() # Lo memorizado en esta petición ya no incluye la nueva familia
         messages.success(request, f"Familia '{nombre}' creada con éxito 🎉")
         return redirect("perfil")
 
@@ -307,7 +384,7 @@ def invitar_miembro(request):
         if nombre_usuario:
             try:
                 usuario_a_invitar = User.objects.get(username=nombre_usuario)
-                familia = Familia.objects.filter(jefe=request.user).first()
+                familia = request.membresia.familias_jefe[0] if request.membresia.es_jefe else None
                 if not familia:
                     messages.error(request, "No eres jefe de ninguna familia.")
                 else:
@@ -342,12 +419,13 @@ def unirse_familia(request):
             familia = Familia.objects.get(codigo_invitacion=codigo)
             
             # NUEVA RESTRICCIÓN: Chequear si el usuario YA es miembro (incluyendo si es jefe) de ESTA familia.
-            if familia.jefe == request.user or familia.miembros.filter(id=request.user.id).exists():
+            if request.membresia.pertenece_a(familia.id):
                 messages.warning(request, f"Ya perteneces a la familia '{familia.nombre}'.")
                 return redirect("perfil")
             
             # Si pasa la validación, unir al usuario como miembro
             familia.miembros.add(request.user)
+            request.membresia.olvidar()
             messages.success(request, f"Te uniste a la familia '{familia.nombre}' 🎉")
             return redirect("perfil")
             
@@ -376,22 +454,33 @@ def agregar_horario(request):
     return render(request, 'agregar_horario.html', {'form': form})
 
 @login_required
+@condicional(validadores_ver_horario)
 def ver_horario(request):
     #muestra los horarios del usuario autenticado
     usuario = request.user #usuario autenticado
     horarios = Horario.objects.filter(usuario=usuario)
     return render(request, 'ver_horario.html', {'horarios': horarios})
 
+def avisar_reasignacion(request, resumen):
+    # Mensajes del reparto incremental tras un cambio de horario
+    if resumen['reasignadas']:
+        messages.info(request, f"🔄 {resumen['reasignadas']} tarea(s) que ya no caben en tu horario se reasignaron a otros miembros.")
+    for instancia in resumen['sin_candidato']:
+        messages.warning(request, f"⚠️ La tarea '{instancia.nombre}' ya no cabe en tu horario y ningún otro miembro está disponible: quedó sin asignar.")
+
 @login_required
 def editar_horario(request, horario_id):
     #obteiene la instancia del horario, asegurando que solo el dueño pueda editarlo.
     horario_instancia = get_object_or_404(Horario, id=horario_id, usuario=request.user)
     
     if request.method == 'POST':
+        dia_anterior = horario_instancia.dia # El form modifica la instancia al validar
         form = HorarioForm(request.POST, instance=horario_instancia)
         if form.is_valid():
             form.save()
             messages.success(request, "Horario actualizado correctamente. ✅")
+            # Solo el día que perdió (o achicó) el bloque puede dejar instancias sin tiempo
+            avisar_reasignacion(request, reasignar_por_cambio_horario(request.user, dia_anterior))
             #redirige a la página principal de perfil donde se ven los horarios
             return redirect('perfil') 
         else:
@@ -413,6 +502,7 @@ def eliminar_horario(request, horario_id):
     horario = get_object_or_404(Horario, id=horario_id, usuario=request.user)
     horario.delete()
     messages.success(request, "Horario eliminado correctamente.")
+    avisar_reasignacion(request, reasignar_por_cambio_horario(request.user, horario.dia))
     return redirect('ver_horario')
 
 # Autenticación
@@ -451,88 +541,149 @@ def logout_view(request):
 
 # API restful
 class TareaViewSet(viewsets.ModelViewSet):
+    """
+    Tareas de las familias del usuario, paginadas por cursor (?cursor=..., ?tamano=N).
+    Filtros: ?estado=pendiente|hecha, ?responsable=ID, ?familia=ID, ?tipo=plantilla|instancia,
+    ?dia=LUN, ?desde=AAAA-MM-DD y ?hasta=AAAA-MM-DD (sobre fecha_programada).
+    ?fields=id,nombre,... limita tanto la respuesta como las columnas del SELECT.
+    El listado responde ETag/Last-Modified y 304 a If-None-Match si nada cambió (condicional.py).
+    Operaciones en lote (una transacción, un resultado por elemento; ver lotes.py):
+    POST crear-lote/ [{...}, ...], POST actualizar-lote/ [{"id": N, ...}, ...],
+    POST completar-lote/ {"ids": [N, ...], "estado": "hecha"}.
+    """
     serializer_class = TareaSerializer
+    pagination_class = TareasCursorPagination
     
     def get_queryset(self):
         """
         Devuelve solo las tareas que pertenecen a las familias del usuario logueado.
         """
-        user = self.request.user
-        
-        familias_del_usuario = Familia.objects.filter(
-            Q(jefe=user) | Q(miembros=user)
-        ).distinct()
-        
-        # Se añade select_related('responsable') y se filtra
-        return Tarea.objects.filter(familia__in=familias_del_usuario).select_related('responsable')
-
-#funciónes helper
-
-def get_next_weekday(start_date, day_code):
-    """Calcula la fecha del próximo día de la semana a partir de start_date."""
-    # Mapeo de códigos de día a índice de día de la semana (Lunes=0, Domingo=6)
-    day_map = {'LUN': 0, 'MAR': 1, 'MIE': 2, 'JUE': 3, 'VIE': 4, 'SAB': 5, 'DOM': 6}
-    
-    target_weekday = day_map.get(day_code)
-    if target_weekday is None:
-        return None
-    
-    # current_weekday es el día de la semana de start_date (Lunes=0, Domingo=6)
-    current_weekday = start_date.weekday()
-    
-    # Calcular la diferencia de días
-    days_until_target = target_weekday - current_weekday
-    
-    # Si el día objetivo ya pasó o es hoy, se calcula para la próxima semana (+7 días)
-    if days_until_target <= 0:
-        days_until_target += 7
-        
-    return start_date + timedelta(days=days_until_target)
-
-def calcular_capacidad_para_tarea(miembro, tarea, dia_requerido):
-    #Calcula el score de capacidad de un miembro para UNA TAREA ESPECÍFICA, filtrando SOLO por el día requerido (dia_requerido).
+        # Las familias del usuario se resuelven una vez por petición (ver membresia.py)
+        familias_del_usuario = membresia_de(self.request).ids
+
+        # Sin select_related('responsable'): el serializer solo usa responsable_id
+        queryset = Tarea.objects.filter(familia_id__in=familias_del_usuario)
+
+        campos = self.campos_pedidos()
+        if campos is not None and self.request.method == 'GET':
+            # Las columnas de la paginación siempre se leen (el cursor se arma con ellas)
+            queryset = queryset.only(*campos, 'id', 'fecha_creacion')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # GET condicional: con If-None-Match vigente, 304 antes de armar el queryset
+        validadores = validadores_api_tareas(request, membresia_de(request))
+        return responder(request, validadores, lambda: super(TareaViewSet, self).list(request, *args, **kwargs))
+
+    def filter_queryset(self, queryset):
+        parametros = self.request.query_params
+
+        estado = parametros.get('estado')
+        if estado:
+            if estado not in dict(Tarea.ESTADOS):
+                raise ValidationError({'estado': f"Estado inválido: {estado}"})
+            queryset = queryset.filter(estado=estado)
+
+        tipo = parametros.get('tipo')
+        if tipo:
+            if tipo not in dict(Tarea.TIPOS):
+                raise ValidationError({'tipo': f"Tipo inválido: {tipo}"})
+            queryset = queryset.filter(tipo=tipo)
+
+        for parametro in ('familia', 'responsable'):
+            valor = parametros.get(parametro)
+            if valor:
+                if not valor.isdecimal(): # isdigit() acepta "²", que int() rechaza
+                    raise ValidationError({parametro: "Debe ser un ID numérico."})
+                queryset = queryset.filter(**{f'{parametro}_id': int(valor)})
+
+        dia = parametros.get('dia', '').upper()
+        if dia:
+            if dia not in DIA_BITS:
+                raise ValidationError({'dia': f"Día inválido: {dia}"})
+            queryset = queryset.del_dia(dia)
+
+        for parametro, busqueda in (('desde', 'fecha_programada__gte'), ('hasta', 'fecha_programada__lte')):
+            valor = parametros.get(parametro)
+            if valor:
+                try:
+                    queryset = queryset.filter(**{busqueda: date.fromisoformat(valor)})
+                except ValueError:
+                    raise ValidationError({parametro: "Fecha inválida (formato AAAA-MM-DD)."})
+
+        return queryset
+
+    def campos_pedidos(self):
+        # ?fields=id,nombre -> ['id', 'nombre']; None si no se pidió (todos los campos)
+        texto = self.request.query_params.get('fields')
+        if not texto:
+            return None
+        campos = [campo.strip() for campo in texto.split(',') if campo.strip()]
+        desconocidos = set(campos) - set(TareaSerializer().fields) # Antes de usarlos en .only()
+        if desconocidos:
+            raise ValidationError({'fields': f"Campos desconocidos: {', '.join(sorted(desconocidos))}."})
+        return campos
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('campos', self.campos_pedidos())
+        return super().get_serializer(*args, **kwargs)
+
+    # Las escrituras por la API también mantienen los contadores de carga (misma transacción).
+    # La fila se relee bloqueada (SELECT ... FOR UPDATE): su aporte anterior no puede cambiar
+    # entre la lectura y el registro del cambio.
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            cargas.sumar([serializer.save()])
 
-    # 1. Preparación del día requerido (en MAYÚSCULAS)
-    dia_codigo = dia_requerido.upper()
-    
-    # 2. Obtener horarios SOLO para el día requerido
-    # Filtramos directamente en la DB para el día específico
-    horarios_query = Horario.objects.filter(
-        usuario=miembro, 
-        dia=dia_codigo, # Filtro directo
-        disponible=True
-    )
-    
-    if not horarios_query.exists():
-        # Si no hay NINGÚN horario para este día, descalificado.
-        return 0 
-            
-    # 3. Cálculo de Minutos Disponibles en ese día
-    minutos_disponibles_en_dia = 0
-    
-    for horario in horarios_query:
-        # Cálculo de la duración (MEJORADO: Usa timedelta para evitar negativos en cruces de medianoche si es necesario)
-        # Nota: Usaremos el cálculo original si no hay cruce de medianoche en los datos
-        duracion = (horario.hora_termino.hour * 60 + horario.hora_termino.minute) - \
-                   (horario.hora_inicio.hour * 60 + horario.hora_inicio.minute)
-                   
-        minutos_disponibles_en_dia += duracion
-            
-    # 4. Filtro de Tiempo: ¿El tiempo total disponible es menor que el tiempo de la tarea?
-    if minutos_disponibles_en_dia < tarea.tiempo_requerido_minutos:
-        return 0 
-        
-    # 5. Score
-    score_capacidad = minutos_disponibles_en_dia 
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.instance = Tarea.objects.select_for_update().get(pk=serializer.instance.pk)
+            aporte_anterior = cargas.aporte(serializer.instance)
+            cargas.registrar_cambios([(aporte_anterior, serializer.save())])
 
-    return score_capacidad
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance = Tarea.objects.select_for_update().get(pk=instance.pk)
+            cargas.restar([instance])
+            instance.delete()
+
+    @action(detail=False, methods=['post'], url_path='crear-lote')
+    def crear_lote(self, request):
+        elementos = lotes.validar_lista(request.data)
+        return Response(lotes.crear(elementos, membresia_de(request), self.get_serializer_context()))
+
+    @action(detail=False, methods=['post'], url_path='actualizar-lote')
+    def actualizar_lote(self, request):
+        elementos = lotes.validar_lista(request.data)
+        return Response(lotes.actualizar(elementos, membresia_de(request), self.get_serializer_context()))
+
+    @action(detail=False, methods=['post'], url_path='completar-lote')
+    def completar_lote(self, request):
+        datos = request.data if isinstance(request.data, dict) else {}
+        ids = lotes.validar_lista(datos.get('ids'), nombre='ids')
+        estado = datos.get('estado', 'hecha')
+        if estado not in dict(Tarea.ESTADOS):
+            raise ValidationError({'estado': f"Estado inválido: {estado}"})
+        return Response(lotes.completar(ids, estado, membresia_de(request)))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sincronizar(request):
+    """
+    Cambios desde ?since=<cursor> (el 'cursor' de la respuesta anterior; sin él, todo desde cero):
+    tareas de sus familias y horarios propios creados o modificados, ids eliminados y el nuevo cursor.
+    Si 'hay_mas' es true, se vuelve a pedir enseguida con el cursor nuevo. Ver sincronizacion.py.
+    """
+    return Response(sincronizacion.cambios_desde(request.user, membresia_de(request), request.query_params.get('since')))
 
 # VISTA PRINCIPAL: REPARTO DE TAREAS
 @login_required
 def repartir_tareas(request, familia_id):
     """
-    Ejecuta el algoritmo de reparto. Se crea una INSTANCIA ÚNICA por cada día de recurrencia,
-    sin usar fecha_vencimiento para la programación.
+    Encola el algoritmo de reparto. Se crea una INSTANCIA ÚNICA por cada día de recurrencia,
+    sin usar fecha_vencimiento para la programación. La lógica vive en reparto.ejecutar_reparto
+    y la ejecuta el worker de trabajos (ver trabajos.py).
     """
     
     usuario = request.user
@@ -541,109 +692,56 @@ def repartir_tareas(request, familia_id):
     
     if request.method == "POST":
         
-        with transaction.atomic():
-            
-            miembros = list(familia.miembros.all())
-            
-            if not miembros:
-                messages.error(request, "❌ No hay miembros en esta familia para asignar tareas.")
-                return redirect('tareas')
-                
-            # 1. TAREAS ORIGINALES (Plantillas): Las que tienen recurrencia y están pendientes
-            tareas_recurrentes_qs = Tarea.objects.filter(
-                familia=familia, 
-                estado='pendiente' 
-            ).exclude(
-                dias_recurrencia_csv__isnull=True
-            ).exclude(
-                dias_recurrencia_csv__exact=''
-            ).order_by('fecha_creacion')
+        modo = request.POST.get('modo', MODO_VORAZ)
+        if modo not in dict(MODOS_REPARTO):
+            modo = MODO_VORAZ
+
+        # El reparto se ENCOLA y lo ejecuta el worker (manage.py procesar_trabajos_reparto)
+        trabajo = encolar_reparto(familia, usuario, modo)
+        messages.info(request, "⏳ El reparto quedó en cola. Esta página se actualiza sola hasta que termine.")
+        return redirect('estado_reparto', trabajo_id=trabajo.id)
             
-            if not tareas_recurrentes_qs.exists():
-                messages.info(request, "🎉 No hay tareas recurrentes pendientes que repartir.")
-                return redirect('tareas')
+    # Si es GET, mostramos la página de confirmación
+    contexto = {'familia': familia, 'modos_reparto': MODOS_REPARTO}
+    return render(request, 'repartir_confirmar.html', contexto)
 
-            asignaciones_realizadas = 0
-            fallos_reportados = []
-            
-            hoy = date.today()
-            tareas_a_procesar = list(tareas_recurrentes_qs)
-
-            # 🚨 CORRECCIÓN CLAVE: El bucle interno ahora crea INSTANCIAS ÚNICAS
-            # por cada día de la semana que se requiere la tarea.
-            for tarea_original in tareas_a_procesar: 
-                dias_requeridos = set(tarea_original.dias_recurrencia_csv.upper().split(','))
-                
-                # 🚨 Problema de Aglomeración: Iteramos por día y creamos la instancia
-                for dia_codigo in dias_requeridos:
-                        
-                    candidatos_validos = {} # {miembro: score}
-                    
-                    # 2.2. Cálculo de Candidatos: Filtro y Score
-                    for miembro in miembros:
-                        
-                        # A. FILTRO DE EDAD
-                        edad_requerida = tarea_original.edad_minima or 0
-                        perfil = getattr(miembro, 'perfil', None)
-                        edad_miembro = perfil.edad() if perfil and perfil.edad() is not None else 0
-                        
-                        if edad_miembro < edad_requerida:
-                            continue 
-                            
-                        # B. FILTRO DE CAPACIDAD Y DÍAS (Usando la función Helper)
-                        score = calcular_capacidad_para_tarea(miembro, tarea_original, dia_codigo) 
-                        
-                        if score > 0: 
-                            candidatos_validos[miembro] = score
-                    
-                    
-                    # 2.3. ASIGNACIÓN AL MEJOR CANDIDATO
-                    if candidatos_validos:
-                        
-                        candidatos_finales = []
-                        for miembro, score in candidatos_validos.items():
-                            # LÓGICA DE EQUIDAD RESTAURADA 
-                            tareas_pendientes_count = Tarea.objects.filter(
-                                responsable=miembro, 
-                                estado='pendiente'
-                            ).exclude(
-                                dias_recurrencia_csv__isnull=False 
-                            ).count()
-                            
-                            candidatos_finales.append((miembro, score, tareas_pendientes_count))
-
-                        # Ordenar por MENOR carga (x[2]), luego por MAYOR score (-x[1])
-                        candidatos_finales.sort(key=lambda x: (x[2], -x[1])) 
-                        responsable_elegido = candidatos_finales[0][0]
-                        
-                        # CREACIÓN DE LA INSTANCIA DE TAREA DIARIA
-                        Tarea.objects.create(
-                            nombre=f"{tarea_original.nombre} ({dia_codigo})", # Nombre con día para referencia
-                            responsable=responsable_elegido, 
-                            familia=familia,
-                            estado='pendiente',
-                            tiempo_requerido_minutos=tarea_original.tiempo_requerido_minutos,
-                            # 🚨 CLAVE: dias_recurrencia_csv es NULL para marcarla como INSTANCIA
-                            dias_recurrencia_csv=None 
-                        )
-                        asignaciones_realizadas += 1
-                    
-                    else:
-                        fallos_reportados.append(f"La tarea '{tarea_original.nombre}' para el día **{dia_codigo}** no encontró ningún miembro disponible.")
+@login_required
+def plan_reparto(request, familia_id):
+    # Vista previa del reparto (JSON): calcula el plan SIN escribir en la DB
+    familia = get_object_or_404(Familia, id=familia_id, jefe=request.user)
 
-            
-            # 4. RESULTADO FINAL
-            for fallo in fallos_reportados:
-                messages.warning(request, f"⚠️ {fallo}")
+    modo = request.GET.get('modo', MODO_VORAZ)
+    if modo not in dict(MODOS_REPARTO):
+        return JsonResponse({'error': f"Modo inválido: {modo}"}, status=400)
 
-            if asignaciones_realizadas > 0:
-                messages.success(request, f"🎉 ¡Reparto de tareas completado! Se asignaron {asignaciones_realizadas} instancias de tareas con éxito.")
-            
-            return redirect('tareas')
-            
-    # Si es GET, mostramos la página de confirmación
-    contexto = {'familia': familia}
-    return render(request, 'repartir_confirmar.html', contexto)
+    plan = planificar_reparto(familia, modo)
+    return JsonResponse(plan_a_dict(plan))
+
+@login_required
+def estado_reparto(request, trabajo_id):
+    # Página que consulta periódicamente el estado de un reparto encolado
+    trabajo = get_object_or_404(TrabajoReparto, id=trabajo_id, familia__jefe=request.user)
+    return render(request, 'estado_reparto.html', {'trabajo': trabajo})
+
+@login_required
+def estado_reparto_json(request, trabajo_id):
+    # Endpoint de estado: progreso, etapa, resultado y tiempos del trabajo
+    trabajo = get_object_or_404(TrabajoReparto, id=trabajo_id, familia__jefe=request.user)
+    return JsonResponse(estado_trabajo(trabajo))
+
+@login_required
+def exportar_tareas(request, familia_id):
+    # Historial completo de tareas de la familia como archivo (?formato=ndjson|csv), enviado por partes
+    if not request.membresia.pertenece_a(familia_id):
+        raise Http404("Familia no encontrada.")
+    formato = request.GET.get('formato', 'ndjson')
+    if formato not in exportacion.FORMATOS:
+        return JsonResponse({'error': f"Formato inválido: {formato} (usa {' o '.join(exportacion.FORMATOS)})."}, status=400)
+
+    _, tipo_contenido, extension = exportacion.FORMATOS[formato]
+    respuesta = StreamingHttpResponse(exportacion.exportar(familia_id, formato), content_type=tipo_contenido)
+    respuesta['Content-Disposition'] = f'attachment; filename="tareas_familia_{familia_id}.{extension}"'
+    return respuesta
 
 @login_required
 def limpiar_instancias_tareas(request, familia_id):
@@ -657,7 +755,7 @@ def limpiar_instancias_tareas(request, familia_id):
     familia = get_object_or_404(Familia, id=familia_id, jefe=usuario)
     
     # Solo el jefe puede continuar
-    if not Familia.objects.filter(jefe=usuario, id=familia_id).exists():
+    if not request.membresia.es_jefe_de(familia.id):
         messages.error(request, "❌ No tienes permiso para limpiar estas tareas.")
         return redirect('perfil')
 
@@ -667,34 +765,41 @@ def limpiar_instancias_tareas(request, familia_id):
         filtro_fecha = request.POST.get('filtro_fecha')
         
         # QuerySet base: Solo instancias diarias pendientes (las que están en el calendario)
-        qs = Tarea.objects.filter(
+        qs = Tarea.objects.instancias().filter(
             familia=familia,
             estado='pendiente',
-            dias_recurrencia_csv__isnull=True 
         )
         
         filtro_aplicado = "todo el calendario"
 
         # 2. Aplicar Filtros Específicos
-        if filtro_dia and filtro_dia != 'TODOS':
-            # Filtra por el nombre asignado en el reparto (ej: Cocinar (LUN))
-            qs = qs.filter(nombre__icontains=f"({filtro_dia.upper()})")
+        if filtro_dia and filtro_dia.upper() in DIA_BITS:
+            # Cada instancia lleva solo el bit de su día: igualdad entera, sin buscar en el nombre
+            qs = qs.filter(dias_recurrencia_mask=DIA_BITS[filtro_dia.upper()])
             filtro_aplicado = f"el día {filtro_dia.upper()}"
 
         elif filtro_fecha:
-            messages.warning(request, "⚠️ El filtro por fecha/semana está deshabilitado. No se aplicó.")
+            # Semana que comienza en la fecha elegida (rango sobre fecha_programada)
+            try:
+                inicio_semana = date.fromisoformat(filtro_fecha)
+            except ValueError:
+                messages.error(request, "❌ La fecha indicada no es válida.")
+                return redirect('limpiar_instancias_tareas', familia_id=familia.id)
+            fin_semana = inicio_semana + timedelta(days=6)
+            qs = qs.filter(fecha_programada__range=(inicio_semana, fin_semana))
+            filtro_aplicado = f"la semana del {inicio_semana:%d/%m/%Y} al {fin_semana:%d/%m/%Y}"
             
-        # 3. Borrar INSTANCIAS (Tareas diarias/semanales)
-        tareas_borradas, _ = qs.delete()
+        # 3. Borrar INSTANCIAS (Tareas diarias/semanales), descontando los contadores de carga
+        with transaction.atomic():
+            cargas.restar_consulta(qs)
+            tareas_borradas, _ = qs.delete()
         
         # 🚨 LÓGICA CLAVE: RESTABLECER PLANTILLAS (listas para el siguiente reparto) 🚨
-        tareas_plantilla_restablecidas = Tarea.objects.filter(
+        tareas_plantilla_restablecidas = Tarea.objects.plantillas().filter(
             familia=familia,
-        ).exclude(
-            dias_recurrencia_csv__isnull=True
-        ).exclude(
-            dias_recurrencia_csv__exact=''
-        ).update(estado='pendiente')
+            dias_recurrencia_mask__gt=0,
+        ).update(estado='pendiente', modificado=timezone.now()) # update() no aplica auto_now
+        invalidar_familias([familia.id]) # update() no envía post_save
         
         messages.success(request, f"🗑️ Se eliminaron {tareas_borradas} instancias de tareas pendientes de {filtro_aplicado}.")
         
@@ -47,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myapp.membresia.MembresiaMiddleware', # request.membresia: familias del usuario (una consulta por petición)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -126,4 +127,35 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/myapp/'
 LOGOUT_REDIRECT_URL = '/myapp/'
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Reparto de tareas: cantidad de instancias por INSERT al guardar un reparto
+REPARTO_TAMANO_LOTE = 200
+# Segundos sin latido tras los que un trabajo de reparto 'en_curso' vuelve a la cola (worker muerto)
+REPARTO_TIEMPO_MAXIMO = 900
+
+# Lista de tareas: tareas por página (paginación por clave fecha_creacion/id)
+TAREAS_POR_PAGINA = 20
+
+# Caché de fragmentos (lista de tareas, calendario del perfil). Tiene que ser COMPARTIDA por todos
+# los procesos: el worker de reparto (procesar_trabajos_reparto) y el pool de repartir_familias
+# suben la versión de las familias al guardar, y la vista web debe verla. FileBasedCache la
+# comparte entre los procesos de una máquina; con varias máquinas, Redis o Memcached.
+# (LocMemCache NO sirve: cada proceso tendría sus propias versiones.)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'fragmentos',
+    }
+}
+CACHE_FRAGMENTOS = 'default' # Alias de CACHES que usa cache_fragmentos.py
+CACHE_FRAGMENTOS_TIEMPO = 600 # Segundos que vive un fragmento
+
+# API de tareas: tareas por página por defecto (paginación por cursor, ?tamano= hasta 200)
+API_TAREAS_POR_PAGINA = 50
+
+# Sincronización por cambios (/api/sync/): filas por flujo y respuesta, segundos de solape del
+# cursor (para no perder transacciones que se confirman tarde) y días que se guardan los borrados
+SYNC_LIMITE = 500
+SYNC_SOLAPE_SEGUNDOS = 5
+SYNC_RETENCION_DIAS = 90